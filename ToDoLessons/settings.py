@@ -56,11 +56,16 @@ INSTALLED_APPS = [
     'django_filters',
     'drf_yasg',
 
+    'apps.files',
     'apps.user',
     'apps.tasks',
+    'apps.monitoring',
 ]
 
 MIDDLEWARE = [
+    # First, its `total` covers the other middleware
+    'utils.timing.ServerTimingMiddleware',
+    'apps.monitoring.middleware.SlowRequestMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -110,6 +115,17 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# Django's defaults, with the PBKDF2 iteration count taken from PASSWORD_PBKDF2_ITERATIONS
+# (Django's own count when unset). `manage.py benchmark_hashers` recommends one.
+PASSWORD_HASHERS = [
+    'apps.user.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_PBKDF2_ITERATIONS = env.int('PASSWORD_PBKDF2_ITERATIONS', default=None)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
@@ -145,7 +161,7 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
     # 'DEFAULT_PERMISSION_CLASSES': (),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.user.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -224,3 +240,112 @@ SWAGGER_SETTINGS = {
 
 AUTH_USER_MODEL = 'user.User'
 
+# Email sign in fetching the user once (see `LoginSerializer`)
+AUTHENTICATION_BACKENDS = ['apps.user.backends.EmailBackend']
+
+
+# Raise instead of logging when a view exceeds its declared `query_budget`.
+# Always enabled by the test runner.
+QUERY_BUDGET_STRICT = env.bool('QUERY_BUDGET_STRICT', default=False)
+TEST_RUNNER = 'utils.test_runner.TestRunner'
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Lifetime (seconds) of cached list counts for filtered queries
+COUNT_CACHE_TIMEOUT = env.int('COUNT_CACHE_TIMEOUT', default=60)
+# Lifetime (seconds) of per-user task counters maintained on save/delete. They need a cache
+# shared by the workers (not the locmem default), otherwise every list count is cached for
+# COUNT_CACHE_TIMEOUT and reported as approximate
+TASK_COUNTER_TIMEOUT = env.int('TASK_COUNTER_TIMEOUT', default=60 * 60 * 24)
+
+# Soft deleted tasks are purged by `manage.py purge_deleted_tasks` after this many days
+TASK_TRASH_RETENTION_DAYS = env.int('TASK_TRASH_RETENTION_DAYS', default=30)
+
+# Maximum number of operations accepted by POST /tasks/bulk/
+TASK_BULK_MAX_OPERATIONS = env.int('TASK_BULK_MAX_OPERATIONS', default=100)
+
+# Rows inserted per savepoint by POST /tasks/import/ and `manage.py import_tasks`
+TASK_IMPORT_BATCH_SIZE = env.int('TASK_IMPORT_BATCH_SIZE', default=1000)
+
+# Chunked uploads of attachments and thumbnails. Part files should live on the
+# same filesystem as MEDIA_ROOT, finished uploads are then moved, not copied.
+TASK_UPLOAD_DIR = env.str('TASK_UPLOAD_DIR', default=os.path.join(BASE_DIR, 'uploads'))
+TASK_UPLOAD_MAX_CHUNK_SIZE = env.int('TASK_UPLOAD_MAX_CHUNK_SIZE', default=8 * 1024 * 1024)
+TASK_UPLOAD_MAX_SIZE = env.int('TASK_UPLOAD_MAX_SIZE', default=1024 * 1024 * 1024)
+# Seconds an upload session is kept after its last chunk
+TASK_UPLOAD_EXPIRY = env.int('TASK_UPLOAD_EXPIRY', default=60 * 60 * 24)
+
+# Store attachments, thumbnails and avatars once per distinct content, shared by
+# reference count (see apps.files.storage). Existing files are left as they are.
+CONTENT_ADDRESSED_STORAGE = env.bool('CONTENT_ADDRESSED_STORAGE', default=False)
+
+# Resized copies of task thumbnails (longest side in pixels), made by a pool of
+# THUMBNAIL_RENDITION_WORKERS threads per process; 0 renders them in the saving thread.
+THUMBNAIL_RENDITION_SIZES = tuple(env.list('THUMBNAIL_RENDITION_SIZES', cast=int, default=[64, 256, 512]))
+THUMBNAIL_RENDITION_QUALITY = env.int('THUMBNAIL_RENDITION_QUALITY', default=80)
+THUMBNAIL_RENDITION_WORKERS = env.int('THUMBNAIL_RENDITION_WORKERS', default=2)
+
+# Square avatar variants served by /api/v1/avatars/<user>/<key>/<size>/, rendered on
+# demand into an LRU disk cache of at most AVATAR_CACHE_MAX_BYTES (per server)
+AVATAR_SIZES = tuple(env.list('AVATAR_SIZES', cast=int, default=[32, 64, 128, 256]))
+AVATAR_CACHE_DIR = env.str('AVATAR_CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'avatars'))
+AVATAR_CACHE_MAX_BYTES = env.int('AVATAR_CACHE_MAX_BYTES', default=256 * 1024 * 1024)
+
+# How attachment and thumbnail downloads are sent: '' streams them from the app,
+# 'nginx' (X-Accel-Redirect) and 'apache' (X-Sendfile) hand the transfer to the web server.
+# nginx needs an `internal` location at DOWNLOAD_ACCEL_PREFIX aliasing MEDIA_ROOT.
+DOWNLOAD_OFFLOAD = env.str('DOWNLOAD_OFFLOAD', default='')
+DOWNLOAD_ACCEL_PREFIX = env.str('DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+
+# Users resolved by the JWT authentication are cached for USER_CACHE_TIMEOUT seconds
+# (0 disables it) and kept in an in-process LRU for USER_CACHE_LOCAL_TIMEOUT seconds,
+# the time a saved or deactivated user may still be seen as before by other workers.
+# Only the in-process LRU is used while CACHE_URL is the per process locmem cache.
+USER_CACHE_TIMEOUT = env.int('USER_CACHE_TIMEOUT', default=300)
+USER_CACHE_LOCAL_TIMEOUT = env.int('USER_CACHE_LOCAL_TIMEOUT', default=5)
+USER_CACHE_LOCAL_MAX_ENTRIES = env.int('USER_CACHE_LOCAL_MAX_ENTRIES', default=1000)
+
+# Per-request timings (SQL, authentication, serializers, total) sent in a Server-Timing
+# header (DEBUG only by default) and aggregated into per-route histograms served at /metrics
+# (Prometheus text format, per worker process). METRICS_TOKEN is required as a Bearer token;
+# without it /metrics is only served with DEBUG.
+SERVER_TIMING_HEADER = env.bool('SERVER_TIMING_HEADER', default=DEBUG)
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_TOKEN = env.str('METRICS_TOKEN', default='')
+
+# Requests slower than SLOW_REQUEST_THRESHOLD_MS (0, the default, disables) are recorded once
+# sent with their SQL, the EXPLAIN plans of the SLOW_REQUEST_EXPLAIN slowest SELECTs (ANALYZE
+# runs them again) and the stacks sampled every SLOW_REQUEST_PROFILE_INTERVAL_MS (0 disables)
+# past the threshold. SQL parameters and query string values are only stored with
+# SLOW_REQUEST_CAPTURE_PARAMS. Only the newest SLOW_REQUEST_MAX_SAMPLES are kept, see the admin
+# or `manage.py dump_slow_requests`.
+SLOW_REQUEST_THRESHOLD_MS = env.int('SLOW_REQUEST_THRESHOLD_MS', default=0)
+SLOW_REQUEST_CAPTURE_PARAMS = env.bool('SLOW_REQUEST_CAPTURE_PARAMS', default=False)
+SLOW_REQUEST_EXPLAIN = env.int('SLOW_REQUEST_EXPLAIN', default=3)
+SLOW_REQUEST_EXPLAIN_ANALYZE = env.bool('SLOW_REQUEST_EXPLAIN_ANALYZE', default=False)
+SLOW_REQUEST_PROFILE_INTERVAL_MS = env.int('SLOW_REQUEST_PROFILE_INTERVAL_MS', default=10)
+SLOW_REQUEST_MAX_SAMPLES = env.int('SLOW_REQUEST_MAX_SAMPLES', default=500)
+SLOW_REQUEST_MAX_QUERIES = env.int('SLOW_REQUEST_MAX_QUERIES', default=200)
+
+# Endpoint benchmarks of the test suite (utils.benchmark), every case runs BENCHMARK_REPEAT
+# times. Results go to BENCHMARK_OUTPUT_DIR and fail on more queries than the baselines next
+# to the tests (apps/*/benchmarks.json). With BENCHMARK_CHECK_TIMINGS=1 (machine dependent, for
+# dedicated runners) they also fail on p95 latency / peak memory above them by more than the
+# tolerance (a share). BENCHMARK_UPDATE_BASELINE=1 rewrites the baselines instead.
+BENCHMARK_REPEAT = env.int('BENCHMARK_REPEAT', default=20)
+BENCHMARK_OUTPUT_DIR = env.str('BENCHMARK_OUTPUT_DIR', default=os.path.join(BASE_DIR, 'benchmarks'))
+BENCHMARK_CHECK_TIMINGS = env.bool('BENCHMARK_CHECK_TIMINGS', default=False)
+BENCHMARK_LATENCY_TOLERANCE = env.float('BENCHMARK_LATENCY_TOLERANCE', default=1.0)
+BENCHMARK_MEMORY_TOLERANCE = env.float('BENCHMARK_MEMORY_TOLERANCE', default=0.5)
+BENCHMARK_UPDATE_BASELINE = env.bool('BENCHMARK_UPDATE_BASELINE', default=False)
+
+# Seconds subtracted from the delta sync watermark to catch transactions still in flight
+TASK_SYNC_SAFETY_MARGIN = env.int('TASK_SYNC_SAFETY_MARGIN', default=5)
+
+# Opt-in cache of rendered task API responses, disabled while the timeout is 0.
+# With several workers it must point to a shared backend (Redis, memcached).
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=0)
+RESPONSE_CACHE_ALIAS = 'responses'
+CACHES['responses'] = env.cache('RESPONSE_CACHE_URL', default='locmemcache://responses?MAX_ENTRIES=5000')
@@ -26,6 +26,7 @@ from django.urls import path, include
 
 from apps.user import views as user_views
 from apps.tasks import views as tasks_views
+from utils.metrics import metrics_view
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -57,11 +58,20 @@ urlpatterns = [
                 path('me/', user_views.ProfileAPIView.as_view(), name='profile'),
                 path('upload-avatar/', user_views.UploadUserAvatar.as_view(), name='upload_avatar'),
             ])),
+            path('avatars/<uuid:user>/<str:key>/<int:size>/', user_views.AvatarAPIView.as_view(), name='avatar'),
             path('', include(viewset_router.urls)),
             path('tasks/<uuid:task>/', include(attachment_router.urls)),
+            # Native async views, for deployments on the ASGI entry point
+            path('async/', include([
+                path('tasks/', tasks_views.AsyncTaskListAPIView.as_view(), name='async_task_list'),
+                path('tasks/<uuid:pk>/', tasks_views.AsyncTaskDetailAPIView.as_view(), name='async_task_detail'),
+                path('auth/me/', user_views.AsyncProfileAPIView.as_view(), name='async_profile'),
+            ])),
         ])),
     ])),
 
+    path('metrics', metrics_view, name='metrics'),
+
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('apidoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
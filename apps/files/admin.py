@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Blob
+
+# Register your models here.
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'references', 'created_at', 'updated_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'size', 'references']
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class FilesConfig(AppConfig):
+    name = 'apps.files'
+    verbose_name = 'Files'
+
+    def ready(self):
+        from .signals import connect_blob_signals
+        connect_blob_signals()
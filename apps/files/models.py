@@ -0,0 +1,37 @@
+from django.db import models
+
+from utils.models import AbstractModel
+
+# Create your models here.
+
+
+class BlobFieldsMixin:
+    """
+    Models whose `blob_fields` may point to shared blobs of
+    `ContentAddressedStorage`. Remembers the loaded file names, so replaced
+    files can be released on save.
+    """
+    blob_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_blobs = {name: instance.__dict__.get(name) for name in cls.blob_fields}
+        return instance
+
+
+class Blob(AbstractModel):
+    """
+    File stored once under its digest by `ContentAddressedStorage`, with the
+    number of rows referencing it.
+    """
+    class Meta:
+        verbose_name = 'Blob'
+        verbose_name_plural = 'Blobs'
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,51 @@
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from .models import BlobFieldsMixin
+from .storage import ContentAddressedStorage, release_blob
+
+
+def get_blob_files(instance):
+    for name in instance.blob_fields:
+        field_file = getattr(instance, name)
+        if field_file and isinstance(field_file.storage, ContentAddressedStorage):
+            yield name, field_file
+
+
+def mark_stored_blobs(sender, instance, **kwargs):
+    # Files about to be stored take a reference, even when their content is the loaded blob's
+    instance._stored_blobs = {name for name in instance.blob_fields if not getattr(instance, name)._committed}
+
+
+def release_replaced_blobs(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_blobs', {})
+    stored = getattr(instance, '_stored_blobs', ())
+    for name in instance.blob_fields:
+        field_file = getattr(instance, name)
+        old_name = loaded.get(name)
+        if (old_name and (old_name != field_file.name or name in stored)
+                and isinstance(field_file.storage, ContentAddressedStorage)):
+            release_blob(field_file.storage, old_name)
+    instance._loaded_blobs = {name: getattr(instance, name).name for name in instance.blob_fields}
+    instance._stored_blobs = set()
+
+
+def release_deleted_blobs(sender, instance, **kwargs):
+    for name, field_file in get_blob_files(instance):
+        release_blob(field_file.storage, field_file.name)
+
+
+def connect_blob_signals():
+    """
+    Connected per model rather than for every sender, a `post_delete`
+    receiver disables fast (query only) deletes of its model.
+    """
+    if not getattr(settings, 'CONTENT_ADDRESSED_STORAGE', False):
+        return
+
+    for model in apps.get_models():
+        if issubclass(model, BlobFieldsMixin) and model.blob_fields:
+            pre_save.connect(mark_stored_blobs, sender=model, dispatch_uid='mark_stored_blobs')
+            post_save.connect(release_replaced_blobs, sender=model, dispatch_uid='release_replaced_blobs')
+            post_delete.connect(release_deleted_blobs, sender=model, dispatch_uid='release_deleted_blobs')
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, get_storage_class
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Blob
+
+BLOB_DIR = 'blobs'
+TEMP_DIR = os.path.join(BLOB_DIR, 'tmp')
+
+
+def get_blob_name(digest, ext):
+    return '{dir}/{a}/{b}/{digest}{ext}'.format(dir=BLOB_DIR, a=digest[:2], b=digest[2:4], digest=digest, ext=ext)
+
+
+def acquire_blob(name, size):
+    # The UPDATE locks the row until commit, `release_blob` can't drop it meanwhile
+    if Blob.objects.filter(name=name).update(references=F('references') + 1, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            Blob.objects.create(name=name, size=size, references=1)
+    except IntegrityError:
+        Blob.objects.filter(name=name).update(references=F('references') + 1, updated_at=timezone.now())
+
+
+def release_blob(storage, name):
+    """
+    Drops a reference to `name`; once the transaction commits, the blob is
+    deleted if that was the last one. Files not stored as blobs are ignored.
+    """
+    updated = Blob.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        transaction.on_commit(lambda: delete_unreferenced_blob(storage, name))
+
+
+def delete_unreferenced_blob(storage, name):
+    with transaction.atomic():
+        if Blob.objects.filter(name=name, references=0).delete()[0]:
+            storage.delete_file(name)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every distinct content once, as `blobs/ab/cd/<sha256><ext>`. The
+    upload is hashed while it is written to a temporary file, which is then
+    moved into place or dropped when the blob exists already.
+
+    A reference is taken each time a file is saved; rows release theirs when
+    they are deleted or their file is replaced (`apps.files.signals`).
+    `delete()` keeps blobs which are still referenced, so code deleting files
+    of deleted rows (e.g. `purge_deleted_tasks`) can't break other rows.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the digest in `_save`
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        digest = hashlib.sha256()
+
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (uploads spooled by Django, chunked uploads): hash and move it
+            temp_path = content.temporary_file_path()
+            for chunk in content.chunks():
+                digest.update(chunk)
+        else:
+            temp_dir = self.path(TEMP_DIR)
+            os.makedirs(temp_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False) as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            temp_path = temp.name
+
+        name = get_blob_name(digest.hexdigest(), ext)
+        acquire_blob(name, content.size)
+
+        path = self.path(name)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            # Fresh again for the grace period of `collect_orphaned_media`
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Copied when on another filesystem (Django's upload temp dir, TASK_UPLOAD_DIR),
+            # a blob written concurrently has the same content
+            file_move_safe(temp_path, path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        if Blob.objects.filter(name=name, references__gt=0).exists():
+            return
+        self.delete_file(name)
+
+    def delete_file(self, name):
+        super().delete(name)
+
+
+def get_file_storage():
+    """
+    Storage of uploaded files, content addressed when
+    `CONTENT_ADDRESSED_STORAGE` is on. A new instance is returned otherwise,
+    `default_storage` itself would be left out of the migrations.
+    """
+    if getattr(settings, 'CONTENT_ADDRESSED_STORAGE', False):
+        return ContentAddressedStorage()
+    return get_storage_class()()
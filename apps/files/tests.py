@@ -0,0 +1,145 @@
+import errno
+import io
+import os
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.files.models import Blob
+from apps.files.signals import connect_blob_signals
+from apps.files.storage import ContentAddressedStorage
+from apps.tasks.models import Task, TaskAttachment, TaskThumbnail
+from apps.user.models import User
+
+MODELS = (TaskAttachment, TaskThumbnail)
+
+
+@override_settings(CONTENT_ADDRESSED_STORAGE=True)
+class ContentAddressedStorageTests(TestCase):
+    """
+    Attachments stored as blobs, the storage is picked when models are loaded
+    so it's swapped in here.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', username='owner', password='Owner-password-1')
+        cls.task, cls.other_task = [Task.objects.create(user=cls.user, title='Task %d' % index) for index in range(2)]
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+        for model in MODELS:
+            field = model._meta.get_field('file')
+            self.addCleanup(setattr, field, 'storage', field.storage)
+            field.storage = self.storage
+
+            self.addCleanup(pre_save.disconnect, sender=model, dispatch_uid='mark_stored_blobs')
+            self.addCleanup(post_save.disconnect, sender=model, dispatch_uid='release_replaced_blobs')
+            self.addCleanup(post_delete.disconnect, sender=model, dispatch_uid='release_deleted_blobs')
+        connect_blob_signals()
+
+    def attach(self, content, task=None, name='notes.txt'):
+        return TaskAttachment.objects.create(task=task or self.task, file=SimpleUploadedFile(name, content))
+
+    def get_references(self, name):
+        return Blob.objects.filter(name=name).values_list('references', flat=True).first()
+
+    def test_deduplicated(self):
+        first = self.attach(b'same content')
+        second = self.attach(b'same content', task=self.other_task, name='copy.TXT')
+        other = self.attach(b'other content')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.startswith('blobs/'))
+        self.assertTrue(first.file.name.endswith('.txt'))
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(self.get_references(first.file.name), 2)
+        self.assertEqual(Blob.objects.get(name=first.file.name).size, len(b'same content'))
+        # Nothing left in the temporary directory
+        self.assertEqual(os.listdir(self.storage.path('blobs/tmp')), [])
+
+    def test_moved_across_filesystems(self):
+        upload = TemporaryUploadedFile('notes.txt', 'text/plain', 0, None)
+        # As for the request's uploads, tolerates the moved file
+        self.addCleanup(upload.close)
+        upload.write(b'spooled content')
+        upload.size = upload.tell()
+        upload.seek(0)
+
+        def cross_device(move):
+            def wrapper(source, destination):
+                if source == upload.temporary_file_path():
+                    raise OSError(errno.EXDEV, 'Invalid cross-device link')
+                return move(source, destination)
+            return wrapper
+
+        with mock.patch('os.rename', cross_device(os.rename)), mock.patch('os.replace', cross_device(os.replace)):
+            attachment = TaskAttachment.objects.create(task=self.task, file=upload)
+        with attachment.file.open('rb') as file:
+            self.assertEqual(file.read(), b'spooled content')
+        self.assertEqual(self.get_references(attachment.file.name), 1)
+
+    def test_released_on_delete(self):
+        first = self.attach(b'same content')
+        second = self.attach(b'same content')
+        name = first.file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.get_references(name), 1)
+        self.assertTrue(self.storage.exists(name))
+
+        # The last reference goes with the task's cascade
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.all_objects.filter(pk=second.task_id).delete()
+        self.assertIsNone(self.get_references(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_released_on_replace(self):
+        attachment = self.attach(b'old content')
+        old_name = attachment.file.name
+        attachment = TaskAttachment.objects.get(pk=attachment.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attachment.file = SimpleUploadedFile('notes.txt', b'new content')
+            attachment.save()
+        self.assertIsNone(self.get_references(old_name))
+        self.assertFalse(self.storage.exists(old_name))
+        self.assertEqual(self.get_references(attachment.file.name), 1)
+
+    def test_same_content_saved_again(self):
+        attachment = self.attach(b'same content')
+        name = attachment.file.name
+        attachment = TaskAttachment.objects.get(pk=attachment.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attachment.file = SimpleUploadedFile('notes.txt', b'same content')
+            attachment.save()
+            # Saving the row without a new file keeps the reference
+            attachment.save()
+        self.assertEqual(attachment.file.name, name)
+        self.assertEqual(self.get_references(name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attachment.delete()
+        self.assertIsNone(self.get_references(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_purge_keeps_shared_blobs(self):
+        purged = self.attach(b'same content')
+        kept = self.attach(b'same content', task=self.other_task)
+        Task.all_objects.filter(pk=self.task.pk).update(
+            deleted=True,
+            deleted_at=timezone.now() - timezone.timedelta(days=31),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_deleted_tasks', stdout=io.StringIO())
+        self.assertFalse(TaskAttachment.objects.filter(pk=purged.pk).exists())
+        self.assertEqual(self.get_references(kept.file.name), 1)
+        with kept.file.open('rb') as file:
+            self.assertEqual(file.read(), b'same content')
@@ -0,0 +1,76 @@
+import json
+
+from django.contrib import admin
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from . import sampling
+from .models import SlowRequest
+
+# Register your models here.
+
+
+def format_json(value):
+    return format_html('<pre>{}</pre>', json.dumps(value, indent=2, ensure_ascii=False))
+
+
+@admin.register(SlowRequest)
+class SlowRequestAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'route', 'status', 'duration_ms', 'query_count']
+    list_filter = ['method', 'status', 'route']
+    search_fields = ['path', 'route', 'view']
+    date_hierarchy = 'created_at'
+    actions = ['dump_json']
+    fieldsets = (
+        (None, {'fields': (
+            'created_at', 'method', 'path', 'route', 'view', 'view_kwargs_json', 'query_params_json', 'status',
+            'user_id',
+        )}),
+        ('Timings', {'fields': ('duration_ms', 'timings_json', 'query_count')}),
+        ('SQL', {'fields': ('plans_json', 'queries_json')}),
+        ('Profile', {'fields': ('profile_json',)}),
+    )
+    readonly_fields = [
+        'created_at', 'method', 'path', 'route', 'view', 'view_kwargs_json', 'query_params_json', 'status',
+        'user_id', 'duration_ms', 'timings_json', 'query_count', 'plans_json', 'queries_json', 'profile_json',
+    ]
+
+    # Recorded by `SlowRequestMiddleware` only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='View kwargs')
+    def view_kwargs_json(self, obj):
+        return format_json(obj.view_kwargs)
+
+    @admin.display(description='Query params')
+    def query_params_json(self, obj):
+        return format_json(obj.query_params)
+
+    @admin.display(description='Timings (ms)')
+    def timings_json(self, obj):
+        return format_json(obj.timings)
+
+    @admin.display(description='Plans')
+    def plans_json(self, obj):
+        return format_json(obj.plans)
+
+    @admin.display(description='Queries')
+    def queries_json(self, obj):
+        return format_json(obj.queries)
+
+    @admin.display(description='Profile')
+    def profile_json(self, obj):
+        return format_json(obj.profile)
+
+    @admin.action(description='Download selected slow requests as JSON')
+    def dump_json(self, request, queryset):
+        response = HttpResponse(sampling.dumps(queryset), content_type='application/json')
+        response['Content-Disposition'] = 'attachment; filename="slow-requests-%s.json"' % (
+            timezone.now().strftime('%Y%m%d-%H%M%S')
+        )
+        return response
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.monitoring import sampling
+from apps.monitoring.models import SlowRequest
+
+
+class Command(BaseCommand):
+    help = 'Writes the recorded slow requests (newest first) as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write (stdout by default)')
+        parser.add_argument('--limit', type=int, help='Newest samples written')
+        parser.add_argument('--route', help='Only the samples of this URL pattern name')
+        parser.add_argument('--min-duration', type=float, help='Only the samples slower than this (ms)')
+
+    def handle(self, *args, **options):
+        queryset = SlowRequest.objects.all()
+        if options['route']:
+            queryset = queryset.filter(route=options['route'])
+        if options['min_duration'] is not None:
+            queryset = queryset.filter(duration_ms__gte=options['min_duration'])
+        if options['limit']:
+            queryset = queryset[:options['limit']]
+
+        samples = list(queryset)
+        if not options['output']:
+            self.stdout.write(sampling.dumps(samples))
+            return
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            file.write(sampling.dumps(samples) + '\n')
+        self.stdout.write(self.style.SUCCESS('%d slow requests written to %s' % (len(samples), options['output'])))
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from utils.profiling import StackSampler
+from utils.timing import RequestTimings, current_timings, install_execute_wrapper
+
+from . import sampling
+
+logger = logging.getLogger(__name__)
+
+
+def get_threshold():
+    # Seconds, 0 when disabled
+    return getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 0) / 1000
+
+
+class SlowRequestMiddleware:
+    """
+    Records the requests slower than `SLOW_REQUEST_THRESHOLD_MS` as
+    `SlowRequest`s: every SQL statement with its duration, the plans of the
+    slowest SELECTs, the view with its arguments and query parameters, and
+    the stacks sampled once the request crossed the threshold (sync requests
+    only, an event loop thread runs many at once). Faster requests only pay
+    for collecting the statements, and slow ones are recorded (EXPLAIN
+    included) once their response is sent. Should come right after
+    `utils.timing.ServerTimingMiddleware`, whose timings it shares.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        interval = getattr(settings, 'SLOW_REQUEST_PROFILE_INTERVAL_MS', 10) / 1000
+        self.sampler = StackSampler(interval) if interval else None
+        if asyncio.iscoroutinefunction(get_response):
+            # How Django's `MiddlewareMixin` marks `__call__` as returning a coroutine
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def start(self):
+        """
+        Starts collecting the statements into the current timings, or new ones
+        when `ServerTimingMiddleware` is disabled. Returns the timings and the
+        token to reset `current_timings` with, if set here.
+        """
+        timings, token = current_timings.get(), None
+        if timings is None:
+            timings = RequestTimings()
+            token = current_timings.set(timings)
+        timings.statements = []
+        return timings, token
+
+    def finish(self, timings, token):
+        statements, timings.statements = timings.statements, None
+        if token is not None:
+            current_timings.reset(token)
+        return statements
+
+    def record(self, request, response, duration, timings, statements, profile=None):
+        # The sample's own queries aren't part of the request
+        token = current_timings.set(None)
+        try:
+            sampling.record(request, response.status_code, duration, timings, statements, profile)
+        except Exception:
+            # Monitoring mustn't fail the response
+            logger.exception('Failed to record slow request %s %s', request.method, request.path)
+        finally:
+            current_timings.reset(token)
+
+    def defer_record(self, request, response, duration, timings, statements, profile=None):
+        # Servers close responses after sending them (streams included), the
+        # database connection is only released by `close()` itself
+        close = response.close
+
+        def record_and_close():
+            try:
+                self.record(request, response, duration, timings, statements, profile)
+            finally:
+                close()
+
+        response.close = record_and_close
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        threshold = get_threshold()
+        if not threshold:
+            return self.get_response(request)
+
+        # Connected before this module was imported
+        install_execute_wrapper(connection)
+        timings, token = self.start()
+        started = time.perf_counter()
+        profile = self.sampler.add(threading.get_ident(), started + threshold) if self.sampler else None
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            if profile is not None:
+                self.sampler.remove(profile)
+            statements = self.finish(timings, token)
+
+        if duration >= threshold:
+            self.defer_record(request, response, duration, timings, statements, profile)
+        return response
+
+    async def __acall__(self, request):
+        threshold = get_threshold()
+        if not threshold:
+            return await self.get_response(request)
+
+        timings, token = self.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            statements = self.finish(timings, token)
+
+        if duration >= threshold:
+            # ASGI servers close responses with `sync_to_async()` as well
+            self.defer_record(request, response, duration, timings, statements)
+        return response
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.2 on 2026-10-18 12:41
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowRequest',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True, verbose_name='Обновлено')),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.TextField()),
+                ('route', models.CharField(blank=True, max_length=255)),
+                ('view', models.CharField(blank=True, max_length=255)),
+                ('view_kwargs', models.JSONField(default=dict)),
+                ('query_params', models.JSONField(default=dict)),
+                ('status', models.PositiveSmallIntegerField(null=True)),
+                ('user_id', models.UUIDField(blank=True, null=True)),
+                ('duration_ms', models.FloatField()),
+                ('timings', models.JSONField(default=dict)),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('queries', models.JSONField(default=list)),
+                ('plans', models.JSONField(default=list)),
+                ('profile', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Slow request',
+                'verbose_name_plural': 'Slow requests',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='slowrequest',
+            index=models.Index(fields=['-created_at'], name='slow_request_created_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import models
+
+from utils.models import AbstractModel
+
+# Create your models here.
+
+
+class SlowRequest(AbstractModel):
+    """
+    Request which took longer than `SLOW_REQUEST_THRESHOLD_MS`, recorded by
+    `apps.monitoring.middleware.SlowRequestMiddleware`. Only the newest
+    `SLOW_REQUEST_MAX_SAMPLES` are kept.
+    """
+    class Meta:
+        verbose_name = 'Slow request'
+        verbose_name_plural = 'Slow requests'
+        ordering = ('-created_at',)
+        indexes = (
+            models.Index(fields=('-created_at',), name='slow_request_created_idx'),
+        )
+
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    # URL pattern name, as in the /metrics labels
+    route = models.CharField(max_length=255, blank=True)
+    view = models.CharField(max_length=255, blank=True)
+    view_kwargs = models.JSONField(default=dict)
+    query_params = models.JSONField(default=dict)
+    status = models.PositiveSmallIntegerField(null=True)
+    # Not a foreign key, samples outlive their users (and requests deleting them)
+    user_id = models.UUIDField(null=True, blank=True)
+
+    duration_ms = models.FloatField()
+    # Milliseconds per phase, see `utils.timing.RequestTimings`
+    timings = models.JSONField(default=dict)
+    query_count = models.PositiveIntegerField(default=0)
+    # [{'sql', 'params', 'many', 'duration_ms', 'database'}] in execution order
+    queries = models.JSONField(default=list)
+    # [{'sql', 'params', 'duration_ms', 'database', 'analyze', 'plan'}] of the slowest SELECTs
+    plans = models.JSONField(default=list)
+    # [{'stack', 'samples'}] collapsed stacks, most frequent first
+    profile = models.JSONField(default=list)
+
+    def __str__(self):
+        return '%s %s (%.0fms)' % (self.method, self.path, self.duration_ms)
@@ -0,0 +1,172 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections, transaction
+
+from utils.timing import get_route
+
+from .models import SlowRequest
+
+# Most frequent stacks kept per profile
+PROFILE_STACKS = 50
+
+# Plain JSON values are stored as is, anything else as its str()
+JSON_TYPES = (str, int, float, bool, type(None))
+
+# Stored instead of SQL parameters and query string values, unless SLOW_REQUEST_CAPTURE_PARAMS
+REDACTED = '[redacted]'
+
+
+def to_json(value):
+    if isinstance(value, JSON_TYPES):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for key, item in value.items()}
+    return str(value)
+
+
+def capture_params():
+    # Password hashes, emails, task contents... stored only when asked for
+    return getattr(settings, 'SLOW_REQUEST_CAPTURE_PARAMS', False)
+
+
+def get_params(params):
+    return to_json(params) if capture_params() or not params else REDACTED
+
+
+def get_query_params(request):
+    capture = capture_params()
+    return {
+        key: (values[0] if len(values) == 1 else values) if capture else REDACTED
+        for key, values in request.GET.lists()
+    }
+
+
+def get_user_id(request):
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def explain(sql, params, database, analyze):
+    """
+    Plan of one statement, as lines. ANALYZE runs the statement again and is
+    only asked from backends supporting it (PostgreSQL, MySQL 8).
+    """
+    connection = connections[database]
+    try:
+        prefix = connection.ops.explain_query_prefix(analyze=True) if analyze else None
+    except ValueError:
+        analyze = False
+        prefix = None
+    # A savepoint, a failure mustn't break the transaction of a request in `atomic()`
+    with transaction.atomic(using=database), connection.cursor() as cursor:
+        cursor.execute('%s %s' % (prefix or connection.ops.explain_query_prefix(), sql), params)
+        rows = cursor.fetchall()
+    return analyze, [' '.join(str(column) for column in row) for row in rows]
+
+
+def get_plans(statements):
+    count = getattr(settings, 'SLOW_REQUEST_EXPLAIN', 3)
+    analyze = getattr(settings, 'SLOW_REQUEST_EXPLAIN_ANALYZE', False)
+    if not count:
+        return []
+
+    plans, seen = [], set()
+    for sql, params, many, duration, database in sorted(statements, key=lambda statement: -statement[3]):
+        # Only reads can be explained (and analyzed) safely
+        if many or not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        key = (sql, database)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        plan = {
+            'sql': sql,
+            'params': get_params(params),
+            'duration_ms': round(duration * 1000, 3),
+            'database': database,
+        }
+        try:
+            plan['analyze'], plan['plan'] = explain(sql, params, database, analyze)
+        except DatabaseError as error:
+            plan['analyze'], plan['plan'] = False, ['EXPLAIN failed: %s' % error]
+        plans.append(plan)
+        if len(plans) == count:
+            break
+    return plans
+
+
+def get_queries(statements):
+    limit = getattr(settings, 'SLOW_REQUEST_MAX_QUERIES', 200)
+    return [
+        {
+            'sql': sql,
+            # `executemany()` parameters can be an iterator, consumed already
+            'params': None if many else get_params(params),
+            'many': many,
+            'duration_ms': round(duration * 1000, 3),
+            'database': database,
+        }
+        for sql, params, many, duration, database in statements[:limit]
+    ]
+
+
+def trim_samples():
+    """
+    Deletes everything older than the newest `SLOW_REQUEST_MAX_SAMPLES`.
+    """
+    max_samples = getattr(settings, 'SLOW_REQUEST_MAX_SAMPLES', 500)
+    cutoff = SlowRequest.objects.values_list('created_at', flat=True)[max_samples:max_samples + 1].first()
+    if cutoff is not None:
+        SlowRequest.objects.filter(created_at__lte=cutoff).delete()
+
+
+def record(request, status, duration, timings, statements, profile=None):
+    match = getattr(request, 'resolver_match', None)
+    sample = SlowRequest.objects.create(
+        method=request.method,
+        path=request.path,
+        route=get_route(request),
+        view=match._func_path if match is not None else '',
+        view_kwargs=to_json(match.kwargs) if match is not None else {},
+        query_params=get_query_params(request),
+        status=status,
+        user_id=get_user_id(request),
+        duration_ms=round(duration * 1000, 3),
+        timings={name: round(value * 1000, 3) for name, value in timings.durations.items()},
+        query_count=len(statements),
+        queries=get_queries(statements),
+        plans=get_plans(statements),
+        profile=profile.get_stacks(PROFILE_STACKS) if profile else [],
+    )
+    trim_samples()
+    return sample
+
+
+def serialize(sample):
+    return {
+        'id': sample.pk,
+        'created_at': sample.created_at,
+        'method': sample.method,
+        'path': sample.path,
+        'route': sample.route,
+        'view': sample.view,
+        'view_kwargs': sample.view_kwargs,
+        'query_params': sample.query_params,
+        'status': sample.status,
+        'user_id': sample.user_id,
+        'duration_ms': sample.duration_ms,
+        'timings': sample.timings,
+        'query_count': sample.query_count,
+        'queries': sample.queries,
+        'plans': sample.plans,
+        'profile': sample.profile,
+    }
+
+
+def dumps(samples):
+    return json.dumps([serialize(sample) for sample in samples], cls=DjangoJSONEncoder, indent=2, ensure_ascii=False)
@@ -0,0 +1,145 @@
+import io
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.monitoring.middleware import SlowRequestMiddleware
+from apps.monitoring.models import SlowRequest
+from apps.monitoring.sampling import REDACTED
+from apps.tasks.models import Task
+from apps.user.authentication import local_cache
+from apps.user.models import User
+from utils.metrics import registry
+
+# Every request is slow
+SLOW = {'SLOW_REQUEST_THRESHOLD_MS': 0.001, 'SLOW_REQUEST_PROFILE_INTERVAL_MS': 0}
+
+
+class SlowRequestTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', username='owner', password='Owner-password-1')
+        cls.task = Task.objects.create(user=cls.user, title='Secret title')
+
+    def setUp(self):
+        local_cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(self.user))
+
+    def list_tasks(self):
+        response = self.client.get(reverse('task-list'), {'search': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_disabled(self):
+        self.list_tasks()
+        self.assertFalse(SlowRequest.objects.exists())
+
+    @override_settings(**SLOW)
+    def test_recorded(self):
+        self.list_tasks()
+        sample = SlowRequest.objects.get()
+        self.assertEqual((sample.method, sample.route, sample.status), ('GET', 'task-list', 200))
+        self.assertEqual(sample.user_id, self.user.pk)
+        self.assertEqual(sample.query_count, len(sample.queries))
+        self.assertTrue(sample.plans)
+        self.assertTrue(all(plan['sql'].lstrip().upper().startswith('SELECT') for plan in sample.plans))
+
+        # Parameters may be password hashes or task contents
+        self.assertEqual(sample.query_params, {'search': REDACTED})
+        self.assertIn(REDACTED, [query['params'] for query in sample.queries])
+        self.assertNotIn(self.user.pk.hex, json.dumps(sample.queries))
+        self.assertTrue(all(plan['params'] in (REDACTED, None) for plan in sample.plans))
+
+        output = io.StringIO()
+        call_command('dump_slow_requests', stdout=output)
+        self.assertEqual([item['id'] for item in json.loads(output.getvalue())], [str(sample.pk)])
+
+    @override_settings(SLOW_REQUEST_CAPTURE_PARAMS=True, **SLOW)
+    def test_params_captured(self):
+        self.list_tasks()
+        sample = SlowRequest.objects.get()
+        self.assertEqual(sample.query_params, {'search': 'secret'})
+        self.assertIn(self.user.pk.hex, json.dumps(sample.queries))
+
+    @override_settings(**SLOW)
+    def test_recorded_after_response(self):
+        def get_response(request):
+            Task.objects.filter(pk=self.task.pk).exists()
+            return HttpResponse('sent')
+
+        request = RequestFactory().get('/')
+        response = SlowRequestMiddleware(get_response)(request)
+        # Nothing explained nor written before the response is sent
+        self.assertFalse(SlowRequest.objects.exists())
+        response.close()
+        self.assertEqual(SlowRequest.objects.get().query_count, 1)
+
+    @override_settings(**SLOW)
+    def test_failure_logged(self):
+        with mock.patch('apps.monitoring.sampling.record', side_effect=RuntimeError), \
+                self.assertLogs('apps.monitoring.middleware', 'ERROR'):
+            self.list_tasks()
+        self.assertFalse(SlowRequest.objects.exists())
+
+
+class MetricsTests(APITestCase):
+    """
+    `utils.timing.ServerTimingMiddleware` and the `/metrics` of `utils.metrics`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', username='owner', password='Owner-password-1')
+
+    def setUp(self):
+        local_cache.clear()
+        registry.reset()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(self.user))
+
+    def get_metrics(self, **headers):
+        return self.client.get(reverse('metrics'), **headers)
+
+    def test_server_timing(self):
+        with override_settings(SERVER_TIMING_HEADER=True):
+            header = self.client.get(reverse('task-list'))['Server-Timing']
+        self.assertIn('db;dur=', header)
+        self.assertIn('total;dur=', header)
+
+        with override_settings(SERVER_TIMING_HEADER=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('task-list')))
+
+        # Unset, the database time is private outside of DEBUG
+        for debug in (False, True):
+            with self.subTest(debug=debug), override_settings(DEBUG=debug):
+                del settings.SERVER_TIMING_HEADER
+                self.assertEqual('Server-Timing' in self.client.get(reverse('task-list')), debug)
+
+    def test_private_without_token(self):
+        self.client.get(reverse('task-list'))
+        self.assertEqual(self.get_metrics().status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.get_metrics().status_code, 200)
+        with override_settings(METRICS_ENABLED=False, DEBUG=True):
+            self.assertEqual(self.get_metrics().status_code, 404)
+
+    @override_settings(METRICS_TOKEN='metrics-token', SERVER_TIMING_HEADER=False)
+    def test_token(self):
+        self.client.get(reverse('task-list'))
+        # Measured for the metrics only
+        self.assertNotIn('Server-Timing', self.client.get(reverse('task-list')))
+        self.client.credentials()
+
+        self.assertEqual(self.get_metrics().status_code, 401)
+        self.assertEqual(self.get_metrics(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.get_metrics(HTTP_AUTHORIZATION='Bearer metrics-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_requests_total{route="task-list",method="GET",status="200"} 2',
+                      response.content.decode())
@@ -18,5 +18,10 @@ class TaskAttachmentInlineAdmin(admin.TabularInline):
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ['title', 'done', 'deleted', 'deleted_at', 'created_at']
+    list_filter = ['deleted', 'done']
     inlines = (TaskThumbnailInlineAdmin, TaskAttachmentInlineAdmin)
 
+    def get_queryset(self, request):
+        # Soft deleted tasks are hidden by the default manager
+        return Task.all_objects.all()
+
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     name = 'apps.tasks'
     verbose_name = 'Tasks'
+
+    def ready(self):
+        from . import signals  # noqa: F401
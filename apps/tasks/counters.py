@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from utils.counts import CountCache
+from utils.response_cache import aget_version, get_version, is_shared
+
+from .filters import TaskFilters
+from .models import Task
+
+ALL = 'all'
+
+# Filters answered by the counters, the others by `list_count_cache`
+COUNTER_FILTERS = {'done'}
+
+list_count_cache = CountCache('task-list-count')
+
+
+def counter_key(user_id, done=None):
+    bucket = ALL if done is None else 'done=%d' % bool(done)
+    return 'task-count:%s:%s' % (user_id, bucket)
+
+
+def are_counters_shared():
+    # With a per process cache (the locmem default) workers miss each other's increments
+    return is_shared(cache)
+
+
+def get_task_count(user_id, compute, done=None):
+    """
+    Exact number of user's tasks (optionally by `done`), maintained by signals.
+    Computed with `compute` when the counter is not in the cache yet.
+    """
+    key = counter_key(user_id, done)
+    count = cache.get(key)
+    if count is None:
+        count = compute()
+        cache.add(key, count, getattr(settings, 'TASK_COUNTER_TIMEOUT', 60 * 60 * 24))
+    return count
+
+
+def _adjust(keys, delta):
+    for key in keys:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # Counter isn't cached, it will be computed on the next read
+            pass
+
+
+def adjust_task_count(user_id, done, delta):
+    keys = (counter_key(user_id), counter_key(user_id, done))
+    transaction.on_commit(lambda: _adjust(keys, delta))
+
+
+def move_task_count(user_id, old_done, new_done):
+    keys_from = (counter_key(user_id, old_done),)
+    keys_to = (counter_key(user_id, new_done),)
+
+    def _move():
+        _adjust(keys_from, -1)
+        _adjust(keys_to, 1)
+
+    transaction.on_commit(_move)
+
+
+def invalidate_task_counts(user_id):
+    """
+    Drops user's counters, call after bulk operations which bypass signals.
+    """
+    keys = [counter_key(user_id), counter_key(user_id, True), counter_key(user_id, False)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def resolve_list_count(request, compute):
+    """
+    Number of tasks in the list requested by `request`: a counter for the
+    whole list or by `done` when the workers share the cache, otherwise a
+    cached `COUNT(*)` (see `COUNT_CACHE_TIMEOUT`). Returns `(count, exact)`.
+    """
+    filterset = TaskFilters(request.query_params, queryset=Task.objects.none(), request=request)
+    if not filterset.is_valid():
+        return compute(), True
+
+    params = {
+        key: value for key, value in filterset.form.cleaned_data.items()
+        if key != 'sort' and value not in (None, '')
+    }
+    user_id = request.user.id
+
+    if set(params) <= COUNTER_FILTERS and are_counters_shared():
+        return get_task_count(user_id, compute, done=params.get('done')), True
+    return list_count_cache.get_or_compute(user_id, params, compute)
+
+
+def get_all_tasks(user_id):
+    # Soft deleted tasks included, deleting one must change the version too
+    return Task.all_objects.filter(user_id=user_id)
+
+
+def get_list_version(user_id):
+    """
+    Value changed by every write to user's tasks, attachments and thumbnails,
+    a validator for all of user's task lists: the response cache version
+    (no query) when the workers share it, otherwise the last `updated_at` of
+    user's tasks (an index lookup). The latter misses hard deletes of tasks
+    which weren't in the trash, only possible from the admin.
+    """
+    if is_shared():
+        return get_version(user_id)
+    return get_all_tasks(user_id).aggregate(last_update=Max('updated_at'))['last_update']
+
+
+async def aget_list_version(user_id):
+    if is_shared():
+        return await aget_version(user_id)
+    return (await get_all_tasks(user_id).aaggregate(last_update=Max('updated_at')))['last_update']
@@ -0,0 +1,58 @@
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import TaskSerializer
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CSV_COLUMNS = ('id', 'title', 'description', 'done', 'created_at', 'updated_at', 'attachments', 'thumbnails')
+
+
+class Echo:
+    """
+    File-like object for `csv.writer` which returns rows instead of buffering them.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_task_rows(queryset, context=None, chunk_size=1000):
+    """
+    Serialized tasks, read `chunk_size` rows at a time; attachments and
+    thumbnails are prefetched once per chunk. Memory use doesn't depend on
+    the number of tasks.
+    """
+    # Fields are built once, not for every row
+    serializer = TaskSerializer(context=context or {})
+    queryset = queryset.prefetch_related('attachments', 'thumbnails').order_by('created_at', 'id')
+    for task in queryset.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(task)
+
+
+def iter_ndjson(rows):
+    encoder = JSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        yield writer.writerow([
+            ' '.join(item['file'] for item in row[column] if item['file'])
+            if column in ('attachments', 'thumbnails') else row[column]
+            for column in CSV_COLUMNS
+        ])
+
+
+def iter_export(queryset, export_format, context=None, chunk_size=1000):
+    rows = iter_task_rows(queryset, context=context, chunk_size=chunk_size)
+    if export_format == 'csv':
+        return iter_csv(rows)
+    return iter_ndjson(rows)
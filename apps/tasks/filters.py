@@ -2,6 +2,7 @@ from django_filters import filters
 from django_filters.rest_framework import filterset
 
 from .models import Task
+from .search import search_tasks
 
 SORT_CHOICES = (
     ('created_at', 'created_at ASC'),
@@ -17,6 +18,14 @@ class TaskFilters(filterset.FilterSet):
     title = filters.CharFilter(field_name='title', lookup_expr='icontains')
     start_date = filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
     finish_date = filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
+    q = filters.CharFilter(method='filter_search', label='Full-text search by title and description')
+
+    def filter_search(self, queryset, name, value):
+        queryset = search_tasks(queryset, value)
+        # Most relevant first, unless an explicit `sort` was applied
+        if 'search_rank' in queryset.query.annotations and not queryset.query.order_by:
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
 
     class Meta:
         model = Task
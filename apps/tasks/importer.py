@@ -0,0 +1,173 @@
+import csv
+import io
+import json
+
+from rest_framework import serializers
+
+from django.conf import settings
+from django.db import transaction, DatabaseError
+from django.utils.translation import gettext as _
+
+from utils.response_cache import bump_version
+
+from .counters import invalidate_task_counts
+from .models import Task
+from .serializers import TaskBulkItemSerializer, TaskImportSerializer
+
+FORMATS = TaskImportSerializer.FORMATS
+
+# Streams are decoded with it, bytes which aren't UTF-8 become lone surrogates
+# and only fail the rows containing them
+DECODE_ERRORS = 'surrogateescape'
+
+
+def is_decoded(value):
+    if isinstance(value, (list, tuple)):
+        return all(is_decoded(item) for item in value)
+    if not isinstance(value, str):
+        return True
+    try:
+        value.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def iter_ndjson(stream):
+    """
+    Yields `(row number, record)` from a text stream of JSON lines, records
+    which can't be parsed are yielded as `ValueError`.
+    """
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if not is_decoded(line):
+            yield number, ValueError(_('Invalid UTF-8'))
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            record = ValueError(_('Invalid JSON: %s') % exc)
+        else:
+            if not isinstance(record, dict):
+                record = ValueError(_('Expected a JSON object'))
+        yield number, record
+
+
+def iter_csv(stream):
+    """
+    Yields `(row number, record)` from a CSV text stream with a header row,
+    rows which can't be parsed are yielded as `ValueError`.
+    """
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            # The line failing to parse isn't counted yet
+            yield reader.line_num + 1, ValueError(_('Invalid CSV: %s') % exc)
+            continue
+
+        if not all(is_decoded(key) and is_decoded(value) for key, value in record.items()):
+            record = ValueError(_('Invalid UTF-8'))
+        yield reader.line_num, record
+
+
+def open_upload(uploaded_file):
+    """
+    Text stream over an uploaded file, which is read from memory or from the
+    temporary file Django spooled it to, line by line.
+    """
+    return io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', errors=DECODE_ERRORS, newline='')
+
+
+def iter_records(stream, import_format):
+    if import_format == 'csv':
+        return iter_csv(stream)
+    return iter_ndjson(stream)
+
+
+class TaskImporter:
+    """
+    Validates records with `TaskSerializer` field rules and inserts them with
+    `bulk_create`, `batch_size` rows per savepoint. Failing rows are reported
+    (the first `max_errors` of them) without aborting the import; only one
+    batch of rows is held in memory at a time.
+    """
+
+    def __init__(self, user, batch_size=None, max_errors=1000, context=None):
+        self.user = user
+        self.batch_size = batch_size or getattr(settings, 'TASK_IMPORT_BATCH_SIZE', 1000)
+        self.max_errors = max_errors
+        self.serializer = TaskBulkItemSerializer(context=context or {'user': user})
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def validate(self, row, record):
+        if isinstance(record, Exception):
+            self.add_error(row, {'non_field_errors': [str(record)]})
+            return None
+
+        try:
+            data = self.serializer.run_validation(record)
+        except serializers.ValidationError as exc:
+            self.add_error(row, exc.detail)
+            return None
+        return Task(user_id=self.user.id, **data)
+
+    def flush(self, batch):
+        if not batch:
+            return
+
+        try:
+            with transaction.atomic():
+                Task.objects.bulk_create([task for row, task in batch])
+            self.created += len(batch)
+            return
+        except DatabaseError:
+            pass
+
+        # Find the rows which break the batch, the others are still imported
+        for row, task in batch:
+            try:
+                with transaction.atomic():
+                    Task.objects.bulk_create([task])
+                self.created += 1
+            except DatabaseError as exc:
+                self.add_error(row, {'non_field_errors': [str(exc)]})
+
+    def run(self, records, progress=None):
+        batch = []
+        try:
+            for row, record in records:
+                task = self.validate(row, record)
+                if task is None:
+                    continue
+
+                batch.append((row, task))
+                if len(batch) >= self.batch_size:
+                    self.flush(batch)
+                    batch = []
+                    if progress is not None:
+                        progress(self)
+            self.flush(batch)
+        finally:
+            if self.created:
+                # bulk_create bypasses the signals maintaining counters and caches
+                invalidate_task_counts(self.user.id)
+                bump_version(self.user.id)
+
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.tasks.models import Task
+from apps.user.models import User
+
+ENDPOINTS = {
+    # name: (method, sync url name, async url name)
+    'tasks': ('GET', 'task-list', 'async_task_list'),
+    'task': ('GET', 'task-detail', 'async_task_detail'),
+    'profile': ('GET', 'profile', 'async_profile'),
+    'create': ('POST', 'task-list', 'async_task_list'),
+}
+
+
+async def fetch(host, port, request, slow, timeout):
+    """
+    One request on its own connection. Its last part (the body, or the final
+    line break of the head) is sent `slow` seconds late, like by a client on
+    a bad network.
+    """
+    head, body = request
+    if not body:
+        head, body = head[:-2], head[-2:]
+
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(head)
+        if slow:
+            await writer.drain()
+            await asyncio.sleep(slow)
+        writer.write(body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1]), time.perf_counter() - started
+
+
+async def run_clients(method, url, token, options):
+    parts = urlsplit(url)
+    body = json.dumps({'title': 'Benchmark', 'user': options['user_id']}).encode('utf-8') if method == 'POST' else b''
+    head = (
+        '{method} {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n'
+        'Accept: application/json\r\nContent-Type: application/json\r\nContent-Length: {length}\r\n'
+        'Connection: close\r\n\r\n'
+    ).format(method=method, path=parts.path, host=parts.netloc, token=token, length=len(body)).encode('ascii')
+
+    deadline = time.monotonic() + options['duration']
+    timings, statuses, errors = [], {}, 0
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            try:
+                code, elapsed = await fetch(parts.hostname, parts.port or 80, (head, body), options['slow'],
+                                            options['timeout'])
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                errors += 1
+                continue
+            statuses[code] = statuses.get(code, 0) + 1
+            timings.append(elapsed * 1000)
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+    return timings, statuses, errors, time.monotonic() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the sync task API with its async variant (`/api/v1/async/`) over HTTP, with many concurrent '
+        'and optionally slow clients (`create` adds tasks to the user). Start both servers on the same database '
+        'and settings first, e.g. '
+        '`gunicorn ToDoLessons.wsgi -w 4 -b 127.0.0.1:8000` and '
+        '`uvicorn ToDoLessons.asgi:application --workers 4 --port 8001`'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='User the requests are made as (a token is signed with SECRET_KEY)')
+        parser.add_argument('--sync-url', default='http://127.0.0.1:8000', help='Server of the sync views')
+        parser.add_argument('--async-url', default='http://127.0.0.1:8001', help='Server of the async views')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=sorted(ENDPOINTS),
+                            help='Endpoint to compare, may be repeated (all by default)')
+        parser.add_argument('--concurrency', type=int, default=100, help='Clients making requests at the same time')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds each endpoint is loaded for')
+        parser.add_argument('--slow', type=float, default=0, help='Seconds every client takes to send a request')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds after which a request fails')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError('User %s not found' % options['email'])
+        token = str(AccessToken.for_user(user))
+        options['user_id'] = str(user.pk)
+
+        # Every client holds a socket
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options['concurrency'] + 64
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            if hard != resource.RLIM_INFINITY:
+                wanted = min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+        task_id = Task.objects.filter(user_id=user.id).values_list('pk', flat=True).first()
+        for endpoint in options['endpoints'] or sorted(ENDPOINTS):
+            kwargs = {}
+            if endpoint == 'task':
+                if task_id is None:
+                    raise CommandError('%s has no tasks' % options['email'])
+                kwargs = {'pk': task_id}
+
+            method, sync_url_name, async_url_name = ENDPOINTS[endpoint]
+            for mode, base, url_name in (
+                ('sync', options['sync_url'], sync_url_name),
+                ('async', options['async_url'], async_url_name),
+            ):
+                url = base.rstrip('/') + reverse(url_name, kwargs=kwargs)
+                timings, statuses, errors, elapsed = asyncio.run(run_clients(method, url, token, options))
+                timings.sort()
+                self.stdout.write('%-8s %-6s requests=%-7d %.1f req/s  p50=%.1fms p95=%.1fms p99=%.1fms  '
+                                  'errors=%d statuses=%s' % (
+                                      endpoint,
+                                      mode,
+                                      len(timings),
+                                      len(timings) / elapsed,
+                                      statistics.median(timings) if timings else 0,
+                                      timings[int(len(timings) * 0.95)] if timings else 0,
+                                      timings[int(len(timings) * 0.99)] if timings else 0,
+                                      errors,
+                                      ','.join('%d:%d' % item for item in sorted(statuses.items())),
+                                  ))
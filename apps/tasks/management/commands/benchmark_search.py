@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from apps.tasks.models import Task
+from apps.tasks.search import search_tasks, get_terms
+from apps.user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compares the full-text task search (`q` filter) with the `icontains` lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('query', help='Search query')
+        parser.add_argument('--user', help='Email of the user whose tasks are searched (all tasks by default)')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--size', type=int, default=20, help='Page size to fetch')
+
+    def handle(self, *args, **options):
+        queryset = Task.objects.all()
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('User %s not found' % options['user'])
+            queryset = queryset.filter(user_id=user.id)
+
+        terms = get_terms(options['query'])
+        if not terms:
+            raise CommandError('Query has no searchable terms')
+
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(description__icontains=term)
+
+        paths = (
+            ('icontains', lambda: queryset.filter(condition)),
+            ('full-text', lambda: search_tasks(queryset, options['query']).order_by('-search_rank')),
+        )
+        for name, build in paths:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                qs = build()
+                count = qs.count()
+                list(qs[:options['size']])
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write('%-10s matches=%-8d median=%.2fms p95=%.2fms max=%.2fms' % (
+                name,
+                count,
+                statistics.median(timings),
+                sorted(timings)[max(int(len(timings) * 0.95) - 1, 0)],
+                max(timings),
+            ))
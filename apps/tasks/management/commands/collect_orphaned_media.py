@@ -0,0 +1,175 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.files.models import Blob
+from apps.files.storage import BLOB_DIR
+from apps.tasks.models import TaskAttachment, TaskThumbnail
+from apps.tasks.renditions import RENDITION_DIR
+from apps.user.models import User
+
+ROOTS = ('tasks/attachments', 'tasks/thumbnails', 'user/avatars', BLOB_DIR)
+
+# Models and fields holding names of files under MEDIA_ROOT
+FILE_FIELDS = (
+    (TaskAttachment, 'file'),
+    (TaskThumbnail, 'file'),
+    (User, 'avatar'),
+)
+
+
+def scan_directory(path):
+    files, directories = [], []
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return files, directories
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        except FileNotFoundError:
+            continue
+    return files, directories
+
+
+def get_referenced(names):
+    """
+    Names of `names` still used by a row, one `IN` query per source.
+    """
+    referenced = set()
+    for model, field in FILE_FIELDS:
+        referenced.update(model._base_manager.filter(**{'%s__in' % field: names}).values_list(field, flat=True))
+    referenced.update(Blob.objects.filter(name__in=names, references__gt=0).values_list('name', flat=True))
+
+    # Renditions are listed by their thumbnail, `<dir>/<thumbnail id>/<file>`
+    prefix = RENDITION_DIR + '/'
+    thumbnail_ids = set()
+    for name in names:
+        if name.startswith(prefix):
+            try:
+                thumbnail_ids.add(uuid.UUID(name[len(prefix):].split('/', 1)[0]))
+            except ValueError:
+                # Not under a thumbnail's directory, nothing refers to it
+                continue
+    if thumbnail_ids:
+        for renditions in TaskThumbnail.objects.filter(pk__in=thumbnail_ids).values_list('renditions', flat=True):
+            referenced.update((renditions or {}).values())
+    return referenced
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes (or moves to a quarantine directory) files under MEDIA_ROOT which no attachment, thumbnail, '
+        'avatar or blob refers to. Directories are scanned and batches checked in parallel'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', action='append', dest='roots',
+                            help='Directory under MEDIA_ROOT to scan, may be repeated (%s by default)' % ', '.join(ROOTS))
+        parser.add_argument('--workers', type=int, default=8, help='Threads scanning and checking in parallel')
+        parser.add_argument('--batch-size', type=int, default=1000, help='File names checked per query')
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Seconds a file must be unchanged for, uploads in flight are written before their row')
+        parser.add_argument('--quarantine', help='Move orphans to this directory instead of deleting them')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the orphans')
+
+    def handle(self, *args, **options):
+        self.media_root = os.path.abspath(settings.MEDIA_ROOT)
+        self.cutoff = time.time() - options['min_age']
+        self.quarantine = options['quarantine']
+        self.dry_run = options['dry_run']
+        if self.quarantine and os.path.abspath(self.quarantine).startswith(self.media_root + os.sep):
+            raise CommandError('The quarantine directory must be outside of MEDIA_ROOT')
+
+        batch_size = options['batch_size']
+        max_params = connection.features.max_query_params
+        if max_params:
+            batch_size = min(batch_size, max_params)
+
+        self.lock = threading.Lock()
+        self.scanned = self.orphans = self.orphan_bytes = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            scans = {
+                executor.submit(scan_directory, os.path.join(self.media_root, root))
+                for root in options['roots'] or ROOTS
+            }
+            checks = []
+            pending = []
+            while scans:
+                done, scans = wait(scans, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, directories = future.result()
+                    scans |= {executor.submit(scan_directory, path) for path in directories}
+                    pending += files
+                    while len(pending) >= batch_size:
+                        checks.append(executor.submit(self.check_batch, pending[:batch_size]))
+                        pending = pending[batch_size:]
+            if pending:
+                checks.append(executor.submit(self.check_batch, pending))
+            for future in checks:
+                future.result()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            '%s %d orphans (%.1f MB) of %d files in %.1fs, %.0f files/s' % (
+                'Found' if self.dry_run else ('Quarantined' if self.quarantine else 'Deleted'),
+                self.orphans,
+                self.orphan_bytes / 1024 / 1024,
+                self.scanned,
+                elapsed,
+                self.scanned / elapsed if elapsed else 0,
+            )
+        ))
+
+    def check_batch(self, files):
+        try:
+            names = {os.path.relpath(path, self.media_root).replace(os.sep, '/'): (path, size, mtime)
+                     for path, size, mtime in files}
+            referenced = get_referenced(list(names))
+        finally:
+            # Each worker thread has its own connection
+            connection.close()
+
+        orphans = [
+            (name, path, size) for name, (path, size, mtime) in names.items()
+            if name not in referenced and mtime < self.cutoff
+        ]
+        count = size_total = 0
+        for name, path, size in orphans:
+            if self.dry_run:
+                self.stdout.write(name)
+            elif not self.remove(name, path):
+                continue
+            count += 1
+            size_total += size
+
+        with self.lock:
+            self.scanned += len(files)
+            self.orphans += count
+            self.orphan_bytes += size_total
+
+    def remove(self, name, path):
+        try:
+            if self.quarantine:
+                target = os.path.join(self.quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
@@ -0,0 +1,102 @@
+import itertools
+import re
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.tasks.filters import TaskFilters
+from apps.tasks.models import Task
+
+# Values used to build each filter combination, the plan doesn't depend on them
+SAMPLE_VALUES = {
+    'done': 'true',
+    'title': 'report',
+    'start_date': timezone.now() - timezone.timedelta(days=30),
+    'finish_date': timezone.now(),
+    'q': 'report',
+}
+
+# Plan fragments meaning the query reads the whole table or sorts in memory
+UNCOVERED_MARKERS = {
+    'sqlite': (
+        re.compile(r'SCAN tasks_task\b(?!_fts)'),
+        re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY'),
+    ),
+    'postgresql': (
+        re.compile(r'Seq Scan on tasks_task\b'),
+        re.compile(r'Sort Key'),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN for every `TaskFilters` combination and reports the ones not covered by an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='User id to scope queries with (random by default)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+
+    def get_combinations(self):
+        names = [name for name in TaskFilters.base_filters if name != 'sort']
+        sort_filter = TaskFilters.base_filters['sort']
+        sorts = [None] + [
+            prefix + param
+            for param in sort_filter.param_map
+            for prefix in ('', '-')
+        ]
+
+        for size in range(len(names) + 1):
+            for combination in itertools.combinations(names, size):
+                for sort in sorts:
+                    data = {name: SAMPLE_VALUES.get(name, '') for name in combination}
+                    if sort:
+                        data['sort'] = sort
+                    yield data
+
+    @staticmethod
+    def describe(data):
+        filters = ', '.join(name for name in data if name != 'sort') or 'no filters'
+        return '%s (sort=%s)' % (filters, data.get('sort', 'default'))
+
+    def explain(self, queryset):
+        vendor = connection.vendor
+        with transaction.atomic():
+            if vendor == 'postgresql':
+                # Tiny tables make the planner prefer seq scans, ask whether an index *can* be used
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+
+    def handle(self, *args, **options):
+        user_id = options['user'] or uuid.uuid4()
+        markers = UNCOVERED_MARKERS.get(connection.vendor, ())
+        if not markers:
+            self.stderr.write('Plan analysis is not supported for %s, plans are printed as is' % connection.vendor)
+
+        started = timezone.now()
+        total = uncovered = 0
+        for data in self.get_combinations():
+            filterset = TaskFilters(data, queryset=Task.objects.filter(user_id=user_id))
+            if not filterset.is_valid():
+                self.stderr.write('Invalid combination %s: %s' % (self.describe(data), dict(filterset.errors)))
+                continue
+
+            plan = self.explain(filterset.qs)
+            total += 1
+            problems = [match.group(0) for match in (marker.search(plan) for marker in markers) if match]
+
+            if problems or not markers:
+                uncovered += 1 if problems else 0
+                self.stdout.write(self.style.WARNING('%s -> %s' % (self.describe(data), ', '.join(problems) or 'unknown')))
+                self.stdout.write(plan)
+            elif options['verbose_plans']:
+                self.stdout.write('%s -> ok' % self.describe(data))
+                self.stdout.write(plan)
+
+        self.stdout.write(
+            '%d combinations explained, %d not covered by an index (%.1fs)' % (
+                total, uncovered, (timezone.now() - started).total_seconds()
+            )
+        )
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.export import iter_export, FORMATS
+from apps.tasks.models import Task
+from apps.user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Streams all tasks of a user as NDJSON or CSV with constant memory use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the user to export')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', help='File to write to (stdout by default)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError('User %s not found' % options['email'])
+
+        chunks = iter_export(
+            Task.objects.filter(user_id=user.id),
+            options['format'],
+            chunk_size=options['chunk_size'],
+        )
+        if not options['output']:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+
+        rows = -1 if options['format'] == 'csv' else 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                rows += 1
+        self.stderr.write('Exported %d tasks to %s' % (rows, options['output']))
@@ -0,0 +1,59 @@
+import json
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+
+from apps.tasks.importer import DECODE_ERRORS, TaskImporter, iter_records, FORMATS
+from apps.user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Imports tasks of a user from an NDJSON or CSV file in batched inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the user to import the tasks for')
+        parser.add_argument('path', help='File to read from ("-" for stdin)')
+        parser.add_argument('--format', choices=FORMATS, help='Guessed from the file extension by default')
+        parser.add_argument('--batch-size', type=int, help='Rows per insert, TASK_IMPORT_BATCH_SIZE by default')
+        parser.add_argument('--max-errors', type=int, default=100, help='Number of row errors to print')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError('User %s not found' % options['email'])
+
+        path = options['path']
+        import_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        importer = TaskImporter(user, batch_size=options['batch_size'], max_errors=options['max_errors'])
+
+        started = time.monotonic()
+
+        def progress(importer):
+            # The query log kept with DEBUG = True would grow with every batch
+            reset_queries()
+            if self.stderr.isatty():
+                self.stderr.write('%d imported, %d failed' % (importer.created, importer.failed), ending='\r')
+
+        if path == '-':
+            sys.stdin.reconfigure(errors=DECODE_ERRORS)
+            result = importer.run(iter_records(sys.stdin, import_format), progress=progress)
+        else:
+            with open(path, encoding='utf-8-sig', errors=DECODE_ERRORS, newline='') as stream:
+                result = importer.run(iter_records(stream, import_format), progress=progress)
+
+        elapsed = time.monotonic() - started
+        for error in result['errors']:
+            self.stderr.write('Row %d: %s' % (error['row'], json.dumps(error['errors'], ensure_ascii=False)))
+
+        # ru_maxrss is in kilobytes on Linux
+        self.stdout.write('Imported %d tasks (%d failed) in %.1fs, %.0f rows/s, peak RSS %.1f MB' % (
+            result['created'],
+            result['failed'],
+            elapsed,
+            result['created'] / elapsed if elapsed else 0,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        ))
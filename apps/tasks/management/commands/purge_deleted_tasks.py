@@ -0,0 +1,93 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.tasks.models import Task, TaskAttachment, TaskThumbnail, TaskTombstone
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Hard deletes soft deleted tasks past the retention period, with their attachments, thumbnails and files. '
+        'Also drops delta sync tombstones older than the retention period'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'TASK_TRASH_RETENTION_DAYS', 30),
+            help='Keep deleted tasks for this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Tasks deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(days=options['days'])
+        queryset = Task.all_objects.filter(deleted=True, deleted_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write('%d tasks deleted before %s would be purged' % (queryset.count(), cutoff.isoformat()))
+            return
+
+        started = time.monotonic()
+        tasks = files = 0
+        while True:
+            ids = list(queryset.order_by('deleted_at').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+
+            purged, removed_files = self.purge_batch(queryset, ids)
+            tasks += purged
+            files += removed_files
+            self.stdout.write('Purged %d tasks, %d files' % (tasks, files))
+
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        tombstones = self.purge_tombstones(cutoff, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Done: %d tasks, %d files, %d tombstones in %.1fs' % (
+                tasks, files, tombstones, time.monotonic() - started
+            )
+        ))
+
+    def purge_tombstones(self, cutoff, batch_size):
+        # Clients with older watermarks are asked to do a full sync anyway
+        queryset = TaskTombstone.objects.filter(updated_at__lt=cutoff)
+        total = 0
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            total += TaskTombstone.objects.filter(pk__in=ids).delete()[0]
+
+    def purge_batch(self, queryset, ids):
+        files = []
+        with transaction.atomic():
+            # Tasks restored since the ids were selected are skipped
+            ids = list(queryset.filter(pk__in=ids).select_for_update().values_list('id', flat=True))
+
+            for model in (TaskAttachment, TaskThumbnail):
+                storage = model._meta.get_field('file').storage
+                names = model.objects.filter(task_id__in=ids).values_list('file', flat=True)
+                files += [(storage, name) for name in names if name]
+
+            # Attachments and thumbnails go with the cascade
+            Task.all_objects.filter(pk__in=ids).delete()
+
+        # Files are removed only once the rows are gone for good
+        for storage, name in files:
+            try:
+                storage.delete(name)
+            except OSError:
+                logger.warning('Failed to delete %s', name, exc_info=True)
+
+        return len(ids), len(files)
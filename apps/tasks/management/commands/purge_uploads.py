@@ -0,0 +1,66 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.tasks.models import TaskUpload
+from apps.tasks.uploads import CHUNK_SUFFIX, get_upload_dir, remove_part_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired chunked upload sessions with their part files, and part files '
+        'left without a session (e.g. by tasks deleted with their uploads) or received chunks left by killed workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions deleted per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        queryset = TaskUpload.objects.filter(expires_at__lte=now)
+
+        if options['dry_run']:
+            self.stdout.write('%d expired uploads would be purged' % queryset.count())
+            return
+
+        started = time.monotonic()
+        sessions = 0
+        while True:
+            uploads = list(queryset.only('id')[:options['batch_size']])
+            if not uploads:
+                break
+            TaskUpload.objects.filter(pk__in=[upload.pk for upload in uploads]).delete()
+            for upload in uploads:
+                remove_part_file(upload)
+            sessions += len(uploads)
+
+        strays = self.purge_strays(now.timestamp() - getattr(settings, 'TASK_UPLOAD_EXPIRY', 60 * 60 * 24))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Done: %d sessions, %d stray part files in %.1fs' % (sessions, strays, time.monotonic() - started)
+        ))
+
+    def purge_strays(self, cutoff):
+        # Part files untouched for longer than the expiry can't belong to a live session
+        try:
+            entries = list(os.scandir(get_upload_dir()))
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        for entry in entries:
+            if not entry.name.endswith(('.part', CHUNK_SUFFIX)) or entry.stat().st_mtime > cutoff:
+                continue
+            # Received chunks are removed by their request once appended
+            if entry.name.endswith('.part') and TaskUpload.objects.filter(pk=entry.name[:-len('.part')]).exists():
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
@@ -0,0 +1,29 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apps.tasks.models import TaskThumbnail
+from apps.tasks.renditions import run_job
+
+
+class Command(BaseCommand):
+    help = 'Makes the renditions of thumbnails which have none (e.g. uploaded before they existed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Render every thumbnail again')
+        parser.add_argument('--workers', type=int, default=4, help='Threads rendering in parallel')
+
+    def handle(self, *args, **options):
+        queryset = TaskThumbnail.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(renditions={})
+
+        started = time.monotonic()
+        total = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for thumbnail_id in queryset.values_list('id', flat=True).iterator():
+                executor.submit(run_job, thumbnail_id)
+                total += 1
+
+        self.stdout.write(self.style.SUCCESS('Rendered %d thumbnails in %.1fs' % (total, time.monotonic() - started)))
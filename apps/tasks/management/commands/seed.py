@@ -0,0 +1,246 @@
+import datetime
+import functools
+import operator
+import random
+import re
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from faker import Faker
+
+from apps.tasks.models import Task, TaskAttachment, TaskThumbnail
+from apps.user.models import User
+
+# Generated dates lie within `--days` before this, so they don't depend on the day of the run
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+ATTACHMENT_EXTENSIONS = ('pdf', 'docx', 'xlsx', 'txt', 'png', 'jpg')
+THUMBNAIL_EXTENSIONS = ('jpg', 'png')
+
+# Sizes of the pools of fake texts, Faker is far too slow to call per row
+TITLES = 5000
+DESCRIPTIONS = 2000
+
+# Columns of the generated rows
+USER_FIELDS = (
+    'id', 'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff',
+    'is_active', 'date_joined', 'avatar', 'updated_at',
+)
+TASK_FIELDS = ('id', 'created_at', 'updated_at', 'deleted', 'deleted_at', 'done', 'title', 'description', 'user')
+ATTACHMENT_FIELDS = ('id', 'created_at', 'updated_at', 'file', 'task')
+THUMBNAIL_FIELDS = ('id', 'created_at', 'updated_at', 'file', 'renditions', 'task')
+
+
+class RowInserter:
+    """
+    Multi-row INSERTs of plain tuples (values of `fields`, in that order).
+    `bulk_create` spends most of its time building model instances and
+    preparing every value through its field; here only UUIDs and dates need
+    converting, with one function per column.
+    """
+
+    def __init__(self, model, fields):
+        self.fields = [model._meta.get_field(name) for name in fields]
+        self.converters = [self.get_converter(field) for field in self.fields]
+        self.table = connection.ops.quote_name(model._meta.db_table)
+        self.columns = ', '.join(connection.ops.quote_name(field.column) for field in self.fields)
+        self.batch_size = connection.ops.bulk_batch_size(self.fields, [None] * 10000)
+
+    @staticmethod
+    def get_converter(field):
+        if field.is_relation:
+            field = field.target_field
+        internal_type = field.get_internal_type()
+        if internal_type == 'UUIDField':
+            return None if connection.features.has_native_uuid_field else operator.attrgetter('hex')
+        if internal_type == 'DateTimeField':
+            return connection.ops.adapt_datetimefield_value
+        if internal_type in ('BooleanField', 'CharField', 'EmailField', 'FileField', 'TextField'):
+            return None
+        return functools.partial(field.get_db_prep_save, connection=connection)
+
+    def insert(self, rows):
+        converters = list(enumerate(self.converters))
+        placeholders = '(%s)' % ', '.join(['%s'] * len(self.fields))
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                params = []
+                for row in chunk:
+                    for index, convert in converters:
+                        params.append(row[index] if convert is None else convert(row[index]))
+                values = ', '.join([placeholders] * len(chunk))
+                cursor.execute('INSERT INTO %s (%s) VALUES %s' % (self.table, self.columns, values), params)
+
+
+class Seeder:
+    """
+    Generates users with a Pareto distributed number of tasks (a few users
+    own most of them, like in production) and a geometric number of
+    attachments/thumbnails per task. Everything, ids included, derives from
+    `seed`, so two runs on empty databases produce the same rows.
+    """
+
+    def __init__(self, seed, options):
+        self.seed = seed
+        self.options = options
+        self.random = random.Random(seed)
+        self.fake = Faker()
+        self.fake.seed_instance(seed)
+        self.titles = [self.fake.sentence(nb_words=6).rstrip('.') for _ in range(TITLES)]
+        self.descriptions = [None] + [self.fake.paragraph(nb_sentences=3) for _ in range(DESCRIPTIONS)]
+        self.period = datetime.timedelta(days=options['days']).total_seconds()
+
+        self.inserters = {
+            User: RowInserter(User, USER_FIELDS),
+            Task: RowInserter(Task, TASK_FIELDS),
+            TaskAttachment: RowInserter(TaskAttachment, ATTACHMENT_FIELDS),
+            TaskThumbnail: RowInserter(TaskThumbnail, THUMBNAIL_FIELDS),
+        }
+        # Tasks first, the others refer to them
+        self.batch = {Task: [], TaskAttachment: [], TaskThumbnail: []}
+        self.created = {User: 0, Task: 0, TaskAttachment: 0, TaskThumbnail: 0}
+
+    def make_id(self):
+        return uuid.UUID(int=self.random.getrandbits(128), version=4)
+
+    def make_date(self, after=None):
+        if after is None:
+            return EPOCH - datetime.timedelta(seconds=self.random.random() * self.period)
+        return after + datetime.timedelta(seconds=self.random.random() * (EPOCH - after).total_seconds())
+
+    def get_task_count(self):
+        # Pareto with the minimum chosen so the mean is `--tasks-per-user`
+        alpha = self.options['skew']
+        minimum = self.options['tasks_per_user'] * (alpha - 1) / alpha
+        return min(int(minimum * self.random.paretovariate(alpha)), self.options['max_tasks_per_user'])
+
+    def get_file_count(self, mean):
+        # Geometric with the given mean
+        count = 0
+        while self.random.random() < mean / (1 + mean):
+            count += 1
+        return count
+
+    def make_users(self, start, count, password):
+        users = []
+        for number in range(start, start + count):
+            first_name, last_name = self.fake.first_name(), self.fake.last_name()
+            email = '%s.%s.%d-%d@%s' % (
+                re.sub('[^a-z]', '', first_name.lower()),
+                re.sub('[^a-z]', '', last_name.lower()),
+                self.seed,
+                number,
+                self.options['domain'],
+            )
+            date_joined = self.make_date()
+            users.append((
+                self.make_id(), password, None, False, email, first_name, last_name, email, False, True,
+                date_joined, None, date_joined,
+            ))
+        return users
+
+    def make_tasks(self, user_id, date_joined):
+        for _ in range(self.get_task_count()):
+            task_id = self.make_id()
+            created_at = self.make_date(after=date_joined)
+            updated_at = self.make_date(after=created_at)
+            deleted = self.random.random() < self.options['deleted']
+            self.add(Task, (
+                task_id, created_at, updated_at, deleted, updated_at if deleted else None,
+                self.random.random() < self.options['done'],
+                self.random.choice(self.titles), self.random.choice(self.descriptions), user_id,
+            ))
+
+            for _ in range(self.get_file_count(self.options['attachments'])):
+                name = 'tasks/attachments/%s.%s' % (self.make_id(), self.random.choice(ATTACHMENT_EXTENSIONS))
+                self.add(TaskAttachment, (self.make_id(), created_at, created_at, name, task_id))
+            for _ in range(self.get_file_count(self.options['thumbnails'])):
+                name = 'tasks/thumbnails/%s.%s' % (self.make_id(), self.random.choice(THUMBNAIL_EXTENSIONS))
+                self.add(TaskThumbnail, (self.make_id(), created_at, created_at, name, {}, task_id))
+
+    def add(self, model, row):
+        batch = self.batch[model]
+        batch.append(row)
+        if len(batch) >= self.options['batch_size']:
+            self.flush()
+
+    def flush(self):
+        with transaction.atomic():
+            for model, batch in self.batch.items():
+                if batch:
+                    self.inserters[model].insert(batch)
+                    self.created[model] += len(batch)
+                    batch.clear()
+        # The query log kept with DEBUG = True would grow with every batch
+        reset_queries()
+
+    def run(self, progress=None):
+        # Hashed once, every user gets the same password
+        password = make_password(self.options['password'])
+        count = self.options['users']
+        for start in range(0, count, self.options['batch_size']):
+            users = self.make_users(start, min(self.options['batch_size'], count - start), password)
+            if not start and User.objects.filter(pk=users[0][0]).exists():
+                raise CommandError('Seed %d was used already, pass another --seed' % self.seed)
+            with transaction.atomic():
+                self.inserters[User].insert(users)
+            self.created[User] += len(users)
+
+            for user in users:
+                self.make_tasks(user[0], user[10])
+                if progress is not None:
+                    progress(self)
+        self.flush()
+        return self.created
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the database with a deterministic synthetic dataset: users with a skewed number of tasks, '
+        'attachments and thumbnails (files are not created)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tasks-per-user', type=float, default=100, help='Mean number of tasks per user')
+        parser.add_argument('--max-tasks-per-user', type=int, default=100000)
+        parser.add_argument('--skew', type=float, default=1.5,
+                            help='Pareto shape of the tasks per user, lower is more skewed (> 1)')
+        parser.add_argument('--attachments', type=float, default=0.3, help='Mean number of attachments per task')
+        parser.add_argument('--thumbnails', type=float, default=0.2, help='Mean number of thumbnails per task')
+        parser.add_argument('--done', type=float, default=0.4, help='Share of done tasks')
+        parser.add_argument('--deleted', type=float, default=0.02, help='Share of soft deleted tasks')
+        parser.add_argument('--days', type=int, default=3 * 365, help='Period the dates are spread over')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='password', help='Password of every user')
+        parser.add_argument('--domain', default='example.com', help='Domain of the users\' emails')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per transaction')
+
+    def handle(self, *args, **options):
+        if options['skew'] <= 1:
+            raise CommandError('--skew must be above 1')
+
+        started = time.monotonic()
+
+        def progress(seeder):
+            if self.stderr.isatty():
+                self.stderr.write('%d users, %d tasks' % (seeder.created[User], seeder.created[Task]), ending='\r')
+
+        created = Seeder(options['seed'], options).run(progress=progress)
+
+        elapsed = time.monotonic() - started
+        rows = sum(created.values())
+        self.stdout.write(self.style.SUCCESS(
+            'Created %d users, %d tasks, %d attachments, %d thumbnails in %.1fs, %.0f rows/s' % (
+                created[User],
+                created[Task],
+                created[TaskAttachment],
+                created[TaskThumbnail],
+                elapsed,
+                rows / elapsed if elapsed else 0,
+            )
+        ))
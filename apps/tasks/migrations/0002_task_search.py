@@ -0,0 +1,57 @@
+from django.db import migrations
+
+FORWARD = {
+    'postgresql': (
+        "CREATE INDEX IF NOT EXISTS tasks_task_search_idx ON tasks_task USING GIN "
+        "(to_tsvector('simple', coalesce(tasks_task.title, '') || ' ' || coalesce(tasks_task.description, '')))",
+    ),
+    'sqlite': (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_task_fts USING fts5("
+        "title, description, content='tasks_task', content_rowid='rowid')",
+        "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ai AFTER INSERT ON tasks_task BEGIN "
+        "INSERT INTO tasks_task_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ad AFTER DELETE ON tasks_task BEGIN "
+        "INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description) "
+        "VALUES ('delete', old.rowid, old.title, old.description); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_au AFTER UPDATE OF title, description ON tasks_task BEGIN "
+        "INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description) "
+        "VALUES ('delete', old.rowid, old.title, old.description); "
+        "INSERT INTO tasks_task_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); "
+        "END",
+        "INSERT INTO tasks_task_fts(tasks_task_fts) VALUES ('rebuild')",
+    ),
+}
+BACKWARD = {
+    'postgresql': (
+        "DROP INDEX IF EXISTS tasks_task_search_idx",
+    ),
+    'sqlite': (
+        "DROP TRIGGER IF EXISTS tasks_task_fts_au",
+        "DROP TRIGGER IF EXISTS tasks_task_fts_ad",
+        "DROP TRIGGER IF EXISTS tasks_task_fts_ai",
+        "DROP TABLE IF EXISTS tasks_task_fts",
+    ),
+}
+
+
+def forwards(apps, schema_editor):
+    for statement in FORWARD.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def backwards(apps, schema_editor):
+    for statement in BACKWARD.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
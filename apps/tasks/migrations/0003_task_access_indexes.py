@@ -0,0 +1,37 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_task_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='task_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'done', '-created_at', '-id'], name='task_user_done_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='task_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', '-created_at', '-id'], name='task_user_alive_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskattachment',
+            index=models.Index(fields=['task', '-created_at'], name='attachment_task_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskthumbnail',
+            index=models.Index(fields=['task', '-created_at'], name='thumbnail_task_created_idx'),
+        ),
+    ]
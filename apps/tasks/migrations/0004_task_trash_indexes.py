@@ -0,0 +1,21 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_task_access_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted', True)), fields=['user', '-deleted_at'], name='task_user_trash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted', True)), fields=['deleted_at'], name='task_trash_purge_idx'),
+        ),
+    ]
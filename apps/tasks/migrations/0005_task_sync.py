@@ -0,0 +1,49 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0004_task_trash_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTombstone',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True, verbose_name='Обновлено')),
+                ('kind', models.CharField(choices=[('task', 'Task'), ('attachment', 'Attachment'), ('thumbnail', 'Thumbnail')], max_length=16)),
+                ('object_id', models.UUIDField()),
+            ],
+            options={
+                'verbose_name': 'Task Tombstone',
+                'verbose_name_plural': 'Task Tombstones',
+                'ordering': ('updated_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='taskattachment',
+            index=models.Index(fields=['updated_at', 'id'], name='attachment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskthumbnail',
+            index=models.Index(fields=['updated_at', 'id'], name='thumbnail_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='tasktombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tasktombstone',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='tombstone_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0005_task_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True, verbose_name='Обновлено')),
+                ('kind', models.CharField(choices=[('attachment', 'Attachment'), ('thumbnail', 'Thumbnail')], max_length=16)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('chunks', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField()),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='tasks.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Task Upload',
+                'verbose_name_plural': 'Task Uploads',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='taskupload',
+            index=models.Index(fields=['expires_at'], name='upload_expires_idx'),
+        ),
+    ]
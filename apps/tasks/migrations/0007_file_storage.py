@@ -0,0 +1,25 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:51
+
+import apps.files.storage
+from django.db import migrations, models
+import utils.files
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_upload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskattachment',
+            name='file',
+            field=models.FileField(storage=apps.files.storage.get_file_storage, upload_to=utils.files.SetUploadPath('tasks/attachments')),
+        ),
+        migrations.AlterField(
+            model_name='taskthumbnail',
+            name='file',
+            field=models.FileField(storage=apps.files.storage.get_file_storage, upload_to=utils.files.SetUploadPath('tasks/thumbnails')),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_file_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskthumbnail',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_thumbnail_renditions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskattachment',
+            index=models.Index(fields=['file'], name='attachment_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskthumbnail',
+            index=models.Index(fields=['file'], name='thumbnail_file_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# Only the SQLite index changes: FTS5 rows were keyed by `tasks_task` rowids,
+# which VACUUM and table rebuilds renumber
+DROP_INDEX = (
+    "DROP TRIGGER IF EXISTS tasks_task_fts_au",
+    "DROP TRIGGER IF EXISTS tasks_task_fts_ad",
+    "DROP TRIGGER IF EXISTS tasks_task_fts_ai",
+    "DROP TABLE IF EXISTS tasks_task_fts",
+)
+
+FORWARD = DROP_INDEX + (
+    # Task UUIDs can't be FTS5 rowids, rows are keyed by a stable integer
+    "CREATE TABLE IF NOT EXISTS tasks_task_search_key ("
+    "id INTEGER PRIMARY KEY, task_id char(32) NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_task_fts USING fts5(title, description, content='')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ai AFTER INSERT ON tasks_task BEGIN "
+    "INSERT INTO tasks_task_search_key(task_id) VALUES (new.id); "
+    "INSERT INTO tasks_task_fts(rowid, title, description) "
+    "SELECT id, new.title, new.description FROM tasks_task_search_key WHERE task_id = new.id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ad AFTER DELETE ON tasks_task BEGIN "
+    "INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description) "
+    "SELECT 'delete', id, old.title, old.description FROM tasks_task_search_key WHERE task_id = old.id; "
+    "DELETE FROM tasks_task_search_key WHERE task_id = old.id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_au AFTER UPDATE OF title, description ON tasks_task BEGIN "
+    "INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description) "
+    "SELECT 'delete', id, old.title, old.description FROM tasks_task_search_key WHERE task_id = old.id; "
+    "INSERT INTO tasks_task_fts(rowid, title, description) "
+    "SELECT id, new.title, new.description FROM tasks_task_search_key WHERE task_id = new.id; "
+    "END",
+    "INSERT INTO tasks_task_search_key(task_id) SELECT id FROM tasks_task",
+    "INSERT INTO tasks_task_fts(rowid, title, description) "
+    "SELECT tasks_task_search_key.id, tasks_task.title, tasks_task.description FROM tasks_task "
+    "INNER JOIN tasks_task_search_key ON tasks_task_search_key.task_id = tasks_task.id",
+)
+
+BACKWARD = DROP_INDEX + (
+    "DROP TABLE IF EXISTS tasks_task_search_key",
+    # The index of 0002_task_search
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_task_fts USING fts5("
+    "title, description, content='tasks_task', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ai AFTER INSERT ON tasks_task BEGIN "
+    "INSERT INTO tasks_task_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ad AFTER DELETE ON tasks_task BEGIN "
+    "INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_task_fts_au AFTER UPDATE OF title, description ON tasks_task BEGIN "
+    "INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description) "
+    "VALUES ('delete', old.rowid, old.title, old.description); "
+    "INSERT INTO tasks_task_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); "
+    "END",
+    "INSERT INTO tasks_task_fts(tasks_task_fts) VALUES ('rebuild')",
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_file_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_task_search_key'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_user_created_idx',
+        ),
+    ]
@@ -1,22 +1,53 @@
-from rest_framework import exceptions
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema, no_body
+from rest_framework import exceptions, status
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
+from django.db import transaction
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from apps.tasks.models import Task
+from apps.tasks.models import Task, TaskUpload
+from apps.tasks.serializers import TaskUploadSerializer
+from apps.tasks.uploads import (
+    PartFile,
+    ChunkTooLarge,
+    PartFileLost,
+    receive_chunk,
+    append_chunk,
+    remove_chunk,
+    get_part_path,
+    get_expires_at,
+    remove_part_file,
+)
+from utils.conditional import make_etag
+from utils.downloads import serve_file, AnyMediaTypeRenderer
+from utils.pagination import SWAGGER_PAGINATION_KWARGS
+from utils.response_cache import cache_response
 
 
 class TaskRelatedModelMixin:
     target_attribute = ''
 
     def get_instance(self) -> Task:
+        # Cached per request, `get_queryset` and `get_serializer_context` both need it
+        if getattr(self, '_task', None) is not None:
+            return self._task
+
         task_id = self.kwargs.get('task')
 
         try:
-            return Task.objects.get(id=task_id)
+            # Tasks of other users don't exist for the requesting one
+            self._task = Task.objects.get(id=task_id, user_id=self.request.user.id)
         except Task.DoesNotExist:
             raise exceptions.ValidationError({
                 'task': [_('Task not found!')]
             })
+        return self._task
 
     def get_queryset(self):
         if not self.target_attribute:
@@ -25,3 +56,189 @@ class TaskRelatedModelMixin:
         task = self.get_instance()
         queryset = getattr(task, self.target_attribute)
         return queryset.all()
+
+    def get_cache_owner_id(self, request, *args, **kwargs):
+        # Invalidated with the task owner's responses
+        return self.get_instance().user_id
+
+    @swagger_auto_schema(
+        operation_summary='',
+        **SWAGGER_PAGINATION_KWARGS,
+    )
+    @cache_response
+    def list(self, *args, **kwargs):
+        return super().list(*args, **kwargs)
+
+
+class ChunkedUploadMixin:
+    """
+    Resumable uploads of the viewset's `file`: POST `uploads/` opens a session,
+    PUT `uploads/<id>/chunks/<n>/` appends the raw body of chunk `n` (chunks are
+    numbered from 0 and sent in order) and POST `uploads/<id>/finalize/`
+    creates the object from the assembled file. GET `uploads/<id>/` tells a
+    client where to resume.
+    """
+    upload_kind = ''
+
+    def get_upload(self, lock=False):
+        queryset = TaskUpload.objects.filter(
+            task_id=self.kwargs.get('task'),
+            user_id=self.request.user.id,
+            kind=self.upload_kind,
+            expires_at__gt=timezone.now(),
+        )
+        if lock:
+            queryset = queryset.select_for_update()
+        return get_object_or_404(queryset, pk=self.kwargs['upload'])
+
+    def check_chunk(self, upload, index):
+        """
+        Response to a chunk which mustn't be appended, None for the next one.
+        """
+        if index < upload.chunks:
+            # Already stored, the response to the first attempt was lost
+            return Response(TaskUploadSerializer(upload).data)
+        if index > upload.chunks:
+            return Response(
+                {'detail': _('Expected chunk %d') % upload.chunks, 'chunks': upload.chunks},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return None
+
+    @swagger_auto_schema(
+        operation_summary='Start a chunked upload',
+        request_body=TaskUploadSerializer(),
+        responses={201: TaskUploadSerializer()},
+    )
+    @action(detail=False, methods=['post'], url_path='uploads', serializer_class=TaskUploadSerializer,
+            parser_classes=(JSONParser,))
+    def create_upload(self, request, *args, **kwargs):
+        serializer = TaskUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(
+            task=self.get_instance(),
+            user=request.user,
+            kind=self.upload_kind,
+            expires_at=get_expires_at(),
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_summary='Chunked upload state',
+        responses={200: TaskUploadSerializer()},
+    )
+    @action(detail=False, methods=['get'], url_path=r'uploads/(?P<upload>[0-9a-f-]+)',
+            serializer_class=TaskUploadSerializer, pagination_class=None)
+    def upload_state(self, request, *args, **kwargs):
+        return Response(TaskUploadSerializer(self.get_upload()).data)
+
+    @swagger_auto_schema(
+        operation_summary='Upload a chunk',
+        request_body=no_body,
+        manual_parameters=[
+            openapi.Parameter('index', openapi.IN_PATH, type=openapi.TYPE_INTEGER,
+                              description='Number of the chunk, starting from 0'),
+        ],
+        responses={
+            200: TaskUploadSerializer(),
+            409: "{'detail': 'Expected chunk 3', 'chunks': 3}",
+        },
+    )
+    @action(detail=False, methods=['put'], url_path=r'uploads/(?P<upload>[0-9a-f-]+)/chunks/(?P<index>[0-9]+)',
+            serializer_class=TaskUploadSerializer)
+    def upload_chunk(self, request, *args, **kwargs):
+        index = int(kwargs['index'])
+        upload = self.get_upload()
+        response = self.check_chunk(upload, index)
+        if response is not None:
+            return response
+
+        # No stream for empty bodies
+        if request.stream is None:
+            raise exceptions.ValidationError({'detail': [_('Chunk is empty')]})
+        try:
+            # Read from the raw stream, the chunk is never held in memory as a whole
+            path, written = receive_chunk(upload, request.stream)
+        except ChunkTooLarge:
+            return Response({'detail': _('Chunk is too large')}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        try:
+            if not written:
+                raise exceptions.ValidationError({'detail': [_('Chunk is empty')]})
+
+            # The row lock keeps concurrent requests from writing the same part file,
+            # it's only held while the received chunk is appended
+            with transaction.atomic():
+                upload = self.get_upload(lock=True)
+                response = self.check_chunk(upload, index)
+                if response is not None:
+                    return response
+
+                try:
+                    append_chunk(upload, path, written)
+                except ChunkTooLarge:
+                    return Response(
+                        {'detail': _('Chunk is too large')},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    )
+                except PartFileLost:
+                    remove_part_file(upload)
+                    upload.delete()
+                    return Response({'detail': _('Upload was lost, start it again')}, status=status.HTTP_410_GONE)
+
+                upload.received += written
+                upload.chunks += 1
+                upload.expires_at = get_expires_at()
+                upload.save(update_fields=('received', 'chunks', 'expires_at', 'updated_at'))
+        finally:
+            remove_chunk(path)
+        return Response(TaskUploadSerializer(upload).data)
+
+    @swagger_auto_schema(
+        operation_summary='Finish a chunked upload',
+        request_body=no_body,
+    )
+    @action(detail=False, methods=['post'], url_path=r'uploads/(?P<upload>[0-9a-f-]+)/finalize')
+    def finalize_upload(self, request, *args, **kwargs):
+        with transaction.atomic():
+            upload = self.get_upload(lock=True)
+            if not upload.received:
+                raise exceptions.ValidationError({'detail': [_('Nothing was uploaded')]})
+            if upload.size is not None and upload.received != upload.size:
+                raise exceptions.ValidationError({
+                    'size': [_('Received %d of %d bytes') % (upload.received, upload.size)],
+                })
+
+            try:
+                part = PartFile(get_part_path(upload), upload.filename)
+            except FileNotFoundError:
+                upload.delete()
+                return Response({'detail': _('Upload was lost, start it again')}, status=status.HTTP_410_GONE)
+
+            with part:
+                serializer = self.get_serializer(data={'file': part})
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+            upload.delete()
+        # Left behind by storages which copy instead of moving
+        remove_part_file(upload)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class FileDownloadMixin:
+    """
+    GET `<id>/download/` sends the object's `file` to the task owner, see
+    `utils.downloads.serve_file` for ranges and web server offloading.
+    """
+
+    @swagger_auto_schema(
+        operation_summary='Download the file',
+        responses={200: 'File content', 206: 'Requested range of the file', 304: 'Not modified'},
+    )
+    @action(detail=True, methods=['get'], renderer_classes=(JSONRenderer, AnyMediaTypeRenderer))
+    def download(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = int(instance.updated_at.timestamp()) if instance.updated_at else None
+        # File names are unique and never reused, the name identifies the content
+        return serve_file(request, instance.file, etag=make_etag(instance.file.name), last_modified=last_modified)
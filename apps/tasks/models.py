@@ -1,16 +1,55 @@
 from django.db import models
+from django.utils import timezone
 
+from apps.files.models import BlobFieldsMixin
+from apps.files.storage import get_file_storage
 from utils.models import AbstractModel
 from utils.files import SetUploadPath
 
 # Create your models here.
 
 
+class TaskQuerySet(models.QuerySet):
+
+    def soft_delete(self):
+        now = timezone.now()
+        return self.filter(deleted=False).update(deleted=True, deleted_at=now, updated_at=now)
+
+    def restore(self):
+        return self.filter(deleted=True).update(deleted=False, deleted_at=None, updated_at=timezone.now())
+
+
+class TaskManager(models.Manager.from_queryset(TaskQuerySet)):
+    """
+    Default manager, hides soft deleted tasks. Use `Task.all_objects` to reach them.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted=False)
+
+
 class Task(AbstractModel):
     class Meta:
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
         ordering = ('-created_at',)
+        # Every list is scoped by user and ordered by created_at/updated_at (+ id for keyset pagination),
+        # lists by created_at only show tasks which aren't soft deleted
+        indexes = (
+            models.Index(fields=('user', 'done', '-created_at', '-id'), name='task_user_done_created_idx'),
+            models.Index(fields=('user', '-updated_at', '-id'), name='task_user_updated_idx'),
+            models.Index(
+                fields=('user', '-created_at', '-id'),
+                name='task_user_alive_created_idx',
+                condition=models.Q(deleted=False),
+            ),
+            models.Index(
+                fields=('user', '-deleted_at'),
+                name='task_user_trash_idx',
+                condition=models.Q(deleted=True),
+            ),
+            models.Index(fields=('deleted_at',), name='task_trash_purge_idx', condition=models.Q(deleted=True)),
+        )
 
     deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
@@ -22,25 +61,115 @@ class Task(AbstractModel):
 
     user = models.ForeignKey(to='user.User', on_delete=models.CASCADE)
 
+    objects = TaskManager()
+    all_objects = models.Manager.from_queryset(TaskQuerySet)()
 
-class TaskAttachment(AbstractModel):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stored state of `done`/`deleted`, used by signals to maintain task counters
+        instance._loaded_done = instance.__dict__.get('done')
+        instance._loaded_deleted = instance.__dict__.get('deleted')
+        return instance
+
+
+class TaskAttachment(BlobFieldsMixin, AbstractModel):
     class Meta:
         verbose_name = 'Task Attachment'
         verbose_name_plural = 'Task Attachments'
         ordering = ('-created_at',)
+        indexes = (
+            models.Index(fields=('task', '-created_at'), name='attachment_task_created_idx'),
+            models.Index(fields=('updated_at', 'id'), name='attachment_updated_idx'),
+            # Orphaned files lookups of `manage.py collect_orphaned_media`
+            models.Index(fields=('file',), name='attachment_file_idx'),
+        )
 
-    file = models.FileField(upload_to=SetUploadPath('tasks/attachments'))
+    file = models.FileField(upload_to=SetUploadPath('tasks/attachments'), storage=get_file_storage)
     task = models.ForeignKey(to=Task, on_delete=models.CASCADE, related_name='attachments')
 
+    blob_fields = ('file',)
+
     def __str__(self):
         return str(self.file)
 
 
-class TaskThumbnail(AbstractModel):
+class TaskThumbnail(BlobFieldsMixin, AbstractModel):
     class Meta:
         verbose_name = 'Task Thumbnail'
         verbose_name_plural = 'Task Thumbnails'
         ordering = ('-created_at',)
+        indexes = (
+            models.Index(fields=('task', '-created_at'), name='thumbnail_task_created_idx'),
+            models.Index(fields=('updated_at', 'id'), name='thumbnail_updated_idx'),
+            models.Index(fields=('file',), name='thumbnail_file_idx'),
+        )
 
-    file = models.FileField(upload_to=SetUploadPath('tasks/thumbnails'))
+    file = models.FileField(upload_to=SetUploadPath('tasks/thumbnails'), storage=get_file_storage)
+    # {size: file name} of the resized copies made by `apps.tasks.renditions`
+    renditions = models.JSONField(default=dict, blank=True)
     task = models.ForeignKey(to=Task, on_delete=models.CASCADE, related_name='thumbnails')
+
+    blob_fields = ('file',)
+
+
+class TaskTombstone(AbstractModel):
+    """
+    Marks a hard deleted task, attachment or thumbnail for the delta sync.
+    Soft deleted tasks don't need one, they are reported by their `updated_at`.
+    """
+    class Meta:
+        verbose_name = 'Task Tombstone'
+        verbose_name_plural = 'Task Tombstones'
+        ordering = ('updated_at',)
+        indexes = (
+            models.Index(fields=('user', 'updated_at', 'id'), name='tombstone_user_updated_idx'),
+        )
+
+    KIND_TASK = 'task'
+    KIND_ATTACHMENT = 'attachment'
+    KIND_THUMBNAIL = 'thumbnail'
+    KIND_CHOICES = (
+        (KIND_TASK, 'Task'),
+        (KIND_ATTACHMENT, 'Attachment'),
+        (KIND_THUMBNAIL, 'Thumbnail'),
+    )
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.UUIDField()
+    user = models.ForeignKey(to='user.User', on_delete=models.CASCADE)
+
+
+class TaskUpload(AbstractModel):
+    """
+    Chunked upload of an attachment or a thumbnail: chunks are appended to a
+    part file in `TASK_UPLOAD_DIR` until it is finalized into the model's
+    `file`. Expired sessions are removed by `manage.py purge_uploads`.
+    """
+    class Meta:
+        verbose_name = 'Task Upload'
+        verbose_name_plural = 'Task Uploads'
+        ordering = ('-created_at',)
+        indexes = (
+            models.Index(fields=('expires_at',), name='upload_expires_idx'),
+        )
+
+    KIND_ATTACHMENT = 'attachment'
+    KIND_THUMBNAIL = 'thumbnail'
+    KIND_CHOICES = (
+        (KIND_ATTACHMENT, 'Attachment'),
+        (KIND_THUMBNAIL, 'Thumbnail'),
+    )
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    # Expected total size, when known by the client
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    received = models.PositiveBigIntegerField(default=0)
+    chunks = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    task = models.ForeignKey(to=Task, on_delete=models.CASCADE, related_name='uploads')
+    user = models.ForeignKey(to='user.User', on_delete=models.CASCADE)
+
+    def __str__(self):
+        return self.filename
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import get_storage_class
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from utils.images import UnreadableImage, get_output_format, open_image, resize
+from utils.response_cache import bump_version
+
+from .models import Task, TaskThumbnail
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = 'tasks/thumbnails/renditions'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Renditions are derived, per thumbnail files, they don't go to the shared blob storage
+storage = get_storage_class()()
+
+
+def get_sizes():
+    return tuple(getattr(settings, 'THUMBNAIL_RENDITION_SIZES', (64, 256, 512)))
+
+
+def get_rendition_name(thumbnail, size, ext):
+    # The source name is part of the file name, so a replaced image gets new URLs
+    version = hashlib.md5(thumbnail.file.name.encode('utf-8')).hexdigest()[:8]
+    return '{dir}/{id}/{size}-{version}.{ext}'.format(
+        dir=RENDITION_DIR, id=thumbnail.pk, size=size, version=version, ext=ext,
+    )
+
+
+def has_current_renditions(thumbnail):
+    if not thumbnail.renditions:
+        return False
+    version = hashlib.md5(thumbnail.file.name.encode('utf-8')).hexdigest()[:8]
+    return all(name.rsplit('-', 1)[-1].startswith(version) for name in thumbnail.renditions.values())
+
+
+def create_renditions(thumbnail):
+    """
+    Renders the thumbnail's image to every size of `THUMBNAIL_RENDITION_SIZES`
+    (longest side, never upscaled) and returns `{size: file name}`. Empty for
+    files Pillow can't read.
+    """
+    image_format, ext = get_output_format()
+    sizes = get_sizes()
+    quality = getattr(settings, 'THUMBNAIL_RENDITION_QUALITY', 80)
+    try:
+        with thumbnail.file.open('rb') as source:
+            image = open_image(source, max(sizes))
+    except UnreadableImage:
+        logger.warning('Thumbnail %s is not a readable image', thumbnail.pk)
+        return {}
+
+    renditions = {}
+    for size in sizes:
+        name = get_rendition_name(thumbnail, size, ext)
+        storage.delete(name)
+        renditions[str(size)] = storage.save(name, ContentFile(resize(image, size, image_format, quality)))
+    return renditions
+
+
+def delete_renditions(renditions):
+    for name in (renditions or {}).values():
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Failed to delete rendition %s', name, exc_info=True)
+
+
+def process_thumbnail(thumbnail_id):
+    """
+    Renders and records the renditions of a thumbnail. Results for an image
+    replaced in the meantime are thrown away, the new image has its own job.
+    """
+    thumbnail = TaskThumbnail.objects.select_related('task').filter(pk=thumbnail_id).first()
+    if thumbnail is None or not thumbnail.file:
+        return
+
+    renditions = create_renditions(thumbnail)
+    now = timezone.now()
+    updated = TaskThumbnail.objects.filter(pk=thumbnail.pk, file=thumbnail.file.name).update(
+        renditions=renditions,
+        updated_at=now,
+    )
+    if not updated:
+        delete_renditions(renditions)
+        return
+
+    stale = {size: name for size, name in (thumbnail.renditions or {}).items() if name not in renditions.values()}
+    delete_renditions(stale)
+
+    # Renditions are part of the task representation (ETags, delta sync, cached responses)
+    Task.all_objects.filter(pk=thumbnail.task_id).update(updated_at=now)
+    bump_version(thumbnail.task.user_id)
+
+
+def run_job(thumbnail_id):
+    close_old_connections()
+    try:
+        process_thumbnail(thumbnail_id)
+    except Exception:
+        logger.exception('Failed to render thumbnail %s', thumbnail_id)
+    finally:
+        # Worker threads have their own connections, which nothing else closes
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_RENDITION_WORKERS', 2),
+                thread_name_prefix='thumbnail-renditions',
+            )
+        return _executor
+
+
+def schedule_renditions(thumbnail_id):
+    """
+    Queues a thumbnail for rendering outside of the request thread. Pillow
+    releases the GIL while decoding, resizing and encoding, so the threads
+    of the pool render in parallel. With `THUMBNAIL_RENDITION_WORKERS = 0`
+    the renditions are made right away (tests, scripts).
+    """
+    if not getattr(settings, 'THUMBNAIL_RENDITION_WORKERS', 2):
+        process_thumbnail(thumbnail_id)
+        return None
+    return get_executor().submit(run_job, thumbnail_id)
@@ -0,0 +1,65 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+# Expression indexed by the GIN index created by the migrations, queries
+# must use exactly the same expression to hit it.
+POSTGRES_DOCUMENT = "to_tsvector('simple', coalesce(tasks_task.title, '') || ' ' || coalesce(tasks_task.description, ''))"
+# Maintained by triggers on `tasks_task` (migration 0010), migrations
+# rebuilding the table on SQLite drop them and must create them again
+SQLITE_FTS_TABLE = 'tasks_task_fts'
+SQLITE_KEY_TABLE = 'tasks_task_search_key'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def get_terms(query):
+    return WORD_RE.findall(query or '')[:16]
+
+
+def search_tasks(queryset, query):
+    """
+    Filters `queryset` by a full-text `query` over title and description and
+    annotates the relevance as `search_rank`. Every term matches as a prefix and
+    all terms must match.
+
+    PostgreSQL uses the GIN expression index, SQLite the FTS5 table keyed by
+    `tasks_task_search_key` (both maintained by the database itself); other
+    backends fall back to `icontains`.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join('%s:*' % term for term in terms)
+        return queryset.filter(RawSQL(
+            "%s @@ to_tsquery('simple', %%s)" % POSTGRES_DOCUMENT, (tsquery,), output_field=BooleanField(),
+        )).alias(search_rank=RawSQL(
+            "ts_rank(%s, to_tsquery('simple', %%s))" % POSTGRES_DOCUMENT, (tsquery,), output_field=FloatField(),
+        ))
+
+    if vendor == 'sqlite':
+        match = ' '.join('"%s"*' % term for term in terms)
+        # Matches are found once, the rank is only computed for the rows
+        # sorted by it (an alias, COUNT(*) doesn't compute it)
+        return queryset.filter(id__in=RawSQL(
+            'SELECT {key}.task_id FROM {fts} INNER JOIN {key} ON {key}.id = {fts}.rowid '
+            'WHERE {fts} MATCH %s'.format(fts=SQLITE_FTS_TABLE, key=SQLITE_KEY_TABLE),
+            (match,),
+        )).alias(search_rank=RawSQL(
+            # bm25() is lower for better matches
+            'SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s '
+            'AND {fts}.rowid = (SELECT id FROM {key} WHERE task_id = tasks_task.id)'.format(
+                fts=SQLITE_FTS_TABLE, key=SQLITE_KEY_TABLE,
+            ),
+            (match,),
+            output_field=FloatField(),
+        ))
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition)
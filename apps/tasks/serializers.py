@@ -1,14 +1,29 @@
-from rest_framework import serializers
+from rest_framework import serializers, status
 
-from .models import Task, TaskThumbnail, TaskAttachment
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
 
+from utils.response_cache import bump_version
+from utils.timing import TimedSerializerMixin
+
+from .counters import invalidate_task_counts
+from .models import Task, TaskThumbnail, TaskAttachment, TaskUpload
+from .renditions import storage as rendition_storage
+from .sync import encode_watermark
+
+
+class TaskThumbnailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # {size: url}, empty until the renditions are made
+    renditions = serializers.SerializerMethodField()
 
-class TaskThumbnailSerializer(serializers.ModelSerializer):
     class Meta:
         model = TaskThumbnail
         fields = (
             'id',
             'file',
+            'renditions',
             'created_at',
             'updated_at',
         )
@@ -24,13 +39,21 @@ class TaskThumbnailSerializer(serializers.ModelSerializer):
             },
         }
 
+    def get_renditions(self, instance) -> dict:
+        request = self.context.get('request')
+        urls = {}
+        for size, name in (instance.renditions or {}).items():
+            url = rendition_storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
     def create(self, validated_data):
         task = self.context.get('task')
-        validated_data.update({'task_id': task.id})
+        validated_data.update({'task': task})
         return super().create(validated_data)
 
 
-class TaskAttachmentSerializer(serializers.ModelSerializer):
+class TaskAttachmentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = TaskAttachment
         fields = (
@@ -53,11 +76,32 @@ class TaskAttachmentSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         task = self.context.get('task')
-        validated_data.update({'task_id': task.id})
+        validated_data.update({'task': task})
         return super().create(validated_data)
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskUploadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = TaskUpload
+        fields = (
+            'id',
+            'filename',
+            'size',
+            'received',
+            'chunks',
+            'expires_at',
+            'created_at',
+        )
+        read_only_fields = ('received', 'chunks', 'expires_at', 'created_at')
+
+    def validate_size(self, value):
+        limit = getattr(settings, 'TASK_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024)
+        if value is not None and value > limit:
+            raise serializers.ValidationError(_('Files larger than %d bytes are not allowed') % limit)
+        return value
+
+
+class TaskSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     attachments = TaskAttachmentSerializer(many=True, read_only=True)
     thumbnails = TaskThumbnailSerializer(many=True, read_only=True)
 
@@ -76,6 +120,8 @@ class TaskSerializer(serializers.ModelSerializer):
             'thumbnails',
             'user',
         )
+        # Managed by DELETE /tasks/<id>/ and POST /tasks/<id>/restore/
+        read_only_fields = ('deleted', 'deleted_at')
 
     def create(self, validated_data):
         user = self.context.get('user')
@@ -83,7 +129,211 @@ class TaskSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class UploadFileSerializer(serializers.Serializer):
+class TaskSyncSerializer(TaskSerializer):
+    # Sent as separate collections by the delta sync
+    attachments = None
+    thumbnails = None
+
+    class Meta(TaskSerializer.Meta):
+        fields = tuple(field for field in TaskSerializer.Meta.fields if field not in ('attachments', 'thumbnails'))
+
+
+class TaskAttachmentSyncSerializer(TaskAttachmentSerializer):
+    class Meta(TaskAttachmentSerializer.Meta):
+        fields = TaskAttachmentSerializer.Meta.fields + ('task',)
+
+
+class TaskThumbnailSyncSerializer(TaskThumbnailSerializer):
+    class Meta(TaskThumbnailSerializer.Meta):
+        fields = TaskThumbnailSerializer.Meta.fields + ('task',)
+
+
+class TaskDeletedSerializer(TimedSerializerMixin, serializers.Serializer):
+    tasks = serializers.ListField(child=serializers.UUIDField())
+    attachments = serializers.ListField(child=serializers.UUIDField())
+    thumbnails = serializers.ListField(child=serializers.UUIDField())
+
+
+class TaskSyncResponseSerializer(TimedSerializerMixin, serializers.Serializer):
+    watermark = serializers.SerializerMethodField()
+    has_more = serializers.BooleanField()
+    tasks = TaskSyncSerializer(many=True)
+    attachments = TaskAttachmentSyncSerializer(many=True)
+    thumbnails = TaskThumbnailSyncSerializer(many=True)
+    deleted = TaskDeletedSerializer()
+
+    def get_watermark(self, obj) -> str:
+        return encode_watermark(obj['watermark'])
+
+
+class PartialListSerializer(serializers.ListSerializer):
+    """
+    Validates every item on its own instead of failing the whole list:
+    `validated_data` holds `None` for invalid items and `item_errors` the
+    per-item errors (`{}` for valid ones).
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({
+                'non_field_errors': [_('Expected a list of items.')]
+            })
+
+        self.item_errors = []
+        validated = []
+        for item in data:
+            try:
+                validated.append(self.child.run_validation(item))
+                self.item_errors.append({})
+            except serializers.ValidationError as exc:
+                validated.append(None)
+                self.item_errors.append(exc.detail)
+        return validated
+
+
+class TaskBulkItemSerializer(TaskSerializer):
+    class Meta(TaskSerializer.Meta):
+        read_only_fields = ('deleted', 'deleted_at', 'user')
+        list_serializer_class = PartialListSerializer
+
+
+class TaskBulkOperationSerializer(TimedSerializerMixin, serializers.Serializer):
+    ACTIONS = ('create', 'update', 'delete')
+
+    action = serializers.ChoiceField(choices=ACTIONS)
+    id = serializers.UUIDField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+
+class TaskImportSerializer(TimedSerializerMixin, serializers.Serializer):
+    FORMATS = ('ndjson', 'csv')
+
+    file = serializers.FileField()
+    # Guessed from the file extension when omitted
+    input = serializers.ChoiceField(choices=FORMATS, required=False)
+
+    def validate(self, attrs):
+        if 'input' not in attrs:
+            name = (attrs['file'].name or '').lower()
+            attrs['input'] = 'csv' if name.endswith('.csv') else 'ndjson'
+        return attrs
+
+
+class TaskImportResultSerializer(TimedSerializerMixin, serializers.Serializer):
+    created = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    errors = serializers.ListField(child=serializers.DictField())
+
+
+class TaskBulkSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    Applies a batch of create/update/delete operations on user's tasks in one
+    transaction: `bulk_create`, `bulk_update` and a single soft delete UPDATE.
+    Invalid operations are reported and skipped, the rest are applied.
+    """
+    operations = TaskBulkOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        limit = getattr(settings, 'TASK_BULK_MAX_OPERATIONS', 100)
+        if len(value) > limit:
+            raise serializers.ValidationError(_('At most %d operations are allowed') % limit)
+        return value
+
+    def validate_items(self, operations, action, partial=False):
+        indexes = [index for index, operation in enumerate(operations) if operation['action'] == action]
+        serializer = TaskBulkItemSerializer(
+            data=[operations[index]['data'] for index in indexes],
+            many=True,
+            partial=partial,
+            context=self.context,
+        )
+        serializer.is_valid()
+        return indexes, serializer.validated_data, serializer.item_errors
+
+    def create(self, validated_data):
+        user = self.context['user']
+        operations = validated_data['operations']
+        results = [
+            {'action': operation['action'], 'id': operation.get('id'), 'status': None}
+            for operation in operations
+        ]
+
+        def fail(index, code, errors):
+            results[index].update({'status': code, 'errors': errors})
+
+        existing = {
+            task.pk: task for task in Task.objects.filter(
+                user_id=user.id,
+                pk__in=[operation['id'] for operation in operations if operation.get('id')],
+            )
+        }
+        for index, operation in enumerate(operations):
+            if operation['action'] == 'create':
+                continue
+            if not operation.get('id'):
+                fail(index, status.HTTP_400_BAD_REQUEST, {'id': [_('id is required for %s') % operation['action']]})
+            elif operation['id'] not in existing:
+                fail(index, status.HTTP_404_NOT_FOUND, {'id': [_('Task not found!')]})
+
+        now = timezone.now()
+        to_create = []
+        create_indexes, create_data, create_errors = self.validate_items(operations, 'create')
+        for index, data, errors in zip(create_indexes, create_data, create_errors):
+            if errors:
+                fail(index, status.HTTP_400_BAD_REQUEST, errors)
+                continue
+            task = Task(user_id=user.id, **data)
+            to_create.append(task)
+            results[index].update({'id': task.pk, 'status': status.HTTP_201_CREATED})
+
+        to_update, update_fields = {}, {'updated_at'}
+        update_indexes, update_data, update_errors = self.validate_items(operations, 'update', partial=True)
+        for index, data, errors in zip(update_indexes, update_data, update_errors):
+            if results[index]['status']:
+                continue
+            if errors:
+                fail(index, status.HTTP_400_BAD_REQUEST, errors)
+                continue
+            task = existing[operations[index]['id']]
+            for field, value in data.items():
+                setattr(task, field, value)
+            task.updated_at = now
+            update_fields.update(data)
+            to_update[task.pk] = task
+            results[index]['status'] = status.HTTP_200_OK
+
+        to_delete = set()
+        for index, operation in enumerate(operations):
+            if operation['action'] == 'delete' and not results[index]['status']:
+                to_delete.add(operation['id'])
+                results[index]['status'] = status.HTTP_204_NO_CONTENT
+
+        with transaction.atomic():
+            if to_create:
+                Task.objects.bulk_create(to_create)
+            if to_update:
+                Task.objects.bulk_update(to_update.values(), fields=sorted(update_fields))
+            if to_delete:
+                Task.objects.filter(user_id=user.id, pk__in=to_delete).soft_delete()
+            if to_create or to_update or to_delete:
+                # Bulk operations bypass the signals maintaining the counters and caches
+                invalidate_task_counts(user.id)
+                transaction.on_commit(lambda: bump_version(user.id))
+
+        changed = Task.objects.filter(
+            pk__in=[task.pk for task in to_create] + list(to_update),
+        ).prefetch_related('attachments', 'thumbnails')
+        data = {task.pk: TaskSerializer(task, context=self.context).data for task in changed}
+        for result in results:
+            if result['status'] in (status.HTTP_200_OK, status.HTTP_201_CREATED):
+                result['data'] = data.get(result['id'])
+        return results
+
+    def update(self, instance, validated_data):
+        raise NotImplementedError('TaskBulkSerializer cannot update an instance')
+
+
+class UploadFileSerializer(TimedSerializerMixin, serializers.Serializer):
     file = serializers.FileField()
 
     def create(self, validated_data):
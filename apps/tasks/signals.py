@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from utils.response_cache import bump_version
+
+from .counters import adjust_task_count, move_task_count, invalidate_task_counts
+from .models import Task, TaskAttachment, TaskThumbnail, TaskTombstone
+from .renditions import schedule_renditions, has_current_renditions, delete_renditions
+
+
+def is_task_cascade(origin):
+    return isinstance(origin, Task) or getattr(origin, 'model', None) is Task
+
+
+def get_owner_id(instance):
+    """
+    Owner of an attachment/thumbnail, without a query when the task is loaded.
+    """
+    if instance._meta.get_field('task').is_cached(instance):
+        return instance.task.user_id
+    return Task.all_objects.filter(pk=instance.task_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Task)
+def update_task_counters_on_save(sender, instance: Task, created, **kwargs):
+    # Counters only include tasks which aren't soft deleted
+    if created:
+        if not instance.deleted:
+            adjust_task_count(instance.user_id, instance.done, 1)
+    else:
+        loaded_done = getattr(instance, '_loaded_done', None)
+        loaded_deleted = getattr(instance, '_loaded_deleted', None)
+        if loaded_done is None or loaded_deleted is None or loaded_deleted != instance.deleted:
+            invalidate_task_counts(instance.user_id)
+        elif loaded_done != instance.done and not instance.deleted:
+            move_task_count(instance.user_id, loaded_done, instance.done)
+    instance._loaded_done = instance.done
+    instance._loaded_deleted = instance.deleted
+
+
+@receiver(post_delete, sender=Task)
+def update_task_counters_on_delete(sender, instance: Task, **kwargs):
+    if not instance.deleted:
+        adjust_task_count(instance.user_id, instance.done, -1)
+
+
+@receiver(post_delete, sender=Task)
+def create_task_tombstone(sender, instance: Task, **kwargs):
+    # Soft deleted tasks were already reported to the delta sync
+    if not instance.deleted:
+        TaskTombstone.objects.create(kind=TaskTombstone.KIND_TASK, object_id=instance.pk, user_id=instance.user_id)
+
+
+@receiver(post_delete, sender=TaskAttachment)
+@receiver(post_delete, sender=TaskThumbnail)
+def create_file_tombstone(sender, instance, origin=None, **kwargs):
+    # Children of a deleted task are covered by the task itself
+    if is_task_cascade(origin):
+        return
+
+    user_id = get_owner_id(instance)
+    if user_id is None:
+        return
+
+    kind = TaskTombstone.KIND_ATTACHMENT if sender is TaskAttachment else TaskTombstone.KIND_THUMBNAIL
+    TaskTombstone.objects.create(kind=kind, object_id=instance.pk, user_id=user_id)
+
+
+@receiver(post_save, sender=TaskAttachment)
+@receiver(post_save, sender=TaskThumbnail)
+@receiver(post_delete, sender=TaskAttachment)
+@receiver(post_delete, sender=TaskThumbnail)
+def touch_task(sender, instance, origin=None, **kwargs):
+    """
+    Attachments and thumbnails are nested in the task representation, so
+    their changes must move the task's `updated_at` (ETags, delta sync).
+    """
+    if is_task_cascade(origin):
+        return
+    Task.all_objects.filter(pk=instance.task_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_responses(sender, instance: Task, **kwargs):
+    bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=TaskAttachment)
+@receiver(post_save, sender=TaskThumbnail)
+@receiver(post_delete, sender=TaskAttachment)
+@receiver(post_delete, sender=TaskThumbnail)
+def invalidate_file_responses(sender, instance, origin=None, **kwargs):
+    if is_task_cascade(origin):
+        return
+    user_id = get_owner_id(instance)
+    if user_id is not None:
+        bump_version(user_id)
+
+
+@receiver(post_save, sender=TaskThumbnail)
+def render_thumbnail(sender, instance: TaskThumbnail, **kwargs):
+    # New or replaced image, rendered by the worker pool once the row is visible
+    if instance.file and not has_current_renditions(instance):
+        transaction.on_commit(lambda: schedule_renditions(instance.pk))
+
+
+@receiver(post_delete, sender=TaskThumbnail)
+def delete_thumbnail_renditions(sender, instance: TaskThumbnail, **kwargs):
+    if instance.renditions:
+        renditions = dict(instance.renditions)
+        transaction.on_commit(lambda: delete_renditions(renditions))
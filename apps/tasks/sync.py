@@ -0,0 +1,137 @@
+import base64
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Task, TaskAttachment, TaskThumbnail, TaskTombstone
+
+# Id of a watermark past every row updated at its time
+LAST_ID = uuid.UUID(int=2 ** 128 - 1)
+
+
+class InvalidWatermark(ValueError):
+    pass
+
+
+class ExpiredWatermark(ValueError):
+    pass
+
+
+def encode_watermark(value):
+    """
+    `value` is the `(updated_at, id)` of the last row sent, rows are ordered by
+    both since many of them can share one `updated_at`.
+    """
+    updated_at, pk = value
+    data = updated_at.isoformat() if pk == LAST_ID else '%s|%s' % (updated_at.isoformat(), pk)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_watermark(watermark):
+    try:
+        data = base64.urlsafe_b64decode(watermark.encode('ascii')).decode('utf-8')
+        value, _, pk = data.partition('|')
+        value = parse_datetime(value)
+        pk = uuid.UUID(pk) if pk else LAST_ID
+    except (ValueError, UnicodeError):
+        value = None
+    if value is None or timezone.is_naive(value):
+        raise InvalidWatermark(watermark)
+
+    # Tombstones and soft deleted tasks are purged after the retention period
+    retention = timezone.timedelta(days=getattr(settings, 'TASK_TRASH_RETENTION_DAYS', 30))
+    if value < timezone.now() - retention:
+        raise ExpiredWatermark(watermark)
+    return value, pk
+
+
+def get_key(row):
+    return row.updated_at, row.pk
+
+
+def filter_after(queryset, since):
+    updated_at, pk = since
+    if pk == LAST_ID:
+        return queryset.filter(updated_at__gt=updated_at)
+    # Range scan from `updated_at`, the rows sent already are skipped by id
+    return queryset.filter(updated_at__gte=updated_at).exclude(updated_at=updated_at, id__lte=pk)
+
+
+def collect_changes(user_id, since=None, limit=500):
+    """
+    Changes of user's tasks, attachments and thumbnails after the
+    `(updated_at, id)` watermark `since` (everything alive when `since` is
+    None), oldest first.
+
+    Every collection is read with an index range scan on `(updated_at, id)`
+    and capped by `limit`. When a collection is cut, the others are cut at the
+    same row so the returned watermark never skips a change, and always moves
+    forward however many rows share one `updated_at`. Rows updated within the
+    safety margin may be sent twice, clients apply them idempotently.
+    """
+    margin = timezone.timedelta(seconds=getattr(settings, 'TASK_SYNC_SAFETY_MARGIN', 5))
+    # Changes committed by transactions still running now are picked up next time
+    watermark = (timezone.now() - margin, LAST_ID)
+
+    tasks = Task.all_objects.filter(user_id=user_id)
+    attachments = TaskAttachment.objects.filter(task__user_id=user_id, task__deleted=False)
+    thumbnails = TaskThumbnail.objects.filter(task__user_id=user_id, task__deleted=False)
+    tombstones = TaskTombstone.objects.filter(user_id=user_id)
+
+    if since is None:
+        tasks = tasks.filter(deleted=False)
+        tombstones = tombstones.none()
+    else:
+        tasks, attachments, thumbnails, tombstones = (
+            filter_after(queryset, since) for queryset in (tasks, attachments, thumbnails, tombstones)
+        )
+
+    collections = {
+        name: list(queryset.order_by('updated_at', 'id')[:limit + 1])
+        for name, queryset in (
+            ('tasks', tasks),
+            ('attachments', attachments),
+            ('thumbnails', thumbnails),
+            ('tombstones', tombstones),
+        )
+    }
+
+    # First row left out of each cut collection
+    cut = [get_key(rows[limit]) for rows in collections.values() if len(rows) > limit]
+    has_more = bool(cut)
+    if has_more:
+        boundary = min(cut)
+        collections = {
+            name: [row for row in rows if get_key(row) < boundary]
+            for name, rows in collections.items()
+        }
+        # The collection cut at `boundary` kept `limit` rows
+        watermark = min(watermark, max(get_key(row) for rows in collections.values() for row in rows))
+
+    if since is not None:
+        watermark = max(watermark, since)
+
+    tasks = collections['tasks']
+    return {
+        'watermark': watermark,
+        'has_more': has_more,
+        'tasks': [task for task in tasks if not task.deleted],
+        'attachments': collections['attachments'],
+        'thumbnails': collections['thumbnails'],
+        'deleted': {
+            'tasks': [task.pk for task in tasks if task.deleted] + [
+                tombstone.object_id for tombstone in collections['tombstones']
+                if tombstone.kind == TaskTombstone.KIND_TASK
+            ],
+            'attachments': [
+                tombstone.object_id for tombstone in collections['tombstones']
+                if tombstone.kind == TaskTombstone.KIND_ATTACHMENT
+            ],
+            'thumbnails': [
+                tombstone.object_id for tombstone in collections['tombstones']
+                if tombstone.kind == TaskTombstone.KIND_THUMBNAIL
+            ],
+        },
+    }
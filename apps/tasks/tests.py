@@ -1,3 +1,1394 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.models import Count
+from django.test import TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.files.models import Blob
+from apps.tasks.importer import TaskImporter
+from apps.tasks.management.commands.explain_task_filters import Command as ExplainTaskFiltersCommand
+from apps.tasks.models import Task, TaskAttachment, TaskThumbnail, TaskTombstone, TaskUpload
+from apps.tasks.renditions import RENDITION_DIR, create_renditions, process_thumbnail
+from apps.tasks.renditions import storage as rendition_storage
+from apps.tasks.uploads import get_expires_at, get_part_path, get_upload_dir
+from apps.tasks.views import TaskViewsetAPIView
+from apps.user.authentication import local_cache
+from apps.user.models import User
+from utils.benchmark import EndpointBenchmarkMixin, read_results
+from utils.pagination import KeysetPagination
+from utils.queries import QueryBudgetExceeded
+
+# `manage.py seed` options of the benchmark dataset, the busiest user is benchmarked
+SEED_OPTIONS = {'users': 20, 'tasks_per_user': 100, 'seed': 23}
+
+
+def make_image(size=(640, 480)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (90, 140, 200)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class TaskAPITestCase(APITestCase):
+    """
+    Two users with a few tasks each, requests are made as `user`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', username='owner', password='Owner-password-1')
+        cls.other = User.objects.create_user(email='other@example.com', username='other', password='Other-password-1')
+        cls.tasks = [Task.objects.create(user=cls.user, title='Task %d' % index) for index in range(3)]
+        cls.other_task = Task.objects.create(user=cls.other, title='Not yours')
+
+    def setUp(self):
+        # Counters, cached counts and users would leak between the tests
+        for cache in caches.all():
+            cache.clear()
+        local_cache.clear()
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(user))
+
+
+class QueryBudgetTests(TaskAPITestCase):
+
+    def test_strict_in_tests(self):
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+
+    def test_exceeded_budget_fails(self):
+        with mock.patch.dict(TaskViewsetAPIView.query_budget, {'list': 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'TaskViewsetAPIView.list executed'):
+                self.client.get(reverse('task-list'))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_exceeded_budget_is_logged(self):
+        with mock.patch.dict(TaskViewsetAPIView.query_budget, {'list': 1}):
+            with self.assertLogs('utils.queries', 'WARNING') as logs:
+                response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('(budget is 1)', logs.output[0])
+
+    def test_within_budget(self):
+        self.assertEqual(self.client.get(reverse('task-list')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('task-detail', kwargs={'pk': self.tasks[0].pk})).status_code, 200)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60, THUMBNAIL_RENDITION_WORKERS=0)
+class ResponseCacheTests(TaskAPITestCase):
+    """
+    Cached GET responses, invalidated by every kind of write to the owner's
+    tasks and files.
+    """
+
+    def get(self, url, queries=None, **kwargs):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, **kwargs)
+        if queries is not None:
+            self.assertEqual(len(captured), queries, [query['sql'] for query in captured])
+        return response
+
+    def assert_cached(self, url, queries=0):
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        cached = self.get(url, queries=queries)
+        self.assertEqual((cached.status_code, cached.content), (200, response.content))
+        return cached
+
+    def assert_invalidated(self, write, url=None, queries=0):
+        url = url or reverse('task-list')
+        self.assert_cached(url, queries)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertGreater(len(captured), queries, 'Served from the cache')
+
+    def test_cached(self):
+        for url in (reverse('task-list'), reverse('task-detail', kwargs={'pk': self.tasks[0].pk})):
+            with self.subTest(url=url):
+                self.assert_cached(url)
+        # Task files are cached by the task's owner, checked first
+        self.assert_cached(reverse('taskattachment-list', kwargs={'task': self.tasks[0].pk}), queries=1)
+
+        # Query params are part of the key, whatever their order
+        url = reverse('task-list')
+        response = self.get(url, data={'done': 'false', 'sort': 'Created at'})
+        self.assertEqual(self.get('%s?sort=Created+at&done=false' % url, queries=0).content, response.content)
+
+    def test_per_user(self):
+        self.assert_cached(reverse('task-list'))
+        self.authenticate(self.other)
+        response = self.get(reverse('task-list'))
+        self.assertEqual([task['id'] for task in response.data['results']], [str(self.other_task.pk)])
+
+    def test_not_modified(self):
+        etag = self.assert_cached(reverse('task-list'))['ETag']
+        response = self.get(reverse('task-list'), queries=0, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_disabled(self):
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0):
+            self.get(reverse('task-list'))
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('task-list'))
+            self.assertTrue(captured)
+
+    def test_invalidated(self):
+        task = self.tasks[0]
+        attachments_url = reverse('taskattachment-list', kwargs={'task': task.pk})
+        writes = {
+            'create': lambda: self.client.post(reverse('task-list'), {'title': 'New', 'user': str(self.user.pk)},
+                                               format='json'),
+            'update': lambda: self.client.put(reverse('task-detail', kwargs={'pk': task.pk}), {'done': True},
+                                              format='json'),
+            'attachment': lambda: TaskAttachment.objects.create(task=task, file=SimpleUploadedFile('a.txt', b'a')),
+            'thumbnail': lambda: TaskThumbnail.objects.create(
+                task=task, file=SimpleUploadedFile('photo.jpg', make_image((100, 100))),
+            ),
+            'bulk': lambda: self.client.post(reverse('task-bulk'), {'operations': [
+                {'action': 'update', 'id': str(task.pk), 'data': {'title': 'Bulk'}},
+            ]}, format='json'),
+            'delete': lambda: self.client.delete(reverse('task-detail', kwargs={'pk': self.tasks[1].pk})),
+            'restore': lambda: self.client.post(reverse('task-restore', kwargs={'pk': self.tasks[1].pk})),
+        }
+        for name, write in writes.items():
+            with self.subTest(name):
+                self.assert_invalidated(write)
+        self.assert_invalidated(writes['attachment'], attachments_url, queries=1)
+
+        # Writes of another user keep the cached responses
+        self.assert_cached(reverse('task-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(user=self.other, title='Other task')
+        self.get(reverse('task-list'), queries=0)
+
+
+class CursorPaginationTests(TaskAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tasks += [Task.objects.create(user=cls.user, title='Task %d' % index) for index in range(3, 7)]
+
+    @staticmethod
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+    def get_ids(self, *ordering):
+        return [str(pk) for pk in Task.objects.filter(user=self.user).order_by(*ordering).values_list('id', flat=True)]
+
+    def walk(self, **params):
+        """
+        Ids of every page followed by `next` links, and the last page's response.
+        """
+        ids, url, params = [], reverse('task-list'), {'pagination': 'cursor', 'size': 2, **params}
+        while True:
+            data = self.client.get(url, params).data
+            ids += [task['id'] for task in data['results']]
+            if not data['next']:
+                return ids, data
+            url, params = data['next'], None
+
+    def test_pages(self):
+        ids, last = self.walk()
+        self.assertEqual(ids, self.get_ids('-created_at', '-id'))
+        self.assertNotIn('count', last)
+
+        ids, _ = self.walk(sort='Updated at')
+        self.assertEqual(ids, self.get_ids('updated_at', 'id'))
+
+    def test_previous(self):
+        first = self.client.get(reverse('task-list'), {'pagination': 'cursor', 'size': 2}).data
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).data
+        self.assertEqual(self.client.get(second['previous']).data['results'], first['results'])
+
+    def test_invalid_cursor(self):
+        now = timezone.now()
+        for cursor in (
+            'not a cursor',
+            self.encode(['v', 'id']),
+            self.encode({'v': 'yesterday', 'id': str(uuid.uuid4())}),
+            self.encode({'v': now.replace(tzinfo=None).isoformat(), 'id': str(uuid.uuid4())}),
+            self.encode({'v': now.isoformat(), 'id': 'not-a-uuid'}),
+            self.encode({'v': now.isoformat(), 'id': 5}),
+            self.encode({'v': now.isoformat()}),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('task-list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.data['detail'], KeysetPagination.invalid_cursor_message)
+                response = self.client.get(reverse('async_task_list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_rows_without_timestamp(self):
+        Task.objects.filter(pk=self.tasks[0].pk).update(created_at=None)
+        excluded = str(self.tasks[0].pk)
+        for sort, ordering in (('-Created at', ('-created_at', '-id')), ('Created at', ('created_at', 'id'))):
+            with self.subTest(sort=sort):
+                # Every row gets a cursor
+                ids, _ = self.walk(sort=sort, size=1)
+                self.assertEqual(ids, [pk for pk in self.get_ids(*ordering) if pk != excluded])
+
+
+class ListValidatorTests(TaskAPITestCase):
+
+    def get_counts(self, url, params=None, **headers):
+        """
+        Response and the COUNT queries it executed.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, **headers)
+        return response, [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+
+    def test_counter_reused(self):
+        for url in (reverse('task-list'), reverse('async_task_list')):
+            with self.subTest(url=url):
+                caches['default'].clear()
+                response, counts = self.get_counts(url)
+                self.assertEqual(response.json()['count'], 3)
+                self.assertEqual(len(counts), 1)
+
+                response, counts = self.get_counts(url, {'page': 1})
+                self.assertEqual(response.json()['count'], 3)
+                self.assertEqual(counts, [])
+
+    def test_no_count_with_cursor(self):
+        for url in (reverse('task-list'), reverse('async_task_list')):
+            with self.subTest(url=url):
+                response, counts = self.get_counts(url, {'pagination': 'cursor'})
+                self.assertEqual(len(response.json()['results']), 3)
+                self.assertEqual(counts, [])
+
+    def assert_validator(self, url, deleted):
+        etag = self.client.get(url).headers['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Other queries have their own ETags
+        self.assertEqual(self.client.get(url, {'done': 'false'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                reverse('task-detail', kwargs={'pk': self.tasks[0].pk}), {'title': 'Changed'}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        etag = response.headers['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('task-detail', kwargs={'pk': deleted.pk}))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_by_last_update(self):
+        for url, deleted in ((reverse('task-list'), self.tasks[1]), (reverse('async_task_list'), self.tasks[2])):
+            with self.subTest(url=url):
+                self.assert_validator(url, deleted)
+
+    @mock.patch('apps.tasks.counters.is_shared', return_value=True)
+    @mock.patch('utils.response_cache.is_shared', return_value=True)
+    def test_etag_by_version(self, *mocks):
+        for url, deleted in ((reverse('task-list'), self.tasks[1]), (reverse('async_task_list'), self.tasks[2])):
+            with self.subTest(url=url):
+                self.assert_validator(url, deleted)
+                # The version replaces the aggregate
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url, {'pagination': 'cursor'})
+                self.assertFalse([query for query in queries if 'MAX(' in query['sql']])
+
+
+class TaskCounterTests(TaskAPITestCase):
+    """
+    Counters must follow every kind of write, COUNT(*) is only executed when
+    they aren't cached.
+    """
+    LISTS = ({}, {'done': 'true'}, {'done': 'false'})
+
+    def setUp(self):
+        super().setUp()
+        # As with a cache shared by the workers
+        patcher = mock.patch('apps.tasks.counters.are_counters_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_count(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['count'], sum('COUNT(' in query['sql'] for query in queries)
+
+    def get_expected(self, params):
+        queryset = Task.objects.filter(user=self.user)
+        if 'done' in params:
+            queryset = queryset.filter(done=params['done'] == 'true')
+        return queryset.count()
+
+    def assert_counts(self):
+        for params in self.LISTS:
+            with self.subTest(**params):
+                count, _ = self.get_count(params)
+                self.assertEqual(count, self.get_expected(params))
+                # Cached now
+                self.assertEqual(self.get_count(params), (count, 0))
+
+    def write(self, method, url, data=None, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, **kwargs)
+        self.assertLess(response.status_code, 300, getattr(response, 'data', None))
+        return response
+
+    def test_count_query_skipped(self):
+        self.assert_counts()
+        # Counters aren't shared between users
+        self.authenticate(self.other)
+        self.assertEqual(self.get_count({}), (1, 1))
+
+    def test_filtered_count_cached(self):
+        params = {'title': 'task 1'}
+        response = self.client.get(reverse('task-list'), params)
+        self.assertEqual((response.data['count'], response.data['count_exact']), (1, True))
+
+        Task.objects.create(user=self.user, title='Task 10')
+        # Until `COUNT_CACHE_TIMEOUT` passes, reported as approximate
+        self.assertEqual(self.get_count(params), (1, 0))
+        self.assertFalse(self.client.get(reverse('task-list'), params).data['count_exact'])
+
+    def test_not_shared(self):
+        with mock.patch('apps.tasks.counters.are_counters_shared', return_value=False):
+            self.assertEqual(self.get_count({}), (3, 1))
+            self.write('post', reverse('task-list'), {'title': 'New task', 'user': str(self.user.pk)}, format='json')
+            # Other workers wouldn't see an increment, cached for `COUNT_CACHE_TIMEOUT` instead
+            response = self.client.get(reverse('task-list'))
+            self.assertEqual((response.data['count'], response.data['count_exact']), (3, False))
+
+    def test_create(self):
+        self.assert_counts()
+        data = {'title': 'New task', 'done': True, 'user': str(self.user.pk)}
+        self.write('post', reverse('task-list'), data, format='json')
+        # Adjusted in place, no recount
+        self.assertEqual(self.get_count({}), (4, 0))
+        self.assertEqual(self.get_count({'done': 'true'}), (1, 0))
+        self.assert_counts()
+
+    def test_update(self):
+        self.assert_counts()
+        url = reverse('task-detail', kwargs={'pk': self.tasks[0].pk})
+        self.write('put', url, {'done': True}, format='json')
+        self.assertEqual(self.get_count({'done': 'true'}), (1, 0))
+        self.assertEqual(self.get_count({'done': 'false'}), (2, 0))
+        self.assert_counts()
+
+    def test_delete(self):
+        self.assert_counts()
+        self.write('delete', reverse('task-detail', kwargs={'pk': self.tasks[0].pk}))
+        self.assertEqual(self.get_count({}), (2, 0))
+        self.assert_counts()
+
+        self.write('post', reverse('task-restore', kwargs={'pk': self.tasks[0].pk}))
+        self.assertEqual(self.get_count({}), (3, 0))
+        self.assert_counts()
+
+    def test_bulk(self):
+        self.assert_counts()
+        self.write('post', reverse('task-bulk'), {'operations': [
+            {'action': 'create', 'data': {'title': 'Bulk task', 'done': True}},
+            {'action': 'update', 'id': str(self.tasks[0].pk), 'data': {'done': True}},
+            {'action': 'delete', 'id': str(self.tasks[1].pk)},
+        ]}, format='json')
+        self.assert_counts()
+        self.assertEqual(self.get_count({'done': 'true'}), (2, 0))
+
+    def test_import(self):
+        self.assert_counts()
+        content = ''.join(
+            json.dumps({'title': 'Imported task %d' % index, 'done': bool(index % 2)}) + '\n' for index in range(5)
+        ).encode('utf-8')
+        self.write(
+            'post',
+            reverse('task-import-tasks'),
+            {'file': SimpleUploadedFile('tasks.ndjson', content)},
+            format='multipart',
+        )
+        self.assert_counts()
+        self.assertEqual(self.get_count({}), (8, 0))
+
+
+class SearchTests(TaskAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.milk = Task.objects.create(user=cls.user, title='Buy milk', description='Oat milk, milk chocolate')
+        cls.bread = Task.objects.create(user=cls.user, title='Bakery', description='Bread and milk')
+        Task.objects.create(user=cls.other, title='Milk for the other user')
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('task-list'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [task['title'] for task in response.data['results']], response.data['count']
+
+    def test_search(self):
+        # Ranked, prefixes of every term must match
+        self.assertEqual(self.search('milk'), (['Buy milk', 'Bakery'], 2))
+        self.assertEqual(self.search('bre mil'), (['Bakery'], 1))
+        self.assertEqual(self.search('milk', sort='Created at'), (['Buy milk', 'Bakery'], 2))
+        self.assertEqual(self.search('coffee'), ([], 0))
+
+    def test_index_follows_writes(self):
+        self.bread.description = 'Rye'
+        self.bread.save()
+        self.assertEqual(self.search('milk'), (['Buy milk'], 1))
+        self.assertEqual(self.search('rye'), (['Bakery'], 1))
+
+        Task.all_objects.filter(pk=self.milk.pk).delete()
+        # Another query, the filtered count of 'milk' is cached
+        self.assertEqual(self.search('mil'), ([], 0))
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5 index')
+    def test_rowids_renumbered(self):
+        # Like VACUUM or a table rebuild by a migration
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE tasks_task SET rowid = rowid + 1000')
+        self.assertEqual(self.search('milk'), (['Buy milk', 'Bakery'], 2))
+        self.assertEqual(self.search('rye'), ([], 0))
+
+
+class TrashTests(TaskAPITestCase):
+
+    def delete(self, task):
+        return self.client.delete(reverse('task-detail', kwargs={'pk': task.pk}))
+
+    def get_ids(self, url_name):
+        return {task['id'] for task in self.client.get(reverse(url_name)).data['results']}
+
+    def test_soft_delete(self):
+        task = self.tasks[0]
+        self.assertEqual(self.delete(task).status_code, 204)
+
+        task = Task.all_objects.get(pk=task.pk)
+        self.assertTrue(task.deleted)
+        self.assertIsNotNone(task.deleted_at)
+        self.assertNotIn(str(task.pk), self.get_ids('task-list'))
+        self.assertEqual(self.get_ids('task-trash'), {str(task.pk)})
+        self.assertEqual(self.client.get(reverse('task-detail', kwargs={'pk': task.pk})).status_code, 404)
+        # Already in the trash
+        self.assertEqual(self.delete(task).status_code, 404)
+
+    def test_other_users_tasks(self):
+        self.assertEqual(self.delete(self.other_task).status_code, 404)
+        self.assertFalse(Task.all_objects.get(pk=self.other_task.pk).deleted)
+
+        Task.all_objects.filter(pk=self.other_task.pk).soft_delete()
+        self.assertEqual(self.get_ids('task-trash'), set())
+        response = self.client.post(reverse('task-restore', kwargs={'pk': self.other_task.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_restore(self):
+        task = self.tasks[0]
+        self.delete(task)
+        response = self.client.post(reverse('task-restore', kwargs={'pk': task.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['deleted'])
+        self.assertIsNone(response.data['deleted_at'])
+        self.assertIn(str(task.pk), self.get_ids('task-list'))
+        self.assertEqual(self.get_ids('task-trash'), set())
+        # Not in the trash anymore
+        self.assertEqual(self.client.post(reverse('task-restore', kwargs={'pk': task.pk})).status_code, 404)
+
+
+class PurgeDeletedTasksTests(TaskAPITestCase):
+
+    def purge(self, *args):
+        stdout = io.StringIO()
+        call_command('purge_deleted_tasks', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def delete(self, task, days):
+        Task.all_objects.filter(pk=task.pk).update(
+            deleted=True,
+            deleted_at=timezone.now() - timezone.timedelta(days=days),
+        )
+
+    def test_purge(self):
+        expired, recent, alive = self.tasks
+        attachment = TaskAttachment.objects.create(task=expired, file=SimpleUploadedFile('notes.txt', b'notes'))
+        self.delete(expired, days=31)
+        self.delete(recent, days=1)
+        tombstone = TaskTombstone.objects.create(
+            kind=TaskTombstone.KIND_TASK, object_id=uuid.uuid4(), user_id=self.user.pk,
+        )
+        TaskTombstone.objects.filter(pk=tombstone.pk).update(updated_at=timezone.now() - timezone.timedelta(days=31))
+
+        self.assertIn('1 tasks deleted before', self.purge('--dry-run'))
+        self.assertTrue(Task.all_objects.filter(pk=expired.pk).exists())
+
+        self.assertIn('Done: 1 tasks, 1 files, 1 tombstones', self.purge('--batch-size', '1'))
+        self.assertFalse(Task.all_objects.filter(pk=expired.pk).exists())
+        self.assertFalse(TaskAttachment.objects.filter(pk=attachment.pk).exists())
+        self.assertFalse(attachment.file.storage.exists(attachment.file.name))
+        remaining = Task.all_objects.filter(user=self.user).values_list('pk', flat=True)
+        self.assertEqual(set(remaining), {recent.pk, alive.pk})
+        # Purged tasks were already reported by the delta sync when soft deleted
+        self.assertFalse(TaskTombstone.objects.filter(object_id=expired.pk).exists())
+
+        self.assertIn('Done: 1 tasks', self.purge('--days', '0'))
+        self.assertFalse(Task.all_objects.filter(pk=recent.pk).exists())
+
+
+@override_settings(THUMBNAIL_RENDITION_WORKERS=0)
+class CollectOrphanedMediaTests(TransactionTestCase):
+    """
+    Files of a media root of their own, older than `--min-age` but the
+    `young` one. The command's worker threads only see committed rows.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(email='owner@example.com', username='owner', password='Owner-password-1')
+        task = Task.objects.create(user=user, title='Task')
+        self.media_root = tempfile.mkdtemp(prefix='media-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        attachment = TaskAttachment.objects.create(task=task, file=SimpleUploadedFile('notes.txt', b'notes'))
+        thumbnail = TaskThumbnail.objects.create(
+            task=task, file=SimpleUploadedFile('photo.jpg', make_image((100, 100))),
+        )
+        thumbnail.refresh_from_db()
+        Blob.objects.create(name=self.write('blobs/aa/shared.txt'), size=5, references=1)
+        self.referenced = {attachment.file.name, thumbnail.file.name, *thumbnail.renditions.values(),
+                           'blobs/aa/shared.txt'}
+
+        Blob.objects.create(name=self.write('blobs/bb/released.txt'), size=5, references=0)
+        self.orphans = {
+            'blobs/bb/released.txt',
+            self.write('tasks/attachments/lost.txt'),
+            # Stale rendition of a thumbnail, of a deleted one and under a name of no thumbnail
+            self.write('%s/%s/64-stale.jpg' % (RENDITION_DIR, thumbnail.pk)),
+            self.write('%s/%s/64-deleted.jpg' % (RENDITION_DIR, uuid.uuid4())),
+            self.write('%s/not-a-thumbnail/64.jpg' % RENDITION_DIR),
+        }
+        # Older than the default `--min-age` of an hour
+        mtime = time.time() - 2 * 60 * 60
+        for name in self.referenced | self.orphans:
+            os.utime(os.path.join(self.media_root, name), (mtime, mtime))
+        self.young = self.write('tasks/attachments/uploading.txt')
+
+    def write(self, name):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'files')
+        return name
+
+    def exists(self, name, root=None):
+        return os.path.exists(os.path.join(root or self.media_root, name))
+
+    def collect(self, *args):
+        stdout = io.StringIO()
+        call_command('collect_orphaned_media', '--batch-size', '2', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_dry_run(self):
+        output = self.collect('--dry-run')
+        self.assertEqual(set(output.splitlines()[:-1]), self.orphans)
+        self.assertIn('Found %d orphans' % len(self.orphans), output)
+        self.assertTrue(all(self.exists(name) for name in self.orphans))
+
+    def test_deleted(self):
+        self.assertEqual(len(self.referenced), 6)
+        self.assertIn('Deleted %d orphans' % len(self.orphans), self.collect())
+        self.assertFalse(any(self.exists(name) for name in self.orphans))
+        self.assertTrue(all(self.exists(name) for name in self.referenced | {self.young}))
+
+    def test_quarantined(self):
+        quarantine = tempfile.mkdtemp(prefix='quarantine-')
+        self.addCleanup(shutil.rmtree, quarantine, ignore_errors=True)
+
+        self.assertIn('Quarantined %d orphans' % len(self.orphans), self.collect('--quarantine', quarantine))
+        self.assertFalse(any(self.exists(name) for name in self.orphans))
+        self.assertTrue(all(self.exists(name, quarantine) for name in self.orphans))
+        self.assertTrue(all(self.exists(name) for name in self.referenced))
+
+        with self.assertRaises(CommandError):
+            self.collect('--quarantine', os.path.join(self.media_root, 'quarantine'))
+
+    def test_min_age(self):
+        self.collect('--min-age', '0')
+        self.assertFalse(self.exists(self.young))
+        self.assertTrue(all(self.exists(name) for name in self.referenced))
+
+
+class BulkTests(TaskAPITestCase):
+
+    def bulk(self, operations):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('task-bulk'), {'operations': operations}, format='json')
+
+    def test_partial_failures(self):
+        updated, deleted, kept = self.tasks
+        missing = uuid.uuid4()
+        response = self.bulk([
+            {'action': 'create', 'data': {'title': 'Created'}},
+            {'action': 'create', 'data': {'title': 'Invalid', 'done': 'maybe'}},
+            {'action': 'update', 'id': str(updated.pk), 'data': {'done': True}},
+            {'action': 'update', 'id': str(kept.pk), 'data': {'done': 'maybe'}},
+            {'action': 'update', 'data': {'done': True}},
+            {'action': 'update', 'id': str(self.other_task.pk), 'data': {'title': 'Stolen'}},
+            {'action': 'delete', 'id': str(deleted.pk)},
+            {'action': 'delete', 'id': str(missing)},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 200, 400, 400, 404, 204, 404])
+
+        self.assertEqual(results[0]['data']['title'], 'Created')
+        self.assertTrue(Task.objects.filter(user=self.user, pk=results[0]['id'], title='Created').exists())
+        self.assertIn('done', results[1]['errors'])
+        self.assertFalse(Task.objects.filter(title='Invalid').exists())
+        self.assertTrue(results[2]['data']['done'])
+        self.assertIn('done', results[3]['errors'])
+        self.assertIn('id', results[4]['errors'])
+        self.assertIn('id', results[5]['errors'])
+        self.assertEqual(results[7]['id'], missing)
+
+        self.assertTrue(Task.objects.get(pk=updated.pk).done)
+        self.assertFalse(Task.objects.get(pk=kept.pk).done)
+        self.assertEqual(Task.objects.get(pk=self.other_task.pk).title, 'Not yours')
+        self.assertTrue(Task.all_objects.get(pk=deleted.pk).deleted)
+
+    def test_invalid_request(self):
+        self.assertEqual(self.bulk([]).status_code, 400)
+        self.assertEqual(self.bulk([{'action': 'rename', 'id': str(self.tasks[0].pk)}]).status_code, 400)
+        with override_settings(TASK_BULK_MAX_OPERATIONS=2):
+            response = self.bulk([{'action': 'create', 'data': {'title': 'Task'}}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Task.objects.filter(title='Task').exists())
+
+
+@override_settings(TASK_SYNC_SAFETY_MARGIN=0)
+class SyncTests(TaskAPITestCase):
+
+    def sync(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get(reverse('task-sync'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def get_ids(self, rows):
+        return [row['id'] for row in rows]
+
+    def test_full_sync(self):
+        Task.all_objects.filter(pk=self.tasks[0].pk).soft_delete()
+        data = self.sync()
+        self.assertFalse(data['has_more'])
+        self.assertEqual(set(self.get_ids(data['tasks'])), {str(task.pk) for task in self.tasks[1:]})
+        self.assertEqual(data['deleted'], {'tasks': [], 'attachments': [], 'thumbnails': []})
+
+    def test_changes(self):
+        watermark = self.sync()['watermark']
+        task, deleted, purged = self.tasks
+        task.title = 'Changed'
+        task.save()
+        Task.all_objects.filter(pk=deleted.pk).soft_delete()
+        Task.all_objects.filter(pk=purged.pk).delete()
+        attachment = TaskAttachment.objects.create(task=task, file=SimpleUploadedFile('notes.txt', b'notes'))
+
+        data = self.sync(watermark)
+        self.assertEqual(self.get_ids(data['tasks']), [str(task.pk)])
+        self.assertEqual(self.get_ids(data['attachments']), [str(attachment.pk)])
+        self.assertEqual(set(data['deleted']['tasks']), {str(deleted.pk), str(purged.pk)})
+
+        watermark, attachment_id = data['watermark'], attachment.pk
+        attachment.delete()
+        data = self.sync(watermark)
+        self.assertEqual(self.get_ids(data['tasks']), [str(task.pk)])
+        self.assertEqual(data['deleted']['attachments'], [str(attachment_id)])
+
+        data = self.sync(data['watermark'])
+        self.assertEqual((data['tasks'], data['deleted']['attachments']), ([], []))
+
+    def test_rows_sharing_updated_at(self):
+        tasks = self.tasks + [Task.objects.create(user=self.user, title='Task %d' % index) for index in range(3, 8)]
+        updated_at = timezone.now() - timezone.timedelta(hours=1)
+        Task.objects.filter(user=self.user).update(updated_at=updated_at)
+        since = base64.urlsafe_b64encode((updated_at - timezone.timedelta(seconds=1)).isoformat().encode()).decode()
+
+        for watermark in (None, since):
+            with self.subTest(since=watermark):
+                ids, pages = [], 0
+                while True:
+                    data = self.sync(watermark, limit=3)
+                    ids += self.get_ids(data['tasks'])
+                    watermark, pages = data['watermark'], pages + 1
+                    if not data['has_more']:
+                        break
+                    self.assertLess(pages, 4)
+                self.assertEqual(sorted(ids), sorted(str(task.pk) for task in tasks))
+
+    def test_restore(self):
+        task = self.tasks[0]
+        attachment = TaskAttachment.objects.create(task=task, file=SimpleUploadedFile('notes.txt', b'notes'))
+        thumbnail = TaskThumbnail.objects.create(task=task, file=SimpleUploadedFile('photo.jpg', make_image((8, 8))))
+        watermark = self.sync()['watermark']
+
+        self.client.delete(reverse('task-detail', kwargs={'pk': task.pk}))
+        data = self.sync(watermark)
+        self.assertEqual(data['deleted']['tasks'], [str(task.pk)])
+        # Children of deleted tasks aren't synced
+        self.assertEqual((data['attachments'], data['thumbnails']), ([], []))
+
+        watermark = data['watermark']
+        self.assertEqual(self.client.post(reverse('task-restore', kwargs={'pk': task.pk})).status_code, 200)
+        data = self.sync(watermark)
+        self.assertEqual(self.get_ids(data['tasks']), [str(task.pk)])
+        self.assertEqual(self.get_ids(data['attachments']), [str(attachment.pk)])
+        self.assertEqual(self.get_ids(data['thumbnails']), [str(thumbnail.pk)])
+
+    def test_invalid_watermark(self):
+        for watermark in ('not a watermark', base64.urlsafe_b64encode(b'2020-01-01T00:00:00').decode()):
+            with self.subTest(watermark=watermark):
+                response = self.client.get(reverse('task-sync'), {'since': watermark})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('since', response.data)
+
+        expired = base64.urlsafe_b64encode(b'2020-01-01T00:00:00+00:00').decode()
+        self.assertEqual(self.client.get(reverse('task-sync'), {'since': expired}).status_code, 410)
+
+
+class ExportTests(TaskAPITestCase):
+
+    def export(self, **params):
+        response = self.client.get(reverse('task-export'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson(self):
+        Task.all_objects.filter(pk=self.tasks[2].pk).soft_delete()
+        attachment = TaskAttachment.objects.create(task=self.tasks[1], file=SimpleUploadedFile('notes.txt', b'notes'))
+
+        # Chunks smaller than the export, attachments are prefetched for each
+        with mock.patch.object(TaskViewsetAPIView, 'export_chunk_size', 1):
+            response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tasks.ndjson"')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [str(task.pk) for task in self.tasks[:2]])
+        self.assertEqual([item['id'] for item in rows[1]['attachments']], [str(attachment.pk)])
+        self.assertEqual(rows[0]['attachments'], [])
+
+    def test_csv(self):
+        Task.objects.filter(pk=self.tasks[0].pk).update(done=True, description='Line one\nline "two"')
+        response, content = self.export(output='csv', done='true')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], str(self.tasks[0].pk))
+        self.assertEqual(rows[0]['description'], 'Line one\nline "two"')
+        self.assertEqual(rows[0]['done'], 'True')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('task-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('output', response.data)
+
+
+class ImportTests(TaskAPITestCase):
+
+    def upload(self, name, content, **data):
+        response = self.client.post(
+            reverse('task-import-tasks'),
+            {'file': SimpleUploadedFile(name, content.encode('utf-8')), **data},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def get_imported(self):
+        return list(Task.objects.filter(user=self.user, title__startswith='Imported').values_list('title', 'done'))
+
+    def test_ndjson_errors(self):
+        result = self.upload('tasks.ndjson', '\n'.join((
+            json.dumps({'title': 'Imported 1', 'done': True}),
+            '{"title": ',
+            '',
+            '["Imported 2"]',
+            json.dumps({'title': 'Imported 3', 'done': 'maybe'}),
+            json.dumps({'title': 'Imported 4', 'user': str(self.other.pk)}),
+        )))
+        self.assertEqual((result['created'], result['failed']), (2, 3))
+        self.assertEqual([error['row'] for error in result['errors']], [2, 4, 5])
+        self.assertIn('non_field_errors', result['errors'][0]['errors'])
+        self.assertIn('done', result['errors'][2]['errors'])
+        # Imported for the requesting user whatever the file says
+        self.assertEqual(sorted(self.get_imported()), [('Imported 1', True), ('Imported 4', False)])
+        self.assertFalse(Task.objects.filter(user=self.other, title__startswith='Imported').exists())
+
+    def test_csv_errors(self):
+        result = self.upload('tasks.CSV', 'title,description,done\nImported 1,First,true\nImported 2,,maybe\n')
+        self.assertEqual((result['created'], result['failed']), (1, 1))
+        self.assertEqual(result['errors'][0]['row'], 3)
+        self.assertEqual(self.get_imported(), [('Imported 1', True)])
+
+        # Explicit format
+        result = self.upload('tasks.txt', 'title\nImported 3\n', input='csv')
+        self.assertEqual(result['created'], 1)
+
+    def test_undecodable(self):
+        def upload(name, content):
+            response = self.client.post(reverse('task-import-tasks'), {'file': SimpleUploadedFile(name, content)},
+                                        format='multipart')
+            self.assertEqual(response.status_code, 200, response.data)
+            return response.data
+
+        result = upload('tasks.ndjson', b'{"title": "Imported caf\xe9"}\n{"title": "Imported 1"}\n')
+        self.assertEqual((result['created'], result['failed']), (1, 1))
+        self.assertEqual(result['errors'][0]['row'], 1)
+
+        too_long = b'Imported 3' * (csv.field_size_limit() // 10 + 1)
+        result = upload('tasks.csv', b'title\nImported caf\xe9\nImported 2\n' + too_long + b'\nImported 4\n')
+        self.assertEqual((result['created'], result['failed']), (2, 2))
+        self.assertEqual([error['row'] for error in result['errors']], [2, 4])
+        self.assertIn('non_field_errors', result['errors'][1]['errors'])
+        self.assertEqual(sorted(self.get_imported()), [('Imported 1', False), ('Imported 2', False),
+                                                       ('Imported 4', False)])
+
+    def test_failing_batch(self):
+        bulk_create = Task.objects.bulk_create
+
+        def fail_broken(tasks):
+            if any(task.title == 'Broken' for task in tasks):
+                raise DatabaseError('broken row')
+            return bulk_create(tasks)
+
+        records = [(row, {'title': title}) for row, title in enumerate(('Imported 1', 'Broken', 'Imported 2'), 1)]
+        with mock.patch.object(Task.objects, 'bulk_create', side_effect=fail_broken):
+            result = TaskImporter(self.user, batch_size=10).run(iter(records))
+        # Only the row breaking the batch fails
+        self.assertEqual((result['created'], result['failed']), (2, 1))
+        self.assertEqual(result['errors'], [{'row': 2, 'errors': {'non_field_errors': ['broken row']}}])
+        self.assertEqual(len(self.get_imported()), 2)
+
+    def test_max_errors(self):
+        records = [(row, {'done': 'maybe'}) for row in range(1, 4)]
+        result = TaskImporter(self.user, max_errors=1).run(iter(records))
+        self.assertEqual((result['created'], result['failed']), (0, 3))
+        self.assertEqual([error['row'] for error in result['errors']], [1])
+
+
+class ChunkedUploadTests(TaskAPITestCase):
+
+    def url(self, name, task=None, **kwargs):
+        return reverse('taskattachment-%s' % name, kwargs={'task': (task or self.tasks[0]).pk, **kwargs})
+
+    def start(self, size=None, task=None):
+        data = {'filename': 'notes.txt'} if size is None else {'filename': 'notes.txt', 'size': size}
+        return self.client.post(self.url('create-upload', task=task), data, format='json')
+
+    def put_chunk(self, upload_id, index, content, task=None):
+        return self.client.put(
+            self.url('upload-chunk', task=task, upload=upload_id, index=index),
+            content,
+            content_type='application/octet-stream',
+        )
+
+    def get_upload_files(self, upload_id):
+        return [name for name in os.listdir(get_upload_dir()) if name.startswith(str(upload_id))]
+
+    def test_upload(self):
+        upload_id = self.start(size=10).data['id']
+        response = self.put_chunk(upload_id, 0, b'hello')
+        self.assertEqual((response.data['chunks'], response.data['received']), (1, 5))
+
+        # Retried chunk, already stored
+        response = self.put_chunk(upload_id, 0, b'hello')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['chunks'], response.data['received']), (1, 5))
+
+        response = self.put_chunk(upload_id, 2, b'later')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['chunks'], 1)
+
+        self.assertEqual(self.put_chunk(upload_id, 1, b'world').data['received'], 10)
+        self.assertEqual(self.client.get(self.url('upload-state', upload=upload_id)).data['chunks'], 2)
+
+        response = self.client.post(self.url('finalize-upload', upload=upload_id))
+        self.assertEqual(response.status_code, 201)
+        attachment = TaskAttachment.objects.get(pk=response.data['id'])
+        with attachment.file.open('rb') as file:
+            self.assertEqual(file.read(), b'helloworld')
+        self.assertFalse(TaskUpload.objects.filter(pk=upload_id).exists())
+        self.assertEqual(self.get_upload_files(upload_id), [])
+
+    def test_invalid_chunks(self):
+        upload_id = self.start(size=10).data['id']
+        self.assertEqual(self.put_chunk(upload_id, 0, b'').status_code, 400)
+        with override_settings(TASK_UPLOAD_MAX_CHUNK_SIZE=4):
+            self.assertEqual(self.put_chunk(upload_id, 0, b'hello').status_code, 413)
+        self.assertEqual(self.get_upload_files(upload_id), [])
+
+        self.put_chunk(upload_id, 0, b'hello')
+        response = self.client.post(self.url('finalize-upload', upload=upload_id))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('size', response.data)
+
+    def test_lost_part_file(self):
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, b'hello')
+        os.remove(get_part_path(TaskUpload.objects.get(pk=upload_id)))
+
+        self.assertEqual(self.put_chunk(upload_id, 1, b'world').status_code, 410)
+        self.assertFalse(TaskUpload.objects.filter(pk=upload_id).exists())
+        self.assertEqual(self.client.get(self.url('upload-state', upload=upload_id)).status_code, 404)
+        self.assertEqual(self.get_upload_files(upload_id), [])
+
+    def test_other_users_task(self):
+        attachment = TaskAttachment.objects.create(task=self.other_task, file=SimpleUploadedFile('a.txt', b'secret'))
+        for response in (
+            self.start(task=self.other_task),
+            self.client.get(self.url('list', task=self.other_task)),
+            self.client.get(self.url('detail', task=self.other_task, pk=attachment.pk)),
+            self.client.get(self.url('download', task=self.other_task, pk=attachment.pk)),
+        ):
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('task', response.data)
+        self.assertFalse(TaskUpload.objects.exists())
+
+        # Somebody else's session, even for the right task
+        self.authenticate(self.other)
+        upload_id = self.start(task=self.other_task).data['id']
+        self.authenticate(self.user)
+        self.assertEqual(self.put_chunk(upload_id, 0, b'hello', task=self.other_task).status_code, 404)
+
+
+class DownloadTests(TaskAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.attachment = TaskAttachment.objects.create(
+            task=cls.tasks[0], file=SimpleUploadedFile('notes.txt', b'helloworld'),
+        )
+
+    def download(self, **headers):
+        url = reverse('taskattachment-download', kwargs={'task': self.tasks[0].pk, 'pk': self.attachment.pk})
+        response = self.client.get(url, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_download(self):
+        response, content = self.download()
+        self.assertEqual((response.status_code, content), (200, b'helloworld'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+        response, _ = self.download(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        for header, content, content_range in (
+            ('bytes=0-4', b'hello', 'bytes 0-4/10'),
+            ('bytes=5-', b'world', 'bytes 5-9/10'),
+            ('bytes=-3', b'rld', 'bytes 7-9/10'),
+            ('bytes=8-100', b'ld', 'bytes 8-9/10'),
+        ):
+            with self.subTest(range=header):
+                response, body = self.download(HTTP_RANGE=header)
+                self.assertEqual((response.status_code, body), (206, content))
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(content)))
+
+        # Several ranges, or malformed ones, are answered with the whole file
+        for header in ('bytes=0-1,4-5', 'items=0-1'):
+            with self.subTest(range=header):
+                self.assertEqual(self.download(HTTP_RANGE=header), (mock.ANY, b'helloworld'))
+
+        for header in ('bytes=10-', 'bytes=5-4', 'bytes=-0'):
+            with self.subTest(range=header):
+                response, _ = self.download(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range(self):
+        response, _ = self.download()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        older = http_date(parse_http_date(last_modified) - 60)
+
+        for if_range, status in (
+            (etag, 206),
+            ('"stale"', 200),
+            ('W/%s' % etag, 200),
+            (last_modified, 206),
+            (older, 200),
+        ):
+            with self.subTest(if_range=if_range):
+                response, _ = self.download(HTTP_RANGE='bytes=0-4', HTTP_IF_RANGE=if_range)
+                self.assertEqual(response.status_code, status)
+
+    @override_settings(DOWNLOAD_OFFLOAD='nginx', DOWNLOAD_ACCEL_PREFIX='/protected-media/')
+    def test_offload(self):
+        response, content = self.download(HTTP_RANGE='bytes=0-4')
+        self.assertEqual((response.status_code, content), (200, b''))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.attachment.file.name)
+
+
+@override_settings(THUMBNAIL_RENDITION_WORKERS=0)
+class RenditionTests(TaskAPITestCase):
+    """
+    Thumbnail renditions, made right away without workers.
+    """
+
+    def create_thumbnail(self, size=(800, 600)):
+        with self.captureOnCommitCallbacks(execute=True):
+            thumbnail = TaskThumbnail.objects.create(
+                task=self.tasks[0], file=SimpleUploadedFile('photo.jpg', make_image(size)),
+            )
+        thumbnail.refresh_from_db()
+        return thumbnail
+
+    def get_rendered_size(self, name):
+        with rendition_storage.open(name, 'rb') as file:
+            return Image.open(file).size
+
+    def test_sizes(self):
+        thumbnail = self.create_thumbnail()
+        self.assertEqual(
+            {size: self.get_rendered_size(name) for size, name in thumbnail.renditions.items()},
+            {'64': (64, 48), '256': (256, 192), '512': (512, 384)},
+        )
+        self.assertTrue(all(name.startswith(RENDITION_DIR + '/') for name in thumbnail.renditions.values()))
+
+        # Never upscaled
+        thumbnail = self.create_thumbnail((300, 200))
+        self.assertEqual(self.get_rendered_size(thumbnail.renditions['512']), (300, 200))
+
+    def test_serialized(self):
+        thumbnail = self.create_thumbnail()
+        response = self.client.get(reverse('taskthumbnail-list', kwargs={'task': self.tasks[0].pk}))
+        self.assertEqual(response.status_code, 200)
+        data, = response.data['results']
+        self.assertEqual(data['renditions'], {
+            size: 'http://testserver' + rendition_storage.url(name) for size, name in thumbnail.renditions.items()
+        })
+
+    def test_replaced(self):
+        thumbnail = self.create_thumbnail()
+        old = thumbnail.renditions
+
+        with self.captureOnCommitCallbacks(execute=True):
+            thumbnail.file = SimpleUploadedFile('other.jpg', make_image((400, 400)))
+            thumbnail.save()
+        thumbnail.refresh_from_db()
+        self.assertEqual(set(thumbnail.renditions), set(old))
+        self.assertFalse(set(thumbnail.renditions.values()) & set(old.values()))
+        self.assertEqual(self.get_rendered_size(thumbnail.renditions['64']), (64, 64))
+        # Stale renditions are removed
+        self.assertFalse(any(rendition_storage.exists(name) for name in old.values()))
+
+    def test_replaced_while_rendering(self):
+        thumbnail = self.create_thumbnail()
+        rendered = {}
+
+        def replace_file(instance):
+            rendered.update(create_renditions(instance))
+            TaskThumbnail.objects.filter(pk=instance.pk).update(file='tasks/thumbnails/other.jpg')
+            return rendered
+
+        TaskThumbnail.objects.filter(pk=thumbnail.pk).update(renditions={})
+        with mock.patch('apps.tasks.renditions.create_renditions', replace_file):
+            process_thumbnail(thumbnail.pk)
+        # The results for the replaced file are thrown away
+        self.assertEqual(TaskThumbnail.objects.get(pk=thumbnail.pk).renditions, {})
+        self.assertTrue(rendered)
+        self.assertFalse(any(rendition_storage.exists(name) for name in rendered.values()))
+
+    def test_deleted(self):
+        thumbnail = self.create_thumbnail()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('taskthumbnail-detail', kwargs={
+                'task': self.tasks[0].pk, 'pk': thumbnail.pk,
+            }))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(any(rendition_storage.exists(name) for name in thumbnail.renditions.values()))
+
+
+class ExplainTaskFiltersTests(TaskAPITestCase):
+
+    def test_every_combination_explained(self):
+        command = ExplainTaskFiltersCommand()
+        combinations = [command.describe(data) for data in command.get_combinations()]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('explain_task_filters', user=str(self.user.pk), verbose_plans=True, stdout=stdout,
+                     stderr=stderr)
+        output = stdout.getvalue()
+
+        self.assertEqual(stderr.getvalue(), '')
+        self.assertRegex(output, r'\n%d combinations explained, \d+ not covered by an index \(' % len(combinations))
+        self.assertIn('no filters (sort=default) -> ok', output)
+        self.assertIn('done, q (sort=-Updated at) -> ', output)
+        # Every combination reported once, covered or not
+        reported = [line.split(' -> ')[0] for line in output.splitlines() if ' -> ' in line]
+        self.assertEqual(sorted(reported), sorted(combinations))
+
+
+@tag('benchmark')
+class TaskEndpointBenchmarkTests(EndpointBenchmarkMixin, APITestCase):
+    benchmark_label = 'tasks'
+    benchmark_baseline = os.path.join(os.path.dirname(__file__), 'benchmarks.json')
+    local_caches = (local_cache,)
+    temporary_directories = ('MEDIA_ROOT', 'TASK_UPLOAD_DIR')
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed', stdout=io.StringIO(), stderr=io.StringIO(), **SEED_OPTIONS)
+
+        cls.user = User.objects.annotate(task_count=Count('task')).order_by('-task_count', 'id').first()
+        cls.token = str(AccessToken.for_user(cls.user))
+        cls.task = Task.objects.filter(user=cls.user).annotate(
+            file_count=Count('attachments', distinct=True) + Count('thumbnails', distinct=True),
+        ).order_by('-file_count', 'id').first()
+        # Seeded rows have no files
+        cls.attachment = TaskAttachment.objects.create(
+            task=cls.task,
+            file=SimpleUploadedFile('notes.txt', b'benchmark\n' * 10000),
+        )
+        cls.thumbnail = TaskThumbnail.objects.create(
+            task=cls.task,
+            file=SimpleUploadedFile('photo.jpg', make_image()),
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % self.token)
+
+    def create_tasks(self, count, **kwargs):
+        # Fresh tasks for the runs changing or deleting them
+        tasks = Task.objects.bulk_create(Task(user=self.user, title='Benchmark', **kwargs) for _ in range(count))
+        return [task.pk for task in tasks]
+
+    def create_task(self):
+        return self.create_tasks(1)[0]
+
+    def create_deleted_task(self):
+        return self.create_tasks(1, deleted=True, deleted_at=timezone.now())[0]
+
+    def test_regression_checks(self):
+        expected = read_results(self.benchmark_baseline)['list']
+        slower = dict(expected, p95_ms=expected['p95_ms'] * 10 + 100,
+                      peak_memory_kb=expected['peak_memory_kb'] * 10 + 1000)
+
+        # Timings depend on the machine, only checked on demand
+        self.check_regressions('list', slower)
+        with override_settings(BENCHMARK_CHECK_TIMINGS=True), self.assertRaisesRegex(AssertionError, 'p95.*memory'):
+            self.check_regressions('list', slower)
+        with self.assertRaisesRegex(AssertionError, 'queries'):
+            self.check_regressions('list', dict(expected, queries=expected['queries'] + 1))
+
+    def test_list(self):
+        url = reverse('task-list')
+        self.benchmark('list', lambda: self.client.get(url))
+        self.benchmark('list.page_size', lambda: self.client.get(url, {'page_size': 100}))
+        self.benchmark('list.cursor', lambda: self.client.get(url, {'pagination': 'cursor'}))
+
+    def test_list_filters(self):
+        url = reverse('task-list')
+        for name, params in (
+            ('done', {'done': 'true'}),
+            ('title', {'title': self.task.title.split()[0]}),
+            ('start_date', {'start_date': self.task.created_at.isoformat()}),
+            ('finish_date', {'finish_date': self.task.created_at.isoformat()}),
+            ('sort', {'sort': '-Updated at'}),
+            ('q', {'q': self.task.title.split()[-1]}),
+        ):
+            self.benchmark('list.%s' % name, lambda: self.client.get(url, params))
+
+    def test_detail(self):
+        url = reverse('task-detail', kwargs={'pk': self.task.pk})
+        self.benchmark('retrieve', lambda: self.client.get(url))
+
+    def test_write(self):
+        data = {'title': 'Benchmark', 'description': 'Created by the benchmark', 'user': str(self.user.pk)}
+        self.benchmark('create', lambda: self.client.post(reverse('task-list'), data, format='json'), status=201)
+        self.benchmark(
+            'update',
+            lambda pk: self.client.put(reverse('task-detail', kwargs={'pk': pk}), {'done': True}, format='json'),
+            prepare=self.create_task,
+        )
+        self.benchmark(
+            'destroy',
+            lambda pk: self.client.delete(reverse('task-detail', kwargs={'pk': pk})),
+            prepare=self.create_task,
+            status=204,
+        )
+
+    def test_trash(self):
+        self.create_tasks(30, deleted=True, deleted_at=timezone.now())
+        self.benchmark('trash', lambda: self.client.get(reverse('task-trash')))
+        self.benchmark(
+            'restore',
+            lambda pk: self.client.post(reverse('task-restore', kwargs={'pk': pk})),
+            prepare=self.create_deleted_task,
+        )
+
+    def test_bulk(self):
+        def operations():
+            return {'operations': [
+                {'action': 'create', 'data': {'title': 'Benchmark %d' % index}} for index in range(10)
+            ] + [
+                {'action': 'update', 'id': str(pk), 'data': {'done': True}} for pk in self.create_tasks(10)
+            ] + [
+                {'action': 'delete', 'id': str(pk)} for pk in self.create_tasks(5)
+            ]}
+
+        self.benchmark(
+            'bulk',
+            lambda data: self.client.post(reverse('task-bulk'), data, format='json'),
+            prepare=operations,
+        )
+
+    def test_sync(self):
+        url = reverse('task-sync')
+        self.benchmark('sync', lambda: self.client.get(url))
+        watermark = self.client.get(url, {'limit': 1000}).data['watermark']
+        self.benchmark('sync.since', lambda: self.client.get(url, {'since': watermark}))
+
+    def test_export(self):
+        url = reverse('task-export')
+        self.benchmark('export.ndjson', lambda: self.client.get(url, {'output': 'ndjson'}))
+        self.benchmark('export.csv', lambda: self.client.get(url, {'output': 'csv'}))
+
+    def test_import(self):
+        content = ''.join(
+            json.dumps({'title': 'Imported %d' % index, 'done': bool(index % 2)}) + '\n' for index in range(200)
+        ).encode('utf-8')
+        self.benchmark(
+            'import',
+            lambda: self.client.post(
+                reverse('task-import-tasks'),
+                {'file': SimpleUploadedFile('tasks.ndjson', content)},
+                format='multipart',
+            ),
+        )
+
+    def test_async(self):
+        self.benchmark('async.list', lambda: self.client.get(reverse('async_task_list')))
+        self.benchmark(
+            'async.retrieve',
+            lambda: self.client.get(reverse('async_task_detail', kwargs={'pk': self.task.pk})),
+        )
+        self.benchmark(
+            'async.create',
+            lambda: self.client.post(
+                reverse('async_task_list'),
+                {'title': 'Benchmark', 'user': str(self.user.pk)},
+                format='json',
+            ),
+            status=201,
+        )
+
+    def benchmark_files(self, prefix, instance, make_file):
+        kwargs = {'task': self.task.pk}
+        self.benchmark('%s.list' % prefix, lambda: self.client.get(reverse('%s-list' % prefix, kwargs=kwargs)))
+        self.benchmark(
+            '%s.retrieve' % prefix,
+            lambda: self.client.get(reverse('%s-detail' % prefix, kwargs={'pk': instance.pk, **kwargs})),
+        )
+        self.benchmark(
+            '%s.download' % prefix,
+            lambda: self.client.get(reverse('%s-download' % prefix, kwargs={'pk': instance.pk, **kwargs})),
+        )
+        self.benchmark(
+            '%s.create' % prefix,
+            lambda: self.client.post(reverse('%s-list' % prefix, kwargs=kwargs), {'file': make_file()},
+                                     format='multipart'),
+            status=201,
+        )
+
+    def benchmark_chunked_upload(self, prefix, kind, content):
+        kwargs = {'task': self.task.pk}
+
+        def start():
+            return TaskUpload.objects.create(
+                task=self.task,
+                user=self.user,
+                kind=kind,
+                filename='upload.bin',
+                size=len(content),
+                expires_at=get_expires_at(),
+            ).pk
+
+        def send(pk):
+            self.client.put(
+                reverse('%s-upload-chunk' % prefix, kwargs={'upload': pk, 'index': 0, **kwargs}),
+                content,
+                content_type='application/octet-stream',
+            )
+            return pk
+
+        self.benchmark(
+            '%s.create_upload' % prefix,
+            lambda: self.client.post(
+                reverse('%s-create-upload' % prefix, kwargs=kwargs),
+                {'filename': 'upload.bin', 'size': len(content)},
+                format='json',
+            ),
+            status=201,
+        )
+        self.benchmark(
+            '%s.upload_state' % prefix,
+            lambda pk: self.client.get(reverse('%s-upload-state' % prefix, kwargs={'upload': pk, **kwargs})),
+            prepare=start,
+        )
+        self.benchmark(
+            '%s.upload_chunk' % prefix,
+            lambda pk: self.client.put(
+                reverse('%s-upload-chunk' % prefix, kwargs={'upload': pk, 'index': 0, **kwargs}),
+                content,
+                content_type='application/octet-stream',
+            ),
+            prepare=start,
+        )
+        self.benchmark(
+            '%s.finalize_upload' % prefix,
+            lambda pk: self.client.post(reverse('%s-finalize-upload' % prefix, kwargs={'upload': pk, **kwargs})),
+            prepare=lambda: send(start()),
+            status=201,
+        )
+
+    def test_attachments(self):
+        self.benchmark_files(
+            'taskattachment',
+            self.attachment,
+            lambda: SimpleUploadedFile('notes.txt', b'benchmark\n' * 10000),
+        )
+        self.benchmark_chunked_upload('taskattachment', TaskUpload.KIND_ATTACHMENT, b'benchmark\n' * 10000)
+
+    def test_thumbnails(self):
+        image = make_image()
+        self.benchmark_files('taskthumbnail', self.thumbnail, lambda: SimpleUploadedFile('photo.jpg', image))
+        self.benchmark_chunked_upload('taskthumbnail', TaskUpload.KIND_THUMBNAIL, image)
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+# Bytes read from the request at a time while receiving a chunk
+READ_SIZE = 64 * 1024
+# Suffix of the files chunks are received into before being appended
+CHUNK_SUFFIX = '.chunk'
+
+
+class UploadError(Exception):
+    pass
+
+
+class ChunkTooLarge(UploadError):
+    pass
+
+
+class PartFileLost(UploadError):
+    pass
+
+
+class PartFile(File):
+    """
+    Finished part file. `FileSystemStorage` moves files exposing
+    `temporary_file_path` instead of copying them chunk by chunk.
+    """
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def get_upload_dir():
+    return getattr(settings, 'TASK_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'uploads'))
+
+
+def get_part_path(upload):
+    return os.path.join(get_upload_dir(), '%s.part' % upload.pk)
+
+
+def get_expires_at():
+    return timezone.now() + timezone.timedelta(seconds=getattr(settings, 'TASK_UPLOAD_EXPIRY', 60 * 60 * 24))
+
+
+def get_limits():
+    return (
+        getattr(settings, 'TASK_UPLOAD_MAX_CHUNK_SIZE', 8 * 1024 * 1024),
+        getattr(settings, 'TASK_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024),
+    )
+
+
+def receive_chunk(upload, stream):
+    """
+    Reads a chunk from `stream` into a temporary file next to the part file of
+    `upload`, returns its path (to be removed by the caller) and size. Nothing
+    is locked meanwhile, the client may be slow.
+    """
+    max_chunk_size, max_size = get_limits()
+    os.makedirs(get_upload_dir(), exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=get_upload_dir(), prefix='%s.' % upload.pk, suffix=CHUNK_SUFFIX, delete=False,
+    ) as chunk:
+        try:
+            written = 0
+            while True:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    break
+                written += len(data)
+                if written > max_chunk_size or upload.received + written > max_size:
+                    raise ChunkTooLarge(chunk.name)
+                chunk.write(data)
+        except BaseException:
+            chunk.close()
+            os.remove(chunk.name)
+            raise
+    return chunk.name, written
+
+
+def append_chunk(upload, path, size):
+    """
+    Appends the chunk received into `path` to the part file of `upload`.
+    Anything written past `upload.received` by an interrupted request is
+    discarded first, so a chunk can always be retried.
+    """
+    if upload.received + size > get_limits()[1]:
+        raise ChunkTooLarge(path)
+
+    part_path = get_part_path(upload)
+    with open(part_path, 'ab') as part:
+        if part.tell() < upload.received:
+            raise PartFileLost(part_path)
+        part.truncate(upload.received)
+        with open(path, 'rb') as chunk:
+            shutil.copyfileobj(chunk, part, READ_SIZE)
+
+
+def remove_chunk(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_part_file(upload):
+    try:
+        os.remove(get_part_path(upload))
+    except FileNotFoundError:
+        pass
@@ -1,22 +1,63 @@
-from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema, no_body
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser, JSONParser
-from rest_framework import viewsets
+from rest_framework import viewsets, status, exceptions
+from rest_framework.pagination import _positive_int
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from asgiref.sync import sync_to_async
+from django_filters.utils import translate_validation
 
-from utils.pagination import ResultsSetPagination, SWAGGER_PAGINATION_KWARGS
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.translation import gettext as _
 
-from .models import Task
-from .mixins import TaskRelatedModelMixin
+from apps.user.authentication import AsyncJWTAuthentication
+from utils.async_views import AsyncAPIView, aprefetch_related
+from utils.conditional import conditional_get, make_etag, normalized_query
+from utils.pagination import ResultsSetPagination, KeysetPagination, SWAGGER_PAGINATION_KWARGS
+from utils.queries import QueryBudgetMixin
+from utils.response_cache import cache_response, bump_version
+
+from .counters import adjust_task_count, aget_list_version, get_list_version, resolve_list_count
+from .export import iter_export, FORMATS as EXPORT_FORMATS, CONTENT_TYPES as EXPORT_CONTENT_TYPES
+from .models import Task, TaskAttachment, TaskThumbnail, TaskUpload
+from .mixins import TaskRelatedModelMixin, ChunkedUploadMixin, FileDownloadMixin
 from .filters import TaskFilters
-from .serializers import TaskSerializer, TaskThumbnailSerializer, TaskAttachmentSerializer
+from .importer import TaskImporter, iter_records, open_upload
+from .serializers import (
+    TaskSerializer,
+    TaskThumbnailSerializer,
+    TaskAttachmentSerializer,
+    TaskBulkSerializer,
+    TaskImportSerializer,
+    TaskImportResultSerializer,
+    TaskSyncResponseSerializer,
+)
+from .sync import collect_changes, decode_watermark, InvalidWatermark, ExpiredWatermark
 
 
 # Create your views here.
 
-class ViewsetBase(viewsets.ModelViewSet):
+class ViewsetBase(QueryBudgetMixin, viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'put', 'delete', 'options', 'head']
     permission_classes = (IsAuthenticated,)
     pagination_class = ResultsSetPagination
+    # Chosen per request with `?pagination=cursor` (or by passing a `cursor`)
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            if self.cursor_pagination_class.is_requested(getattr(self, 'request', None)):
+                pagination_class = self.cursor_pagination_class
+            self._paginator = pagination_class() if pagination_class is not None else None
+        return self._paginator
 
     def update(self, *args, **kwargs):
         return super().update(*args, partial=True, **kwargs)
@@ -33,9 +74,86 @@ class TaskViewsetAPIView(ViewsetBase):
     serializer_class = TaskSerializer
     queryset = Task.objects.all()
     filterset_class = TaskFilters
+    query_budget = {
+        # auth + ETag (last update, no query with a shared cache) + count (unless cached) + page
+        # + attachments + thumbnails
+        'list': 6,
+        # auth + ETag (task's updated_at) + task + attachments + thumbnails
+        'retrieve': 5,
+        # auth + select + soft delete
+        'destroy': 3,
+        # auth + count + page + attachments + thumbnails
+        'trash': 5,
+        # auth + task + attachments + thumbnails + savepoint (2) + restore + touch attachments
+        # + touch thumbnails + refetch
+        'restore': 10,
+        # auth + select + insert + update + soft delete + savepoint + refetch (3)
+        'bulk': 10,
+        # auth + tasks + attachments + thumbnails + tombstones
+        'sync': 5,
+    }
+
+    export_chunk_size = 1000
+
+    sync_limit = 500
+    sync_max_limit = 1000
 
     def get_queryset(self):
-        return self.queryset.filter(user_id=self.request.user.id)
+        return self.queryset.filter(user_id=self.request.user.id).prefetch_related('attachments', 'thumbnails')
+
+    def get_trash_queryset(self):
+        return Task.all_objects.filter(
+            user_id=self.request.user.id,
+            deleted=True,
+        ).prefetch_related('attachments', 'thumbnails')
+
+    @swagger_auto_schema(
+        operation_summary='',
+        **SWAGGER_PAGINATION_KWARGS,
+    )
+    @cache_response
+    @conditional_get
+    def list(self, *args, **kwargs):
+        return super().list(*args, **kwargs)
+
+    @cache_response
+    @conditional_get
+    def retrieve(self, *args, **kwargs):
+        return super().retrieve(*args, **kwargs)
+
+    def get_etag(self, request, *args, **kwargs):
+        """
+        List: version of all user's lists (see `get_list_version`) and the
+        query. Detail: task's `updated_at`. Attachment/thumbnail changes touch
+        their task, see `apps.tasks.signals`.
+        """
+        if self.action == 'list':
+            return make_etag(
+                request.user.id,
+                request.accepted_renderer.format,
+                normalized_query(request),
+                get_list_version(request.user.id),
+            )
+
+        if self.action == 'retrieve':
+            try:
+                updated_at = Task.objects.filter(
+                    user_id=request.user.id,
+                    pk=kwargs[self.lookup_field],
+                ).values_list('updated_at', flat=True).first()
+            except (ValueError, ValidationError):
+                return None
+            if updated_at is None:
+                return None
+            return make_etag(request.user.id, request.accepted_renderer.format, kwargs[self.lookup_field], updated_at)
+
+        return None
+
+    def resolve_count(self, request, compute):
+        # Counters and cached counts only describe the regular task list
+        if self.action != 'list':
+            return compute(), True
+        return resolve_list_count(request, compute)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -44,12 +162,142 @@ class TaskViewsetAPIView(ViewsetBase):
         })
         return context
 
+    def destroy(self, request, *args, **kwargs):
+        """
+        Soft delete: a single UPDATE, related rows and files are removed later
+        by the `purge_deleted_tasks` command.
+        """
+        queryset = Task.objects.filter(user_id=request.user.id)
+        task = get_object_or_404(queryset.only('id', 'done', 'user_id'), pk=kwargs[self.lookup_field])
+        if queryset.filter(pk=task.pk).soft_delete():
+            adjust_task_count(task.user_id, task.done, -1)
+            bump_version(task.user_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @swagger_auto_schema(
+        operation_summary='Create, update and delete tasks in one request',
+        request_body=TaskBulkSerializer(),
+    )
+    @action(detail=False, methods=['post'], serializer_class=TaskBulkSerializer)
+    def bulk(self, request, *args, **kwargs):
+        serializer = TaskBulkSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': serializer.save()})
+
+    @swagger_auto_schema(
+        operation_summary='Import tasks from an NDJSON or CSV file',
+        request_body=TaskImportSerializer(),
+        responses={200: TaskImportResultSerializer()},
+    )
+    @action(detail=False, methods=['post'], url_path='import', serializer_class=TaskImportSerializer,
+            parser_classes=(MultiPartParser,))
+    def import_tasks(self, request, *args, **kwargs):
+        serializer = TaskImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        stream = open_upload(serializer.validated_data['file'])
+        try:
+            records = iter_records(stream, serializer.validated_data['input'])
+            result = TaskImporter(request.user, context=self.get_serializer_context()).run(records)
+        finally:
+            stream.detach()
+        return Response(TaskImportResultSerializer(result).data)
+
+    @swagger_auto_schema(
+        operation_summary='Changes since the given watermark',
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Watermark returned by the previous sync, omit for a full sync'),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        responses={
+            200: TaskSyncResponseSerializer(),
+            410: "{'detail': 'Watermark expired, full sync is required'}",
+        }
+    )
+    @action(detail=False, methods=['get'], pagination_class=None, filterset_class=None)
+    def sync(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        try:
+            since = decode_watermark(since) if since else None
+        except InvalidWatermark:
+            raise exceptions.ValidationError({'since': [_('Invalid watermark')]})
+        except ExpiredWatermark:
+            return Response({'detail': _('Watermark expired, full sync is required')}, status=status.HTTP_410_GONE)
+
+        try:
+            limit = _positive_int(request.query_params.get('limit', self.sync_limit), strict=True, cutoff=self.sync_max_limit)
+        except ValueError:
+            limit = self.sync_limit
+
+        changes = collect_changes(request.user.id, since=since, limit=limit)
+        return Response(TaskSyncResponseSerializer(changes, context=self.get_serializer_context()).data)
+
+    @swagger_auto_schema(
+        operation_summary='Export all tasks as a stream',
+        manual_parameters=[
+            openapi.Parameter('output', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=EXPORT_FORMATS),
+        ],
+    )
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def export(self, request, *args, **kwargs):
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise exceptions.ValidationError({'output': [_('Unknown export format')]})
 
-class TaskAttachmentsViewsetsAPIView(TaskRelatedModelMixin, ViewsetBase):
+        queryset = self.filter_queryset(Task.objects.filter(user_id=request.user.id))
+        response = StreamingHttpResponse(
+            iter_export(queryset, export_format, context=self.get_serializer_context(), chunk_size=self.export_chunk_size),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = 'attachment; filename="tasks.%s"' % export_format
+        return response
+
+    @swagger_auto_schema(
+        operation_summary='Deleted tasks',
+        **SWAGGER_PAGINATION_KWARGS,
+    )
+    @action(detail=False, methods=['get'])
+    def trash(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_trash_queryset()).order_by('-deleted_at', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @swagger_auto_schema(
+        operation_summary='Restore deleted task',
+        request_body=no_body,
+        responses={
+            200: TaskSerializer()
+        }
+    )
+    @action(detail=True, methods=['post'])
+    def restore(self, request, *args, **kwargs):
+        task = get_object_or_404(self.get_trash_queryset(), pk=kwargs[self.lookup_field])
+        with transaction.atomic():
+            if Task.all_objects.filter(pk=task.pk).restore():
+                # Left out of the delta sync while the task was deleted, sent again as changes
+                now = timezone.now()
+                TaskAttachment.objects.filter(task_id=task.pk).update(updated_at=now)
+                TaskThumbnail.objects.filter(task_id=task.pk).update(updated_at=now)
+                adjust_task_count(task.user_id, task.done, 1)
+                bump_version(task.user_id)
+        task.refresh_from_db(fields=('deleted', 'deleted_at', 'updated_at'))
+        return Response(self.get_serializer(task).data)
+
+
+class TaskAttachmentsViewsetsAPIView(FileDownloadMixin, ChunkedUploadMixin, TaskRelatedModelMixin, ViewsetBase):
     serializer_class = TaskAttachmentSerializer
     queryset = TaskAttachmentSerializer.Meta.model.objects.all()
     target_attribute = 'attachments'
     parser_classes = (MultiPartParser,)
+    upload_kind = TaskUpload.KIND_ATTACHMENT
+    # auth + task + count + page
+    query_budget = {
+        'list': 4,
+        'retrieve': 3,
+        'download': 3,
+    }
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -79,11 +327,18 @@ class TaskAttachmentsViewsetsAPIView(TaskRelatedModelMixin, ViewsetBase):
         return super().update(*args, **kwargs)
 
 
-class TaskThumbnailViewsetAPIView(TaskRelatedModelMixin, ViewsetBase):
+class TaskThumbnailViewsetAPIView(FileDownloadMixin, ChunkedUploadMixin, TaskRelatedModelMixin, ViewsetBase):
     serializer_class = TaskThumbnailSerializer
     queryset = TaskThumbnailSerializer.Meta.model.objects.all()
     target_attribute = 'thumbnails'
     parser_classes = (MultiPartParser,)
+    upload_kind = TaskUpload.KIND_THUMBNAIL
+    # auth + task + count + page
+    query_budget = {
+        'list': 4,
+        'retrieve': 3,
+        'download': 3,
+    }
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -111,3 +366,87 @@ class TaskThumbnailViewsetAPIView(TaskRelatedModelMixin, ViewsetBase):
     )
     def update(self, *args, **kwargs):
         return super().update(*args, **kwargs)
+
+
+class AsyncTaskListAPIView(AsyncAPIView):
+    """
+    Async `GET/POST /tasks/` for ASGI servers: the same filters, pagination
+    modes, ETags and representation as `TaskViewsetAPIView`.
+    """
+    authentication_classes = (AsyncJWTAuthentication,)
+    serializer_class = TaskSerializer
+    filterset_class = TaskFilters
+    pagination_class = ResultsSetPagination
+    cursor_pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return Task.objects.filter(user_id=self.request.user.id)
+
+    def filter_queryset(self, queryset):
+        filterset = self.filterset_class(self.request.query_params, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return filterset.qs
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Same ETag as the sync list
+        etag = make_etag(request.user.id, 'json', normalized_query(request), await aget_list_version(request.user.id))
+        not_modified = self.get_not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        if self.cursor_pagination_class.is_requested(request):
+            paginator = self.cursor_pagination_class()
+            tasks = await paginator.apaginate_queryset(queryset, request, view=self)
+        else:
+            paginator = self.pagination_class()
+            # The counters use the sync cache API
+            count, exact = await sync_to_async(resolve_list_count)(request, queryset.count)
+            tasks = await paginator.apaginate_queryset(queryset, request, view=self, count=count, count_exact=exact)
+        await aprefetch_related(tasks, 'attachments', 'thumbnails')
+
+        serializer = self.serializer_class(tasks, many=True, context=self.get_serializer_context())
+        return self.render(paginator.get_paginated_response(serializer.data).data, etag=etag)
+
+    async def post(self, request, *args, **kwargs):
+        # Validation queries and signal receivers are sync
+        data = await sync_to_async(self.create)(request)
+        return self.render(data, status.HTTP_201_CREATED)
+
+    def create(self, request):
+        serializer = self.serializer_class(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return serializer.data
+
+
+class AsyncTaskDetailAPIView(AsyncAPIView):
+    """
+    Async `GET /tasks/<id>/`, see `AsyncTaskListAPIView`.
+    """
+    authentication_classes = (AsyncJWTAuthentication,)
+    serializer_class = TaskSerializer
+
+    def get_queryset(self):
+        return Task.objects.filter(user_id=self.request.user.id)
+
+    async def get(self, request, pk, *args, **kwargs):
+        queryset = self.get_queryset()
+        updated_at = await queryset.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+        if updated_at is None:
+            raise Http404
+        etag = make_etag(request.user.id, 'json', pk, updated_at)
+        not_modified = self.get_not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            task = await queryset.aget(pk=pk)
+        except Task.DoesNotExist:
+            raise Http404
+        await aprefetch_related([task], 'attachments', 'thumbnails')
+
+        serializer = self.serializer_class(task, context=self.get_serializer_context())
+        return self.render(serializer.data, etag=etag)
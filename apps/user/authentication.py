@@ -0,0 +1,196 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router
+from django.db.models.fields.files import FieldFile
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from utils.local_cache import LocalTTLCache
+from utils.timing import timer
+
+from .models import User
+
+# Never copied to the caches, loaded on access (password checks and changes)
+UNCACHED_FIELDS = ('password',)
+
+local_cache = LocalTTLCache(getattr(settings, 'USER_CACHE_LOCAL_MAX_ENTRIES', 1000))
+
+
+def user_cache_key(user_id):
+    return 'auth-user:%s' % user_id
+
+
+def get_timeouts():
+    # (shared cache, in-process cache)
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300), getattr(settings, 'USER_CACHE_LOCAL_TIMEOUT', 5)
+
+
+def get_shared_cache():
+    # A per process cache (the locmem default) can't be invalidated by other workers
+    cache = caches['default']
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+def dump_value(user, field):
+    value = getattr(user, field.attname)
+    # A pickled `FieldFile` carries its instance, the whole user with the password hash
+    return value.name if isinstance(value, FieldFile) else value
+
+
+def dump_user(user):
+    return {
+        field.attname: dump_value(user, field)
+        for field in User._meta.concrete_fields
+        if field.attname not in UNCACHED_FIELDS
+    }
+
+
+def load_user(values):
+    """
+    A fresh `User` from cached values, missing fields are deferred. Saving it
+    only writes the loaded fields.
+    """
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), fields, [values[name] for name in fields])
+
+
+def get_cached_user(user_id):
+    timeout, local_timeout = get_timeouts()
+    if not timeout:
+        return None
+
+    key = user_cache_key(user_id)
+    values = local_cache.get(key)
+    if values is None:
+        cache = get_shared_cache()
+        values = cache.get(key) if cache is not None else None
+        if values is None:
+            return None
+        local_cache.set(key, values, local_timeout)
+    return load_user(values)
+
+
+async def aget_cached_user(user_id):
+    timeout, local_timeout = get_timeouts()
+    if not timeout:
+        return None
+
+    key = user_cache_key(user_id)
+    values = local_cache.get(key)
+    if values is None:
+        cache = get_shared_cache()
+        values = await cache.aget(key) if cache is not None else None
+        if values is None:
+            return None
+        local_cache.set(key, values, local_timeout)
+    return load_user(values)
+
+
+def cache_user(user):
+    timeout, local_timeout = get_timeouts()
+    if not timeout:
+        return
+    values = dump_user(user)
+    cache = get_shared_cache()
+    if cache is not None:
+        cache.set(user_cache_key(user.pk), values, timeout)
+    local_cache.set(user_cache_key(user.pk), values, local_timeout)
+
+
+async def acache_user(user):
+    timeout, local_timeout = get_timeouts()
+    if not timeout:
+        return
+    values = dump_user(user)
+    cache = get_shared_cache()
+    if cache is not None:
+        await cache.aset(user_cache_key(user.pk), values, timeout)
+    local_cache.set(user_cache_key(user.pk), values, local_timeout)
+
+
+def invalidate_user(user_id):
+    """
+    Drops a cached user, done by `apps.user.signals` whenever a user is
+    saved. Call it after `QuerySet.update()` of users (e.g. `is_active`).
+    Other processes may use their in-process copy for up to
+    `USER_CACHE_LOCAL_TIMEOUT` seconds.
+    """
+    key = user_cache_key(user_id)
+    local_cache.delete(key)
+    cache = get_shared_cache()
+    if cache is not None:
+        cache.delete(key)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` without a query per request: resolved users are kept
+    in the shared cache for `USER_CACHE_TIMEOUT` seconds (0 disables caching)
+    and in a small in-process LRU for `USER_CACHE_LOCAL_TIMEOUT` seconds.
+    """
+
+    def authenticate(self, request):
+        with timer('auth'):
+            return super().authenticate(request)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def check_user(self, user):
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+    def get_user(self, validated_token):
+        user = get_cached_user(self.get_user_id(validated_token))
+        if user is not None:
+            return self.check_user(user)
+
+        user = super().get_user(validated_token)
+        cache_user(user)
+        return user
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    `CachedJWTAuthentication` for the async views (`utils.async_views`).
+    Token checks only need the CPU; the user is loaded with the async ORM.
+    """
+
+    async def aauthenticate(self, request):
+        with timer('auth'):
+            return await self._aauthenticate(request)
+
+    async def _aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = await aget_cached_user(user_id)
+        if user is not None:
+            return self.check_user(user)
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        self.check_user(user)
+        await acache_user(user)
+        return user
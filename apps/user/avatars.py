@@ -0,0 +1,57 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.urls import reverse
+
+from utils.disk_cache import DiskLRUCache
+from utils.images import get_output_format, open_image, resize
+
+CONTENT_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+cache = DiskLRUCache(
+    getattr(settings, 'AVATAR_CACHE_DIR', str(settings.BASE_DIR / 'cache' / 'avatars')),
+    getattr(settings, 'AVATAR_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+)
+
+# Concurrent requests for the same missing variant render it once per process
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_sizes():
+    return tuple(getattr(settings, 'AVATAR_SIZES', (32, 64, 128, 256)))
+
+
+def get_avatar_key(name):
+    """
+    Identifies the avatar's content: upload names are never reused (and are
+    the digest itself with content addressed storage).
+    """
+    return hashlib.sha256(name.encode('utf-8')).hexdigest()[:16]
+
+
+def get_variant_key(key, size):
+    return '%s-%d.%s' % (key, size, get_output_format()[1])
+
+
+def get_avatar_url(user, size, request=None):
+    url = reverse('avatar', kwargs={'user': user.pk, 'key': get_avatar_key(user.avatar.name), 'size': size})
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def get_variant(avatar, key, size):
+    """
+    Path of the cached `size` variant of `avatar`, rendered on a miss. Raises
+    `utils.images.UnreadableImage` for files which aren't images.
+    """
+    variant_key = get_variant_key(key, size)
+    with _locks[hash(variant_key) % len(_locks)]:
+        path = cache.get(variant_key)
+        if path is not None:
+            return path
+
+        image_format = get_output_format()[0]
+        with avatar.open('rb') as source:
+            image = open_image(source, size)
+        quality = getattr(settings, 'AVATAR_QUALITY', 85)
+        return cache.set(variant_key, resize(image, size, image_format, quality, crop=True))
@@ -0,0 +1,25 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    `ModelBackend` signing users in by email with a single query, the
+    password is checked on the fetched row. `check_password()` re-hashes and
+    saves the password when the hasher settings changed (e.g.
+    PASSWORD_PBKDF2_ITERATIONS).
+
+    Unlike `ModelBackend`, unknown emails aren't hashed against: the sign in
+    response tells them apart anyway.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        email = kwargs.get(User.USERNAME_FIELD, username)
+        if email is None or password is None:
+            return None
+
+        user = User._default_manager.filter(email=email).first()
+        if user is not None and user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the iteration count of
+    `PASSWORD_PBKDF2_ITERATIONS` (see `manage.py benchmark_hashers`). Hashes
+    stored with another count are re-hashed on the next successful login,
+    whether the setting was raised or lowered.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', None) or hashers.PBKDF2PasswordHasher.iterations
@@ -0,0 +1,89 @@
+import statistics
+import time
+from collections import Counter
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher, get_hashers, identify_hasher
+from django.core.management.base import BaseCommand
+
+from apps.user.models import User
+
+# Cost parameters reported for the stored hashes
+COST_KEYS = ('iterations', 'work_factor', 'time_cost')
+
+
+def time_hasher(hasher, password, repeat):
+    timings = []
+    for _ in range(repeat):
+        salt = hasher.salt()
+        started = time.perf_counter()
+        hasher.encode(password, salt)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the PASSWORD_HASHERS on this machine, recommends a PASSWORD_PBKDF2_ITERATIONS for a target '
+        'login latency and counts the stored hashes which the next login will re-hash'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=100, help='Wanted hashing time of one login')
+        parser.add_argument('--repeat', type=int, default=5, help='Hashes timed per hasher (median is used)')
+        parser.add_argument('--skip-users', action='store_true', help='Do not go through the stored hashes')
+
+    def handle(self, *args, **options):
+        target = options['target_ms']
+        password = 'benchmark-password'
+        recommended = None
+
+        for hasher in get_hashers():
+            try:
+                elapsed = time_hasher(hasher, password, options['repeat'])
+            except ValueError:
+                # Needs a library which isn't installed (argon2-cffi, bcrypt)
+                self.stdout.write('%-22s not available' % hasher.algorithm)
+                continue
+
+            cost = ''
+            if getattr(hasher, 'iterations', None):
+                cost = 'iterations=%d' % hasher.iterations
+            self.stdout.write('%-22s %-18s %8.1fms  ~%.0f logins/s per core' % (
+                hasher.algorithm, cost, elapsed, 1000 / elapsed,
+            ))
+            if recommended is None and isinstance(hasher, PBKDF2PasswordHasher):
+                recommended = max(int(hasher.iterations * target / elapsed) // 1000 * 1000, 1000)
+
+        if recommended is not None:
+            self.stdout.write(self.style.SUCCESS(
+                'PASSWORD_PBKDF2_ITERATIONS=%d takes about %.0fms per login here' % (recommended, target)
+            ))
+            if recommended < PBKDF2PasswordHasher.iterations:
+                self.stdout.write(self.style.WARNING(
+                    "That is below Django's default of %d, so stolen hashes would be cheaper to crack" % (
+                        PBKDF2PasswordHasher.iterations
+                    )
+                ))
+
+        if not options['skip_users']:
+            self.summarize_users()
+
+    def summarize_users(self):
+        preferred = get_hasher('default')
+        stored = Counter()
+        for encoded in User.objects.values_list('password', flat=True).iterator(chunk_size=2000):
+            try:
+                hasher = identify_hasher(encoded)
+            except ValueError:
+                stored['unusable', '', False] += 1
+                continue
+            decoded = hasher.decode(encoded)
+            cost = ' '.join('%s=%s' % (key, decoded[key]) for key in COST_KEYS if key in decoded)
+            outdated = hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+            stored[hasher.algorithm, cost, outdated] += 1
+
+        self.stdout.write('Stored hashes:')
+        for (algorithm, cost, outdated), count in sorted(stored.items()):
+            self.stdout.write('  %-22s %-18s %8d  %s' % (
+                algorithm, cost, count, 're-hashed on the next login' if outdated else 'current',
+            ))
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:51
+
+import apps.files.storage
+from django.db import migrations, models
+import utils.files
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.FileField(blank=True, null=True, storage=apps.files.storage.get_file_storage, upload_to=utils.files.SetUploadPath('user/avatars')),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_avatar_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['avatar'], name='user_avatar_idx'),
+        ),
+    ]
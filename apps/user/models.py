@@ -4,21 +4,33 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from apps.files.models import BlobFieldsMixin
+from apps.files.storage import get_file_storage
 from utils.files import SetUploadPath
 
 
 # Create your models here.
 
 
-class User(AbstractUser):
+class User(BlobFieldsMixin, AbstractUser):
     id = models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, unique=True)
     email = models.EmailField(_('email address'), unique=True, null=False)
     username = models.TextField(max_length=255, unique=False, null=True, blank=True)
-    avatar = models.FileField(null=True, blank=True, upload_to=SetUploadPath('user/avatars'))
+    avatar = models.FileField(null=True, blank=True, upload_to=SetUploadPath('user/avatars'),
+                              storage=get_file_storage)
+    updated_at = models.DateTimeField(verbose_name='Обновлено', auto_now=True, null=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = (
+            # Orphaned files lookups of `manage.py collect_orphaned_media`
+            models.Index(fields=('avatar',), name='user_avatar_idx'),
+        )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    blob_fields = ('avatar',)
+
     def __str__(self):
         name = self.get_full_name()
         if not name:
@@ -5,10 +5,13 @@ from django.utils.translation import gettext as _, gettext_lazy as __
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 
+from utils.timing import TimedSerializerMixin
+
+from .avatars import get_avatar_url, get_sizes
 from .models import User
 
 
-class LoginSerializer(serializers.Serializer):
+class LoginSerializer(TimedSerializerMixin, serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField()
 
@@ -30,24 +33,15 @@ class LoginSerializer(serializers.Serializer):
         return True if user is not None and user.is_active else False
 
     def authenticate(self, attrs):
-        authenticate_kwargs = {
-            'email': attrs.get('email'),
-            'password': attrs.get('password'),
-        }
-        try:
-            authenticate_kwargs['request'] = self.context['request']
-        except KeyError:
-            pass
-
-        exists_account = User.objects.filter(email=authenticate_kwargs['email']).exists()
-        if not exists_account:
+        # `apps.user.backends.EmailBackend` fetches the user once, the account
+        # is only looked up again to tell why the sign in failed
+        user = authenticate(self.context.get('request'), email=attrs.get('email'), password=attrs.get('password'))
+        if user is None and not User._default_manager.filter(email=attrs.get('email')).exists():
             raise exceptions.AuthenticationFailed(
                 {'username': self.error_messages['no_account']},
                 'no_account'
             )
 
-        user = authenticate(**authenticate_kwargs)
-
         if not self.authentication_rule(user):
             raise exceptions.AuthenticationFailed(
                 {'password': self.error_messages['wrong_password']},
@@ -65,7 +59,7 @@ class LoginSerializer(serializers.Serializer):
         }
 
 
-class UserCreateSerializer(serializers.Serializer):
+class UserCreateSerializer(TimedSerializerMixin, serializers.Serializer):
     email = serializers.EmailField()
     first_name = serializers.CharField(required=False)
     last_name = serializers.CharField(required=False)
@@ -112,7 +106,10 @@ class UserCreateSerializer(serializers.Serializer):
         return user
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # {size: url} of the resized avatars, empty without an avatar
+    avatar_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = (
@@ -122,6 +119,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             'email',
             'date_joined',
             'avatar',
+            'avatar_variants',
         )
         extra_kwargs = {
             'id': {
@@ -132,8 +130,14 @@ class ProfileSerializer(serializers.ModelSerializer):
             }
         }
 
+    def get_avatar_variants(self, instance) -> dict:
+        if not instance.avatar:
+            return {}
+        request = self.context.get('request')
+        return {str(size): get_avatar_url(instance, size, request) for size in get_sizes()}
+
 
-class ChangePasswordSerializer(serializers.Serializer):
+class ChangePasswordSerializer(TimedSerializerMixin, serializers.Serializer):
     old_password = serializers.CharField()
     password = serializers.CharField()
     password1 = serializers.CharField()
@@ -168,7 +172,7 @@ class ChangePasswordSerializer(serializers.Serializer):
         raise NotImplementedError(_('`ChangePasswordSerializer` cannot create an instance'))
 
 
-class UploadAvatarSerializer(serializers.ModelSerializer):
+class UploadAvatarSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('avatar',)
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Profile and avatar updates, password changes, (de)activation, last login.
+    # After the commit, a request in between could cache the old row again.
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
@@ -1,3 +1,396 @@
-from django.test import TestCase
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from django.contrib.auth import authenticate
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings, tag
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from apps.user.authentication import dump_user, get_cached_user, invalidate_user, local_cache, user_cache_key
+from apps.user.avatars import CONTENT_TYPES as AVATAR_CONTENT_TYPES, cache as avatar_cache, get_avatar_key, get_sizes
+from apps.user.models import User
+from utils.benchmark import EndpointBenchmarkMixin
+from utils.images import get_output_format
+
+# `manage.py seed` options of the benchmark dataset
+SEED_OPTIONS = {'users': 200, 'tasks_per_user': 1, 'seed': 23, 'password': 'Benchmark-password-1'}
+NEW_PASSWORD = 'Benchmark-password-2'
+# Hashing the password dominates these requests, fewer runs are enough
+HASHING_REPEAT = 5
+
+# Password of the users created by the tests
+PASSWORD = 'Owner-password-1'
+
+
+def make_image(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 60)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class SignInTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', username='owner', password=PASSWORD)
+        cls.inactive = User.objects.create_user(email='inactive@example.com', username='inactive', password=PASSWORD,
+                                                is_active=False)
+
+    def setUp(self):
+        self.failures = []
+        user_login_failed.connect(self.login_failed)
+        self.addCleanup(user_login_failed.disconnect, self.login_failed)
+
+    def login_failed(self, sender, credentials, request, **kwargs):
+        self.failures.append(credentials)
+
+    def sign_in(self, email, password=PASSWORD):
+        return self.client.post(reverse('sign_in'), {'email': email, 'password': password}, format='json')
+
+    def test_signed_in(self):
+        with self.assertNumQueries(1):
+            response = self.sign_in(self.user.email)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['user_id'], str(self.user.pk))
+        self.assertEqual(self.failures, [])
+
+        # Through `authenticate()`, as the admin does
+        self.assertEqual(authenticate(None, username=self.user.email, password=PASSWORD), self.user)
+
+    def test_failed(self):
+        for email, password, field in (
+            (self.user.email, 'Wrong-password-1', 'password'),
+            ('nobody@example.com', PASSWORD, 'username'),
+            (self.inactive.email, PASSWORD, 'password'),
+        ):
+            with self.subTest(email=email):
+                self.failures.clear()
+                response = self.sign_in(email, password)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(list(response.data), [field])
+                self.assertEqual(self.failures, [{'email': email, 'password': '********************'}])
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_rehashed(self):
+        self.assertEqual(self.sign_in(self.user.email).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split('$')[1], '1000')
+        self.assertEqual(self.sign_in(self.user.email).status_code, 200)
+
+
+class UserCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', username='owner', password=PASSWORD,
+                                            first_name='Owner')
+
+    def setUp(self):
+        caches['default'].clear()
+        local_cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(self.user))
+
+    def get_profile(self, name='profile', queries=0):
+        with self.assertNumQueries(queries):
+            response = self.client.get(reverse(name))
+        return response
+
+    def test_cached(self):
+        for name in ('profile', 'async_profile'):
+            with self.subTest(name=name):
+                local_cache.clear()
+                self.assertEqual(self.get_profile(name, queries=1).status_code, 200)
+                self.assertEqual(self.get_profile(name).json()['first_name'], 'Owner')
+
+        # The password is loaded on access only
+        user = get_cached_user(self.user.pk)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertTrue(user.check_password(PASSWORD))
+
+    def test_password_not_cached(self):
+        User.objects.filter(pk=self.user.pk).update(avatar='user/avatars/avatar.jpg')
+        user = User.objects.get(pk=self.user.pk)
+        values = dump_user(user)
+        self.assertEqual(values['avatar'], 'user/avatars/avatar.jpg')
+        self.assertNotIn(user.password.encode(), pickle.dumps(values))
+
+        self.get_profile(queries=1)
+        cached = local_cache.get(user_cache_key(user.pk))
+        self.assertIsNotNone(cached)
+        self.assertNotIn(user.password.encode(), pickle.dumps(cached))
+        self.assertEqual(get_cached_user(user.pk).avatar.name, 'user/avatars/avatar.jpg')
+
+    @override_settings(USER_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.get_profile(queries=1)
+        self.get_profile(queries=1)
+        self.assertIsNone(get_cached_user(self.user.pk))
+
+    def test_invalidated_on_save(self):
+        self.get_profile(queries=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.user.pk).save()
+            # Until the commit the old row stays cached
+            self.assertIsNotNone(get_cached_user(self.user.pk))
+        self.assertIsNone(get_cached_user(self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.first_name = 'Renamed'
+            user.save(update_fields=['first_name'])
+        self.assertEqual(self.get_profile(queries=1).data['first_name'], 'Renamed')
+
+    def test_deactivated(self):
+        self.get_profile(queries=1)
+
+        # `update()` sends no signal, the cache is dropped by hand
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get_profile().status_code, 200)
+        invalidate_user(self.user.pk)
+        for name in ('profile', 'async_profile'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get_profile(name, queries=1).status_code, 401)
+
+    def test_deleted(self):
+        self.get_profile(queries=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.user.pk).delete()
+        self.assertIsNone(get_cached_user(self.user.pk))
+        self.assertEqual(self.get_profile(queries=1).status_code, 401)
+
+    def test_shared_cache(self):
+        directory = tempfile.mkdtemp(prefix='cache-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+        }}):
+            self.get_profile(queries=1)
+            # Another process: only the shared cache has the user
+            local_cache.clear()
+            self.get_profile()
+            self.get_profile('async_profile')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.get(pk=self.user.pk).save()
+            local_cache.clear()
+            self.get_profile(queries=1)
+
+
+class AvatarTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Read once on import, not from the settings
+        cls.avatar_cache_directory = avatar_cache.directory
+        cls.temporary_root = tempfile.mkdtemp(prefix='avatars-')
+        avatar_cache.directory = cls.temporary_root
+
+    @classmethod
+    def tearDownClass(cls):
+        avatar_cache.directory = cls.avatar_cache_directory
+        shutil.rmtree(cls.temporary_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', username='owner', password=PASSWORD)
+
+    def setUp(self):
+        local_cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content, name='avatar.jpg'):
+        response = self.client.put(reverse('upload_avatar'), {'avatar': SimpleUploadedFile(name, content)},
+                                   format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_variants(self):
+        self.assertEqual(self.client.get(reverse('profile')).data['avatar_variants'], {})
+
+        variants = self.upload(make_image())['avatar_variants']
+        self.assertEqual(sorted(variants), sorted(str(size) for size in get_sizes()))
+        self.client.logout()
+
+        response = self.client.get(variants['64'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], AVATAR_CONTENT_TYPES[get_output_format()[0]])
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (64, 64))
+
+        # Cached variant, served without the database
+        with self.assertNumQueries(0):
+            response = self.client.get(variants['64'])
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(variants['64'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_evicted(self):
+        url = self.upload(make_image())['avatar_variants']['64']
+        self.client.get(url).close()
+        cache_get = avatar_cache.get
+        lookups = []
+
+        def get(key):
+            # Removed by another process right after the view's lookup
+            path = cache_get(key)
+            if not lookups:
+                os.remove(path)
+            lookups.append(key)
+            return path
+
+        with mock.patch.object(avatar_cache, 'get', get):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (64, 64))
+        self.assertEqual(len(lookups), 2)
+        self.assertIsNotNone(avatar_cache.get(lookups[0]))
+
+    def test_replaced(self):
+        old = self.upload(make_image())['avatar_variants']['32']
+        new = self.upload(make_image((300, 400)))['avatar_variants']['32']
+        self.assertNotEqual(old, new)
+
+        response = self.client.get(old)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], 'http://testserver' + new)
+
+    def test_not_found(self):
+        self.upload(b'not an image', name='avatar.txt')
+        self.user.refresh_from_db()
+        key = get_avatar_key(self.user.avatar.name)
+
+        for user, size in ((self.user.pk, 64), (self.user.pk, 65), (uuid.uuid4(), 64)):
+            with self.subTest(user=user, size=size):
+                url = reverse('avatar', kwargs={'user': user, 'key': key, 'size': size})
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@tag('benchmark')
+class UserEndpointBenchmarkTests(EndpointBenchmarkMixin, APITestCase):
+    benchmark_label = 'user'
+    benchmark_baseline = os.path.join(os.path.dirname(__file__), 'benchmarks.json')
+    local_caches = (local_cache,)
+    temporary_directories = ('MEDIA_ROOT',)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Read once on import, not from the settings
+        cls.avatar_cache_directory = avatar_cache.directory
+        avatar_cache.directory = os.path.join(cls.temporary_root, 'avatars')
+
+    @classmethod
+    def tearDownClass(cls):
+        avatar_cache.directory = cls.avatar_cache_directory
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed', stdout=io.StringIO(), stderr=io.StringIO(), **SEED_OPTIONS)
+
+        cls.user = User.objects.order_by('id').first()
+        cls.user.avatar = SimpleUploadedFile('avatar.jpg', make_image())
+        cls.user.save()
+        cls.password_hash = cls.user.password
+        cls.token = str(AccessToken.for_user(cls.user))
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % self.token)
+
+    def test_sign_in(self):
+        url = reverse('sign_in')
+        self.client.credentials()
+        self.benchmark(
+            'sign_in',
+            lambda: self.client.post(url, {'email': self.user.email, 'password': SEED_OPTIONS['password']},
+                                     format='json'),
+            repeat=HASHING_REPEAT,
+        )
+        self.benchmark(
+            'sign_in.wrong_password',
+            lambda: self.client.post(url, {'email': self.user.email, 'password': NEW_PASSWORD}, format='json'),
+            status=401,
+            repeat=HASHING_REPEAT,
+        )
+        self.benchmark(
+            'sign_in.unknown_email',
+            lambda: self.client.post(url, {'email': 'nobody@example.com', 'password': NEW_PASSWORD}, format='json'),
+            status=401,
+        )
+
+    def test_sign_up(self):
+        emails = ('benchmark-%d@example.com' % number for number in range(1000))
+        self.client.credentials()
+        self.benchmark(
+            'sign_up',
+            lambda email: self.client.post(reverse('sign_up'), {
+                'email': email,
+                'first_name': 'Bench',
+                'last_name': 'Mark',
+                'password': NEW_PASSWORD,
+                'password1': NEW_PASSWORD,
+            }, format='json'),
+            prepare=lambda: next(emails),
+            status=201,
+            repeat=HASHING_REPEAT,
+        )
+
+    def test_refresh_token(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        self.client.credentials()
+        self.benchmark('refresh_token', lambda: self.client.post(reverse('refresh_token'), {'refresh': refresh},
+                                                                  format='json'))
+
+    def test_profile(self):
+        self.benchmark('profile', lambda: self.client.get(reverse('profile')))
+        self.benchmark('async.profile', lambda: self.client.get(reverse('async_profile')))
+
+    def test_change_password(self):
+        def reset_password():
+            User.objects.filter(pk=self.user.pk).update(password=self.password_hash)
+
+        self.benchmark(
+            'change_password',
+            lambda _: self.client.put(reverse('change_password'), {
+                'old_password': SEED_OPTIONS['password'],
+                'password': NEW_PASSWORD,
+                'password1': NEW_PASSWORD,
+            }, format='json'),
+            prepare=reset_password,
+            repeat=HASHING_REPEAT,
+        )
+
+    def test_avatar(self):
+        image = make_image()
+        self.benchmark(
+            'upload_avatar',
+            lambda: self.client.put(reverse('upload_avatar'), {'avatar': SimpleUploadedFile('avatar.jpg', image)},
+                                    format='multipart'),
+        )
+
+    def test_avatar_variant(self):
+        url = reverse('avatar', kwargs={'user': self.user.pk, 'key': get_avatar_key(self.user.avatar.name), 'size': 64})
+        self.client.credentials()
+        self.benchmark('avatar', lambda: self.client.get(url))
+        self.benchmark(
+            'avatar.render',
+            lambda _: self.client.get(url),
+            prepare=lambda: shutil.rmtree(avatar_cache.directory, ignore_errors=True),
+        )
@@ -1,13 +1,32 @@
 from rest_framework import generics, exceptions, status
 from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenViewBase
 from drf_yasg.utils import swagger_auto_schema
 
+from django.http import FileResponse, Http404, HttpResponseNotModified, HttpResponseRedirect
+from django.utils.http import quote_etag
 from django.utils.translation import gettext as _
 
 from apps.user.models import User
+from utils.async_views import AsyncAPIView
+from utils.conditional import conditional_get, make_etag
+from utils.downloads import AnyMediaTypeRenderer
+from utils.images import UnreadableImage, get_output_format
+
+from .authentication import AsyncJWTAuthentication
+from .avatars import (
+    CONTENT_TYPES as AVATAR_CONTENT_TYPES,
+    cache as avatar_cache,
+    get_sizes,
+    get_avatar_key,
+    get_variant_key,
+    get_variant,
+    get_avatar_url,
+)
 
 from .serializers import (
     LoginSerializer,
@@ -67,16 +86,37 @@ class ProfileAPIView(generics.RetrieveAPIView):
     def get_object(self) -> User:
         return self.request.user
 
+    def get_etag(self, request, *args, **kwargs):
+        # The user is already loaded by authentication, no query needed
+        user = request.user
+        return make_etag(user.pk, request.accepted_renderer.format, user.updated_at)
+
     @swagger_auto_schema(
         operation_summary='Retrieve profile data',
         responses={
             200: ProfileSerializer()
         }
     )
+    @conditional_get
     def get(self, *args, **kwargs):
         return super(ProfileAPIView, self).get(*args, **kwargs)
 
 
+class AsyncProfileAPIView(AsyncAPIView):
+    """
+    Async `GET /auth/me/` for ASGI servers, same ETag as `ProfileAPIView`.
+    """
+    authentication_classes = (AsyncJWTAuthentication,)
+
+    async def get(self, request, *args, **kwargs):
+        user = request.user
+        etag = make_etag(user.pk, 'json', user.updated_at)
+        not_modified = self.get_not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return self.render(ProfileSerializer(user, context=self.get_serializer_context()).data, etag=etag)
+
+
 class UpdateProfileAPIView(generics.UpdateAPIView):
     serializer_class = ProfileSerializer
     permission_classes = (IsAuthenticated,)
@@ -174,3 +214,51 @@ class UploadUserAvatar(generics.UpdateAPIView):
     @swagger_auto_schema(auto_schema=None)
     def patch(self, *args, **kwargs):
         raise exceptions.MethodNotAllowed('PATCH')
+
+
+class AvatarAPIView(APIView):
+    """
+    Square avatar variants. The URL holds the avatar's content key, so the
+    responses never change and are cached for good by browsers and CDNs;
+    `ProfileSerializer.avatar_variants` gives the current URLs.
+    """
+    # Public like the media files, cache hits don't touch the database
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    renderer_classes = (JSONRenderer, AnyMediaTypeRenderer)
+
+    @swagger_auto_schema(operation_summary='User avatar resized to one of the allowed sizes')
+    def get(self, request, user, key, size):
+        if size not in get_sizes():
+            raise Http404()
+
+        variant_key = get_variant_key(key, size)
+        etag = quote_etag(variant_key)
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return HttpResponseNotModified()
+
+        file = None
+        path = avatar_cache.get(variant_key)
+        if path is not None:
+            try:
+                file = open(path, 'rb')
+            except FileNotFoundError:
+                # Evicted by another process since the lookup, rendered again
+                pass
+        if file is None:
+            instance = User.objects.filter(pk=user).only('id', 'avatar').first()
+            if instance is None or not instance.avatar:
+                raise Http404()
+            if get_avatar_key(instance.avatar.name) != key:
+                # Replaced avatar, not cacheable
+                return HttpResponseRedirect(get_avatar_url(instance, size, request))
+            try:
+                path = get_variant(instance.avatar, key, size)
+            except UnreadableImage:
+                raise Http404()
+            file = open(path, 'rb')
+
+        response = FileResponse(file, content_type=AVATAR_CONTENT_TYPES[get_output_format()[0]])
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+
+async def aprefetch_related(instances, *names):
+    """
+    `prefetch_related()` of reverse foreign keys for the async ORM, which
+    can't combine it with `aiterator()` in Django 4.1. One query per name,
+    the results are cached on the instances like a regular prefetch.
+    """
+    if not instances:
+        return
+
+    by_pk = {instance.pk: instance for instance in instances}
+    opts = type(instances[0])._meta
+    for name in names:
+        relation = opts.get_field(name)
+        groups = defaultdict(list)
+        queryset = relation.related_model._default_manager.filter(**{'%s__in' % relation.field.name: list(by_pk)})
+        async for related in queryset.aiterator():
+            groups[getattr(related, relation.field.attname)].append(related)
+
+        for pk, instance in by_pk.items():
+            queryset = getattr(instance, name).get_queryset()
+            queryset._result_cache = groups[pk]
+            queryset._prefetch_done = True
+            instance.__dict__.setdefault('_prefetched_objects_cache', {})[name] = queryset
+
+
+class AsyncAPIView(View):
+    """
+    Base of the JSON views served natively by the ASGI entry point
+    (`ToDoLessons.asgi`). DRF views are sync, so under an ASGI server every
+    request waits for a thread; here authentication (`aauthenticate()`) and
+    handlers use the async ORM and a worker keeps serving other requests
+    while clients are slow.
+
+    Handlers get a DRF `Request` (JSON bodies only), DRF exceptions are
+    turned into the same responses as in the sync views.
+    """
+    authentication_classes = ()
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (JSONParser,)
+    renderer_class = JSONRenderer
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Authenticated by tokens, not cookies
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        self.request = request
+        try:
+            await self.authenticate(request)
+            self.check_permissions(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(request, exc)
+
+    async def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            authenticator = authentication_class()
+            result = await authenticator.aauthenticate(request)
+            if result is not None:
+                request.user, request.auth = result
+                request._authenticator = authenticator
+                return
+        request._not_authenticated()
+
+    def check_permissions(self, request):
+        for permission_class in self.permission_classes:
+            if not permission_class().has_permission(request, self):
+                if self.authentication_classes and request.successful_authenticator is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+
+    def handle_exception(self, request, exc):
+        response = exception_handler(exc, {'view': self, 'request': request})
+        if response is None:
+            raise exc
+
+        rendered = self.render(response.data, response.status_code)
+        # e.g. `Retry-After` of throttled requests
+        for header, value in response.items():
+            if header != 'Content-Type':
+                rendered[header] = value
+        if response.status_code == status.HTTP_401_UNAUTHORIZED and self.authentication_classes:
+            rendered['WWW-Authenticate'] = self.authentication_classes[0]().authenticate_header(request)
+        return rendered
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self, 'user': self.request.user}
+
+    def get_not_modified(self, request, etag):
+        """
+        `304 Not Modified` when `If-None-Match` matches `etag`, see `utils.conditional`.
+        """
+        response = get_conditional_response(request, etag=quote_etag(etag))
+        if response is not None:
+            response['ETag'] = quote_etag(etag)
+        return response
+
+    def render(self, data, status_code=status.HTTP_200_OK, etag=None):
+        response = HttpResponse(
+            self.renderer_class().render(data),
+            status=status_code,
+            content_type=self.renderer_class.media_type,
+        )
+        if etag is not None:
+            response['ETag'] = quote_etag(etag)
+            # Responses are per user, shared caches must tell them apart
+            patch_vary_headers(response, ('Authorization',))
+        return response
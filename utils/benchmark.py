@@ -0,0 +1,221 @@
+import gc
+import json
+import math
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+
+from utils.queries import QueryCounter
+
+# Smaller differences are noise (scheduling, GC), whatever the tolerances;
+# regressions below them still show up in the query counts
+MIN_LATENCY_DELTA_MS = 20
+MIN_MEMORY_DELTA_KB = 256
+
+
+def percentile(values, share):
+    # Nearest rank
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * share) - 1, 0)]
+
+
+def consume(response):
+    # Streamed bodies (exports, downloads) are only produced while being read
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response
+
+
+def read_results(path):
+    try:
+        with open(path) as file:
+            return json.load(file)['results']
+    except FileNotFoundError:
+        return {}
+
+
+def write_results(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'repeat': getattr(settings, 'BENCHMARK_REPEAT', 20),
+            },
+            'results': dict(sorted(results.items())),
+        }, file, indent=2)
+        file.write('\n')
+
+
+class EndpointBenchmarkMixin:
+    """
+    Benchmarks for `APITestCase`s. `self.benchmark(name, request)` calls
+    `request()` (one request made with `self.client`) `BENCHMARK_REPEAT` times
+    and records latency percentiles, the number of SQL queries and the peak
+    of memory allocated by Python while handling it. Every run starts with
+    empty caches, so query counts don't depend on the order of the tests.
+
+    Results are written to `BENCHMARK_OUTPUT_DIR/<benchmark_label>.json` and
+    compared with `benchmark_baseline` (same format): a case fails with more
+    queries than its baseline. With `BENCHMARK_CHECK_TIMINGS` (off by default,
+    they depend on the machine) it also fails with p95 latency or peak memory
+    above it by more than `BENCHMARK_LATENCY_TOLERANCE`/`BENCHMARK_MEMORY_TOLERANCE`.
+    With `BENCHMARK_UPDATE_BASELINE` the baseline is rewritten instead.
+    """
+    benchmark_label = ''
+    benchmark_baseline = ''
+    # In-process caches cleared with Django's before every run
+    local_caches = ()
+    # Settings pointed to a temporary directory while the test case runs
+    temporary_directories = ()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temporary_root = tempfile.mkdtemp(prefix='benchmark-')
+        cls.settings_override = override_settings(
+            # Slow runs would add the queries recording them
+            SLOW_REQUEST_THRESHOLD_MS=0,
+            **{name: os.path.join(cls.temporary_root, name.lower()) for name in cls.temporary_directories},
+        )
+        cls.settings_override.enable()
+        cls.benchmark_results = {}
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.settings_override.disable()
+            shutil.rmtree(cls.temporary_root, ignore_errors=True)
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.settings_override.disable()
+            shutil.rmtree(cls.temporary_root, ignore_errors=True)
+            cls.save_benchmark_results()
+
+    @classmethod
+    def save_benchmark_results(cls):
+        if not cls.benchmark_results:
+            return
+        output_dir = getattr(settings, 'BENCHMARK_OUTPUT_DIR', os.path.join(settings.BASE_DIR, 'benchmarks'))
+        write_results(os.path.join(output_dir, '%s.json' % cls.benchmark_label), cls.benchmark_results)
+        if getattr(settings, 'BENCHMARK_UPDATE_BASELINE', False):
+            # Merged, running a part of the suite only updates its cases
+            baseline = read_results(cls.benchmark_baseline)
+            baseline.update(cls.benchmark_results)
+            write_results(cls.benchmark_baseline, baseline)
+
+    def reset_caches(self):
+        for cache in caches.all():
+            cache.clear()
+        for cache in self.local_caches:
+            cache.clear()
+
+    def run_request(self, request, prepare, status):
+        argument = prepare() if prepare is not None else None
+        self.reset_caches()
+
+        # Like `timeit`, collections due to earlier runs would land on random requests
+        gc.disable()
+        counter = QueryCounter()
+        try:
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = consume(request() if prepare is None else request(argument))
+                elapsed = time.perf_counter() - started
+        finally:
+            gc.enable()
+        self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+        return elapsed * 1000, counter.count
+
+    def benchmark(self, name, request, prepare=None, status=200, repeat=None):
+        """
+        `prepare()`, when given, is called (untimed) before every run and its
+        result passed to `request()`, e.g. a new object for each DELETE.
+        `status` is the expected response status.
+        """
+        repeat = repeat or getattr(settings, 'BENCHMARK_REPEAT', 20)
+
+        # Imports, URL resolvers and other one-off work
+        self.run_request(request, prepare, status)
+
+        # Long-lived objects (modules, the seeded test data) are left out of the
+        # collections between the runs, which would take longer than most requests
+        gc.collect()
+        gc.freeze()
+        timings, queries = [], 0
+        try:
+            for _ in range(repeat):
+                elapsed, count = self.run_request(request, prepare, status)
+                timings.append(elapsed)
+                queries = max(queries, count)
+        finally:
+            gc.unfreeze()
+
+        # Separate run, tracing slows everything down
+        tracemalloc.start()
+        try:
+            self.run_request(request, prepare, status)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            'runs': repeat,
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / repeat, 3),
+            'queries': queries,
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+        self.benchmark_results[name] = result
+        self.check_regressions(name, result)
+        return result
+
+    def check_regressions(self, name, result):
+        if getattr(settings, 'BENCHMARK_UPDATE_BASELINE', False):
+            return
+        expected = read_results(self.benchmark_baseline).get(name)
+        if expected is None:
+            return
+
+        failures = []
+        if result['queries'] > expected['queries']:
+            failures.append('%d queries (baseline %d)' % (result['queries'], expected['queries']))
+        if getattr(settings, 'BENCHMARK_CHECK_TIMINGS', False):
+            failures.extend(self.check_timings(result, expected))
+
+        if failures:
+            self.fail('%s regressed: %s' % (name, ', '.join(failures)))
+
+    def check_timings(self, result, expected):
+        failures = []
+        tolerance = getattr(settings, 'BENCHMARK_LATENCY_TOLERANCE', 1.0)
+        if (result['p95_ms'] > expected['p95_ms'] * (1 + tolerance)
+                and result['p95_ms'] - expected['p95_ms'] > MIN_LATENCY_DELTA_MS):
+            failures.append('p95 %.1fms (baseline %.1fms)' % (result['p95_ms'], expected['p95_ms']))
+
+        tolerance = getattr(settings, 'BENCHMARK_MEMORY_TOLERANCE', 0.5)
+        if (result['peak_memory_kb'] > expected['peak_memory_kb'] * (1 + tolerance)
+                and result['peak_memory_kb'] - expected['peak_memory_kb'] > MIN_MEMORY_DELTA_KB):
+            failures.append('peak memory %.0fKB (baseline %.0fKB)' % (
+                result['peak_memory_kb'],
+                expected['peak_memory_kb'],
+            ))
+        return failures
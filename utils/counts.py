@@ -0,0 +1,52 @@
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def normalize_params(params) -> str:
+    """
+    Stable representation of (cleaned) filter values, used as a cache key part.
+    """
+    normalized = {}
+    for key, value in params.items():
+        if value is None or value == '':
+            continue
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+class CountCache:
+    """
+    TTL-bounded cache of `COUNT(*)` results, keyed by user and filter values.
+
+    Counts served from the cache may be slightly stale, so they are reported as
+    approximate; freshly computed ones are exact.
+    """
+
+    def __init__(self, namespace, timeout=None):
+        self.namespace = namespace
+        self.timeout = timeout
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, 'COUNT_CACHE_TIMEOUT', 60)
+
+    def make_key(self, user_id, params):
+        digest = hashlib.md5(normalize_params(params).encode('utf-8')).hexdigest()
+        return '%s:%s:%s' % (self.namespace, user_id, digest)
+
+    def get_or_compute(self, user_id, params, compute):
+        key = self.make_key(user_id, params)
+        count = cache.get(key)
+        if count is not None:
+            return count, False
+
+        count = compute()
+        cache.set(key, count, self.get_timeout())
+        return count, True
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import time
+
+
+class DiskLRUCache:
+    """
+    Files in `directory` bounded to about `max_bytes`, the least recently
+    used going first. Recency is the file's mtime, bumped on reads at most
+    every `touch_interval` seconds to spare the disk a write per hit.
+
+    The size is tracked per process and checked against the directory once
+    it may exceed the limit, so with several processes the cache can go over
+    it by what the others wrote meanwhile.
+    """
+
+    def __init__(self, directory, max_bytes, touch_interval=60 * 60, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.low_water = low_water
+        self.lock = threading.Lock()
+        self.size = None
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        Path of the cached file, or None.
+        """
+        path = self.get_path(key)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
+        if time.time() - mtime > self.touch_interval:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+        return path
+
+    def set(self, key, content):
+        """
+        Stores `content` (bytes) atomically and returns its path.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix='.', delete=False) as temp:
+            temp.write(content)
+        path = self.get_path(key)
+        os.replace(temp.name, path)
+
+        with self.lock:
+            if self.size is None:
+                self.size = self.scan()[1]
+            else:
+                self.size += len(content)
+            if self.size > self.max_bytes:
+                self.evict()
+        return path
+
+    def scan(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        # Down to the low water mark, so the next few writes don't scan again
+        entries, total = self.scan()
+        target = self.max_bytes * self.low_water
+        for mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
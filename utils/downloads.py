@@ -0,0 +1,159 @@
+import re
+from urllib.parse import quote
+
+from rest_framework.renderers import JSONRenderer
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+OFFLOAD_NGINX = 'nginx'
+OFFLOAD_APACHE = 'apache'
+
+
+class AnyMediaTypeRenderer(JSONRenderer):
+    # Lets clients accepting only the file's type (e.g. `Accept: image/*`) download it
+    media_type = '*/*'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileSlice:
+    """
+    Reads at most `length` bytes of `file` from its current position. Has no
+    `fileno`, so it is streamed by Django rather than by `wsgi.file_wrapper`.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Returns the inclusive `(start, end)` of a single byte range, or None when
+    the whole file should be sent (no header, a malformed one or several
+    ranges, which may be ignored per RFC 9110).
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        # Suffix range, the last `end` bytes
+        length = int(end)
+        if not length:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        # Only strong comparison is allowed
+        return value == etag
+    modified_since = parse_http_date_safe(value)
+    return modified_since is not None and last_modified is not None and int(last_modified) <= modified_since
+
+
+def get_offload_response(field_file, mode):
+    response = HttpResponse()
+    # Content-Type and the transfer itself are left to the web server
+    del response['Content-Type']
+    if mode == OFFLOAD_NGINX:
+        prefix = getattr(settings, 'DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name)
+    else:
+        response['X-Sendfile'] = field_file.path
+    return response
+
+
+def serve_file(request, field_file, etag=None, last_modified=None, as_attachment=True):
+    """
+    Sends `field_file` answering conditional (`If-None-Match`,
+    `If-Modified-Since`, ...) and single `Range` requests.
+
+    With `DOWNLOAD_OFFLOAD` set to `nginx` (`X-Accel-Redirect` to an
+    `internal` location aliasing MEDIA_ROOT under `DOWNLOAD_ACCEL_PREFIX`) or
+    `apache` (`X-Sendfile`), the app only authorizes the request and the web
+    server sends the file, ranges included. Otherwise the file is streamed
+    with `FileResponse`, which uses `wsgi.file_wrapper` (sendfile) when the
+    server provides one, except for ranges bounded on both ends.
+    """
+    etag = quote_etag(etag) if etag else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    mode = getattr(settings, 'DOWNLOAD_OFFLOAD', '')
+    if mode in (OFFLOAD_NGINX, OFFLOAD_APACHE):
+        response = get_offload_response(field_file, mode)
+        response['Content-Disposition'] = '%s; filename="%s"' % (
+            'attachment' if as_attachment else 'inline',
+            field_file.name.rsplit('/', 1)[-1],
+        )
+    else:
+        response = stream_file(request, field_file, etag, last_modified, as_attachment)
+
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def stream_file(request, field_file, etag, last_modified, as_attachment):
+    size = field_file.size
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+
+    file = field_file.open('rb')
+    filename = field_file.name.rsplit('/', 1)[-1]
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        if end == size - 1:
+            # Open ended, the positioned file can still go through sendfile
+            response = FileResponse(file, as_attachment=as_attachment, filename=filename, status=206)
+        else:
+            response = FileResponse(FileSlice(file, end - start + 1), as_attachment=as_attachment,
+                                    filename=filename, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,51 @@
+import io
+
+from PIL import Image, ImageOps, features
+
+
+class UnreadableImage(Exception):
+    pass
+
+
+def get_output_format():
+    # WebP needs Pillow built with libwebp, JPEG is always available
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def open_image(file, max_size):
+    """
+    Decodes `file` once, applying its EXIF orientation. JPEGs are decoded at
+    the smallest scale still larger than `max_size`, which is much cheaper
+    for large photos.
+    """
+    try:
+        image = Image.open(file)
+        image.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise UnreadableImage(str(exc))
+    return image
+
+
+def resize(image, size, image_format, quality=80, crop=False):
+    """
+    Encoded copy of `image` fitting in a `size` square (never upscaled), or
+    filling it with a centered crop when `crop` is set.
+    """
+    if crop:
+        rendition = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    else:
+        rendition = image.copy()
+        rendition.thumbnail((size, size), Image.LANCZOS)
+
+    if image_format == 'JPEG' and rendition.mode not in ('RGB', 'L'):
+        rendition = rendition.convert('RGB')
+    elif rendition.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        rendition = rendition.convert('RGBA')
+
+    output = io.BytesIO()
+    rendition.save(output, image_format, quality=quality)
+    return output.getvalue()
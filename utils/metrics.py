@@ -0,0 +1,150 @@
+import bisect
+import math
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Anything else is reported as `other`, label values must stay few
+METHODS = ('DELETE', 'GET', 'HEAD', 'OPTIONS', 'PATCH', 'POST', 'PUT')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def is_enabled():
+    # Never public in production: without METRICS_TOKEN only served with DEBUG
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return False
+    return bool(getattr(settings, 'METRICS_TOKEN', '')) or settings.DEBUG
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values):
+    return ','.join('%s="%s"' % (name, escape(value)) for name, value in zip(names, values))
+
+
+def format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labels=('route', 'method')):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.labels = labels
+        # label values: [observations per bucket (not cumulative), sum]
+        self.series = {}
+
+    def observe(self, values, value):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * len(self.buckets), 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        for values, (counts, total) in sorted(self.series.items()):
+            labels = format_labels(self.labels, values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, labels, format_bound(bound), cumulative))
+            lines.append('%s_sum{%s} %s' % (self.name, labels, repr(float(total))))
+            lines.append('%s_count{%s} %d' % (self.name, labels, cumulative))
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, values):
+        self.series[values] = self.series.get(values, 0) + 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s counter' % self.name]
+        for values, count in sorted(self.series.items()):
+            lines.append('%s{%s} %d' % (self.name, format_labels(self.labels, values), count))
+        return lines
+
+
+class Registry:
+    """
+    Per-route request metrics of this process, filled by
+    `utils.timing.ServerTimingMiddleware`. Every worker process keeps its own,
+    so behind a multi-process server each scrape sees one worker only; scrape
+    the workers separately (e.g. one gunicorn per port) for complete numbers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter('http_requests_total', 'Responses sent', ('route', 'method', 'status'))
+            self.histograms = {
+                'total': Histogram('http_request_duration_seconds', 'Time spent handling requests',
+                                   DURATION_BUCKETS),
+                'db': Histogram('http_request_db_duration_seconds', 'Time spent in SQL per request',
+                                DURATION_BUCKETS),
+                'auth': Histogram('http_request_auth_duration_seconds', 'Time spent authenticating requests',
+                                  DURATION_BUCKETS),
+                'serializer': Histogram('http_request_serializer_duration_seconds',
+                                        'Time spent validating and serializing per request', DURATION_BUCKETS),
+            }
+            self.queries = Histogram('http_request_db_queries', 'SQL statements per request', QUERY_BUCKETS)
+
+    def observe(self, route, method, status, timings):
+        method = method if method in METHODS else 'other'
+        with self.lock:
+            self.requests.inc((route, method, str(status)))
+            self.queries.observe((route, method), timings.counts.get('db', 0))
+            for name, histogram in self.histograms.items():
+                # Phases which didn't happen (e.g. no authentication) aren't observed
+                if name in timings.durations:
+                    histogram.observe((route, method), timings.durations[name])
+
+    def render(self):
+        with self.lock:
+            lines = self.requests.render()
+            for histogram in list(self.histograms.values()) + [self.queries]:
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def observe_request(route, method, status, timings):
+    registry.observe(route, method, status, timings)
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of `registry`. Requires `Authorization: Bearer
+    <METRICS_TOKEN>` when the token is set, a 404 without it unless DEBUG.
+    """
+    if not is_enabled():
+        raise Http404()
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer %s' % token):
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -1,19 +1,91 @@
+import base64
+import json
+import uuid
 from collections import OrderedDict
+from functools import partial
 
 from drf_yasg import openapi
 from drf_yasg.inspectors import PaginatorInspector
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """
+    Paginator which asks `count_resolver(compute)` for the number of objects
+    instead of always running `COUNT(*)`. The resolver returns `(count, exact)`.
+    """
+
+    def __init__(self, *args, count_resolver=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_resolver = count_resolver
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        compute = partial(DjangoPaginator.count.func, self)
+        if self.count_resolver is None:
+            return compute()
+
+        count, self.count_exact = self.count_resolver(compute)
+        return count
 
 
 class ResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'size'
     max_page_size = 100
+    django_paginator_class = CachedCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Views may provide cached counts with `resolve_count(request, compute)`
+        resolve_count = getattr(view, 'resolve_count', None)
+        if resolve_count is not None:
+            self.django_paginator_class = partial(
+                CachedCountPaginator,
+                count_resolver=partial(resolve_count, request),
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None, count=None, count_exact=True):
+        """
+        `paginate_queryset()` for async views, the count (unless already known)
+        and the page are fetched with the async ORM.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        if count is None:
+            count = await queryset.acount()
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Set upfront, the paginator must not run a sync COUNT(*)
+        paginator.count = count
+        paginator.count_exact = count_exact
+
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        self.request = request
+        return [instance async for instance in self.page.object_list.aiterator()]
 
     def get_paginated_response(self, data):
         return Response({
             'count': self.page.paginator.count,
+            'count_exact': getattr(self.page.paginator, 'count_exact', True),
             'results': data
         })
 
@@ -25,6 +97,178 @@ class ResultsSetPagination(PageNumberPagination):
                     'type': 'integer',
                     'example': 123,
                 },
+                'count_exact': {
+                    'type': 'boolean',
+                },
+                'results': schema,
+            },
+        }
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination on `(<sort field>, id)`.
+
+    Pages are fetched with a `WHERE (field, id) < (value, id)` condition instead
+    of `OFFSET`, and no `COUNT(*)` is made, so every page costs the same
+    no matter how deep the client scrolls. The sort field follows the `sort`
+    query parameter used by the filtersets (`created_at`/`updated_at` or the
+    view's `OrderingFilter` names, with an optional `-` prefix). Rows without
+    a value in the sort field can't be placed in that order and are left out.
+    """
+    page_size = 20
+    page_size_query_param = 'size'
+    max_page_size = 100
+
+    mode_query_param = 'pagination'
+    mode = 'cursor'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'sort'
+    ordering_fields = ('created_at', 'updated_at')
+    default_ordering = '-created_at'
+    tiebreaker_field = 'id'
+
+    invalid_cursor_message = _('Invalid cursor')
+
+    @classmethod
+    def is_requested(cls, request):
+        if request is None:
+            return False
+        params = request.query_params
+        return params.get(cls.mode_query_param) == cls.mode or cls.cursor_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page([instance async for instance in queryset.aiterator()])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        The requested page plus one row, which tells whether there is more.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, view)
+        self.field = self.ordering.lstrip('-')
+
+        self.cursor = cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        descending = self.ordering.startswith('-') != reverse
+
+        prefix = '-' if descending else ''
+        queryset = queryset.filter(**{'%s__isnull' % self.field: False})
+        queryset = queryset.order_by(prefix + self.field, prefix + self.tiebreaker_field)
+
+        if cursor is not None:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{'%s__%s' % (self.field, lookup): cursor['value']}) |
+                Q(**{
+                    self.field: cursor['value'],
+                    '%s__%s' % (self.tiebreaker_field, lookup): cursor['id'],
+                })
+            )
+
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.cursor and self.cursor['reverse']:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, view=None):
+        ordering = request.query_params.get(self.ordering_query_param, '').split(',')[0].strip()
+        descending = ordering.startswith('-')
+        field = ordering.lstrip('-')
+
+        # Translate the filterset's `OrderingFilter` param names into model fields
+        filterset_class = getattr(view, 'filterset_class', None)
+        ordering_filter = filterset_class.base_filters.get(self.ordering_query_param) if filterset_class else None
+        field = getattr(ordering_filter, 'param_map', {}).get(field, field)
+
+        if field in self.ordering_fields:
+            return '-' + field if descending else field
+        return self.default_ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            value = parse_datetime(data['v'])
+            if value is None or timezone.is_naive(value):
+                raise ValueError
+            # Primary keys are UUIDs, anything else would fail while the page is fetched
+            return {'value': value, 'id': uuid.UUID(data['id']), 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, AttributeError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        data = {
+            'v': getattr(instance, self.field).isoformat(),
+            'id': str(getattr(instance, self.tiebreaker_field)),
+        }
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        url = remove_query_param(self.base_url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'previous': {
+                    'type': 'string',
+                    'nullable': True,
+                },
                 'results': schema,
             },
         }
@@ -43,6 +287,7 @@ class LimitOffsetPaginatorInspectorClass(PaginatorInspector):
             type=openapi.TYPE_OBJECT,
             properties=OrderedDict((
                 ('count', openapi.Schema(type=openapi.TYPE_INTEGER)),
+                ('count_exact', openapi.Schema(type=openapi.TYPE_BOOLEAN)),
                 ('results', response_schema),
             )),
             required=['results']
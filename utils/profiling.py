@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Innermost frames kept per sample
+MAX_DEPTH = 64
+
+
+def format_frame(frame):
+    return '%s:%s:%d' % (frame.f_globals.get('__name__', '?'), frame.f_code.co_name, frame.f_lineno)
+
+
+def collapse(frame):
+    """
+    `module:function:line` of the frames of a stack, outermost first and joined
+    with `;` (the collapsed format of flame graph tools).
+    """
+    frames = []
+    while frame is not None and len(frames) < MAX_DEPTH:
+        frames.append(format_frame(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+class Profile:
+    """
+    Stacks sampled from one thread, from `start_at` (a `time.perf_counter()`
+    value) until removed from the sampler.
+    """
+
+    def __init__(self, ident, start_at):
+        self.ident = ident
+        self.start_at = start_at
+        self.stacks = Counter()
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def get_stacks(self, limit=None):
+        return [{'stack': stack, 'samples': count} for stack, count in self.stacks.most_common(limit)]
+
+
+class StackSampler:
+    """
+    Daemon thread sampling the stacks of the threads added with `add()` every
+    `interval` seconds. Nothing is sampled before a profile's `start_at`, and
+    the thread sleeps until the earliest one, so profiles removed before their
+    start cost a dict insert and delete. Profiles must be added in `start_at`
+    order (e.g. request start + a fixed threshold). Started lazily in every
+    process.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.profiles = {}
+        self.pid = None
+
+    def ensure_started(self):
+        # Threads don't survive fork, pre-forking servers import before it
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.profiles = {}
+                threading.Thread(target=self.run, name='stack-sampler', daemon=True).start()
+                self.pid = os.getpid()
+
+    def add(self, ident, start_at):
+        self.ensure_started()
+        profile = Profile(ident, start_at)
+        with self.lock:
+            idle = not self.profiles
+            self.profiles[ident] = profile
+        # Otherwise the thread wakes up for an earlier profile already
+        if idle:
+            self.wakeup.set()
+        return profile
+
+    def remove(self, profile):
+        with self.lock:
+            if self.profiles.get(profile.ident) is profile:
+                del self.profiles[profile.ident]
+
+    def get_timeout(self, now):
+        with self.lock:
+            if not self.profiles:
+                return None
+            start_at = min(profile.start_at for profile in self.profiles.values())
+        return max(start_at - now, self.interval)
+
+    def sample(self, now):
+        with self.lock:
+            due = [profile for profile in self.profiles.values() if profile.start_at <= now]
+        if not due:
+            return
+        frames = sys._current_frames()
+        for profile in due:
+            frame = frames.get(profile.ident)
+            if frame is not None:
+                profile.stacks[collapse(frame)] += 1
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.get_timeout(time.perf_counter()))
+            self.wakeup.clear()
+            self.sample(time.perf_counter())
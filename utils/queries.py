@@ -0,0 +1,62 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """
+    Callable for `connection.execute_wrapper` which counts executed statements.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """
+    Counts SQL statements executed while dispatching a request and compares them
+    with the budget declared for the current action (or HTTP method), e.g.
+
+        query_budget = {'list': 5, 'retrieve': 4}
+
+    Exceeding the budget is logged, or raises `QueryBudgetExceeded` when
+    `settings.QUERY_BUDGET_STRICT` is enabled (useful for the test suite).
+    """
+    query_budget = {}
+
+    def get_query_budget(self):
+        action = getattr(self, 'action', None) or self.request.method.lower()
+        return self.query_budget.get(action)
+
+    def dispatch(self, request, *args, **kwargs):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = super().dispatch(request, *args, **kwargs)
+        self.check_query_budget(counter.count)
+        return response
+
+    def check_query_budget(self, count):
+        budget = self.get_query_budget()
+        if budget is None or count <= budget:
+            return
+
+        message = '%s.%s executed %d queries (budget is %d)' % (
+            self.__class__.__name__,
+            getattr(self, 'action', None) or self.request.method.lower(),
+            count,
+            budget,
+        )
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
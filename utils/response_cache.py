@@ -0,0 +1,143 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from utils.conditional import normalized_query
+
+# Headers restored on cache hits
+CACHED_HEADERS = ('ETag', 'Vary', 'Allow')
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 0)
+
+
+def is_shared(cache=None):
+    """
+    Whether every worker sees the same versions (or the same values of
+    `cache`). A per process cache (the locmem default) doesn't see the
+    versions bumped by other workers.
+    """
+    return not isinstance(get_cache() if cache is None else cache, (LocMemCache, DummyCache))
+
+
+def version_key(owner_id):
+    return 'response-version:%s' % owner_id
+
+
+def initial_version():
+    # Must be above any version used before the counter was evicted,
+    # otherwise stale entries could be served again
+    return int(time.time() * 1000)
+
+
+def get_version(owner_id):
+    cache = get_cache()
+    version = cache.get(version_key(owner_id))
+    if version is None:
+        version = initial_version()
+        if not cache.add(version_key(owner_id), version, None):
+            version = cache.get(version_key(owner_id), version)
+    return version
+
+
+async def aget_version(owner_id):
+    cache = get_cache()
+    version = await cache.aget(version_key(owner_id))
+    if version is None:
+        version = initial_version()
+        if not await cache.aadd(version_key(owner_id), version, None):
+            version = await cache.aget(version_key(owner_id), version)
+    return version
+
+
+def _bump_version(owner_id):
+    cache = get_cache()
+    try:
+        cache.incr(version_key(owner_id))
+    except ValueError:
+        cache.set(version_key(owner_id), initial_version(), None)
+
+
+def bump_version(owner_id):
+    """
+    Invalidates every cached response of `owner_id` in O(1): entries are keyed by
+    the version, old ones are never read again and expire (or get evicted).
+    Also maintained without the response cache when it's shared, versions then
+    serve as list ETags. Bumped once the transaction commits, a request reading
+    the old rows in between would keep them under the new version.
+    """
+    if not get_timeout() and not is_shared():
+        return
+    transaction.on_commit(lambda: _bump_version(owner_id))
+
+
+def cache_response(method):
+    """
+    Caches rendered GET responses of a view handler in Django's cache, keyed by
+    the owner's version, the requesting user, path, renderer and normalized
+    query params. Views may define `get_cache_owner_id(request, *args, **kwargs)`
+    (the requesting user by default). Disabled unless `RESPONSE_CACHE_TIMEOUT`
+    is set.
+
+    Cache hits are answered with `304 Not Modified` when the stored ETag
+    matches `If-None-Match`.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        timeout = get_timeout()
+        if not timeout or request.method != 'GET':
+            return method(self, request, *args, **kwargs)
+
+        get_owner_id = getattr(self, 'get_cache_owner_id', None)
+        owner_id = get_owner_id(request, *args, **kwargs) if get_owner_id else request.user.id
+        digest = hashlib.md5('|'.join((
+            str(request.user.id),
+            request.path,
+            request.accepted_renderer.format,
+            normalized_query(request),
+        )).encode('utf-8')).hexdigest()
+        key = 'response:%s:%s:%s' % (owner_id, get_version(owner_id), digest)
+
+        cache = get_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            headers = cached['headers']
+            if 'ETag' in headers:
+                not_modified = get_conditional_response(request, etag=headers['ETag'])
+                if not_modified is not None:
+                    not_modified['ETag'] = headers['ETag']
+                    return not_modified
+
+            response = HttpResponse(cached['content'], content_type=cached['content_type'])
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        response = method(self, request, *args, **kwargs)
+        if response.status_code != 200 or getattr(response, 'streaming', False):
+            return response
+
+        response = self.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        cache.set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'headers': {header: response[header] for header in CACHED_HEADERS if response.has_header(header)},
+        }, timeout)
+        return response
+
+    return wrapper
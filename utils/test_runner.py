@@ -0,0 +1,31 @@
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+# Settings pointed to a temporary directory while the tests run
+TEMPORARY_DIRECTORIES = ('MEDIA_ROOT', 'TASK_UPLOAD_DIR', 'AVATAR_CACHE_DIR')
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Django's runner with `QUERY_BUDGET_STRICT` enabled, so views exceeding
+    their `query_budget` (see `utils.queries.QueryBudgetMixin`) fail the tests.
+    Uploaded and generated files go to a temporary directory.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.temporary_root = tempfile.mkdtemp(prefix='tests-')
+        self.test_settings = override_settings(
+            QUERY_BUDGET_STRICT=True,
+            **{name: os.path.join(self.temporary_root, name.lower()) for name in TEMPORARY_DIRECTORIES},
+        )
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        shutil.rmtree(self.temporary_root, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
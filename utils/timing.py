@@ -0,0 +1,181 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from utils import metrics
+
+# Timings of the request being handled, set by `ServerTimingMiddleware`
+current_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Durations (seconds) and counts per phase of one request: `db` (every SQL
+    statement), `auth`, `serializer` and `total`.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        # Reported even without queries
+        self.durations['db'] = 0.0
+        # Phases being timed, nested timers of the same phase are ignored
+        self.active = set()
+        # (sql, params, many, seconds, database alias) of every statement while a
+        # list, set by `apps.monitoring.middleware.SlowRequestMiddleware`
+        self.statements = None
+
+    def add(self, name, duration, count=1):
+        self.durations[name] += duration
+        self.counts[name] += count
+
+    def get_header(self):
+        """
+        `Server-Timing` value, durations in milliseconds.
+        """
+        entries = []
+        for name, duration in self.durations.items():
+            entry = '%s;dur=%.1f' % (name, duration * 1000)
+            if name == 'db':
+                entry += ';desc="SQL queries: %d"' % self.counts[name]
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        timings.add('db', duration)
+        if timings.statements is not None:
+            timings.statements.append((sql, params, many, duration, context['connection'].alias))
+
+
+def install_execute_wrapper(connection, **kwargs):
+    """
+    Adds `execute_wrapper` to the connection for good, it only measures during
+    requests. A `with connection.execute_wrapper()` block per request would
+    miss the async ORM, whose queries run on other threads' connections.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+connection_created.connect(install_execute_wrapper, dispatch_uid='utils.timing.install_execute_wrapper')
+
+
+@contextmanager
+def timer(name):
+    """
+    Adds the time spent in the block to phase `name` of the current request.
+    Does nothing outside of a request, or within a block timing `name` already
+    (e.g. nested serializers).
+    """
+    timings = current_timings.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.add(name, time.perf_counter() - started)
+
+
+class TimedSerializerMixin:
+    """
+    Reports validation and representation as the `serializer` phase.
+    """
+
+    def run_validation(self, *args, **kwargs):
+        with timer('serializer'):
+            return super().run_validation(*args, **kwargs)
+
+    def to_representation(self, *args, **kwargs):
+        with timer('serializer'):
+            return super().to_representation(*args, **kwargs)
+
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else ''
+
+
+def is_header_enabled():
+    # Tells the database time to anyone, so DEBUG only by default
+    return getattr(settings, 'SERVER_TIMING_HEADER', settings.DEBUG)
+
+
+class ServerTimingMiddleware:
+    """
+    Measures every request (SQL through `execute_wrapper`, the phases
+    reported with `timer()`) and sends the result in a `Server-Timing`
+    header (`SERVER_TIMING_HEADER`) and to the per-route histograms served at
+    `/metrics` (`METRICS_ENABLED`, see `utils.metrics`). Should come first in
+    MIDDLEWARE so `total` covers the other middleware too. Streamed bodies are
+    sent after the measurement ends.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # How Django's `MiddlewareMixin` marks `__call__` as returning a coroutine
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def is_enabled(self):
+        return is_header_enabled() or metrics.is_enabled()
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_enabled():
+            return self.get_response(request)
+
+        # Connected before this module was imported
+        install_execute_wrapper(connection)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.is_enabled():
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    def finish(self, request, response, timings, total):
+        timings.add('total', total)
+        if is_header_enabled():
+            response['Server-Timing'] = timings.get_header()
+        if metrics.is_enabled():
+            metrics.observe_request(get_route(request), request.method, response.status_code, timings)
+        return response